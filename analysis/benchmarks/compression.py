@@ -0,0 +1,164 @@
+# coding: utf-8
+
+"""
+Benchmark of event store codecs on synthetic events. For each codec, a store is written and read
+back, reporting the compression ratio with respect to uncompressed stores, the encode time and the
+decode throughput when reading all columns and when reading a few columns of a range of events.
+Usage:
+
+.. code-block:: bash
+
+   python -m analysis.benchmarks.compression [--events N] [--codecs SPEC ...] [--per-column]
+       [--output results.json]
+"""
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from collections import OrderedDict
+
+from analysis.benchmarks.synthetic import generate_events
+
+
+default_codecs = ["none", "zlib", "shuffle+zlib", "zstd", "shuffle+zstd", "lz4", "shuffle+lz4"]
+
+# columns read in the partial read benchmark
+partial_columns = ["triggerIsoMu24", "MET_px", "MET_py", "Jet_Px", "Jet_Py"]
+
+
+def _nbytes(col):
+    from analysis.framework.columnar import JaggedArray
+
+    if isinstance(col, JaggedArray):
+        return col.content.nbytes + col.offsets.nbytes
+    return col.nbytes
+
+
+def _timed(func, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+def run(codecs=None, n_events=100000, chunk_size=None, repeat=3, seed=0, per_column=False,
+        callback=None):
+    """
+    Benchmarks *codecs* on *n_events* synthetic events and returns a list of result dictionaries.
+    Codecs that are not available are skipped. *callback* is invoked with each result once
+    available.
+    """
+    from analysis.framework.compression import get_codec
+    from analysis.framework.store import EventStore, dump_events, default_chunk_size
+
+    codecs = default_codecs if codecs is None else codecs
+    chunk_size = chunk_size or default_chunk_size
+
+    events = generate_events(n_events, seed=seed)
+    raw_size = sum(_nbytes(events[name]) for name in events.fields)
+    partial_range = (n_events // 4, n_events // 2)
+
+    tmp_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        for spec in codecs:
+            try:
+                get_codec(spec)
+            except Exception as e:
+                print("skipping codec {}: {}".format(spec, e))
+                continue
+
+            path = os.path.join(tmp_dir, "events.npz")
+            encode_time = _timed(lambda: dump_events(path, events, codec=spec,
+                chunk_size=chunk_size), repeat)
+            size = os.path.getsize(path)
+
+            def read_all():
+                with EventStore(path, mmap=False) as store:
+                    store.load(materialize=True)
+
+            def read_partial():
+                with EventStore(path, mmap=False) as store:
+                    store.load(partial_columns, materialize=True, start=partial_range[0],
+                        stop=partial_range[1])
+
+            decode_time = _timed(read_all, repeat)
+            partial_time = _timed(read_partial, repeat)
+
+            result = OrderedDict([
+                ("codec", spec),
+                ("n_events", n_events),
+                ("size", size),
+                ("ratio", float(raw_size) / size),
+                ("encode_time", encode_time),
+                ("decode_time", decode_time),
+                ("decode_throughput", raw_size / decode_time / 1024.**2),
+                ("decode_rate", n_events / decode_time),
+                ("partial_decode_time", partial_time),
+            ])
+
+            if per_column:
+                with EventStore(path) as store:
+                    columns = OrderedDict()
+                    for name, column_spec in store.specs.items():
+                        raw = _nbytes(events[name])
+                        members = list(column_spec.get("chunks", {}).values())
+                        compressed = sum(nbytes for chunks in members for _, nbytes in chunks) \
+                            if members else raw
+                        columns[name] = float(raw) / max(compressed, 1)
+                result["column_ratios"] = columns
+
+            results.append(result)
+            if callable(callback):
+                callback(result)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--events", type=int, default=100000, help="number of events, default: "
+        "100000")
+    parser.add_argument("--codecs", nargs="+", default=default_codecs, help="codec specifications, "
+        "default: {}".format(" ".join(default_codecs)))
+    parser.add_argument("--chunk-size", type=int, help="number of items per compressed chunk")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed repetitions, the "
+        "minimum is reported, default: 3")
+    parser.add_argument("--seed", type=int, default=0, help="random seed, default: 0")
+    parser.add_argument("--per-column", action="store_true", help="also report compression ratios "
+        "per column")
+    parser.add_argument("--output", help="json file to save results in")
+    args = parser.parse_args(argv)
+
+    print("{:<16} {:>12} {:>7} {:>10} {:>10} {:>12} {:>14} {:>10}".format("codec", "size / B",
+        "ratio", "encode / s", "decode / s", "decode MB/s", "decode evt/s", "range / s"))
+
+    def print_result(result):
+        print("{codec:<16} {size:>12d} {ratio:>7.2f} {encode_time:>10.4f} {decode_time:>10.4f} "
+            "{decode_throughput:>12.1f} {decode_rate:>14.1f} {partial_decode_time:>10.4f}".format(
+                **result))
+        for name, ratio in result.get("column_ratios", {}).items():
+            print("    {:<28} {:>7.2f}".format(name, ratio))
+        sys.stdout.flush()
+
+    results = run(args.codecs, n_events=args.events, chunk_size=args.chunk_size,
+        repeat=args.repeat, seed=args.seed, per_column=args.per_column, callback=print_result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,270 @@
+# coding: utf-8
+
+"""
+Benchmarks of the framework hot paths on synthetic events. Selection, reconstruction, systematic
+variations, array joining and plotting are timed at several event counts, reporting the event rate
+and the peak memory allocated during each benchmark. Results can be saved and compared against a
+stored baseline to catch performance regressions. Usage:
+
+.. code-block:: bash
+
+   python -m analysis.benchmarks.framework [--sizes N ...] [--benchmarks NAME ...] [--repeat N]
+       [--output results.json] [--baseline baseline.json] [--tolerance 0.2]
+"""
+
+
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+from collections import OrderedDict
+
+from analysis.benchmarks.synthetic import generate_events
+
+
+default_sizes = [1000, 10000, 100000]
+
+
+def _select(engine):
+    from analysis.framework.selection import select_singletop, select_singletop_columnar
+    return {"event": select_singletop, "columnar": select_singletop_columnar}[engine]
+
+
+def _reconstruct(engine):
+    from analysis.framework.reconstruction import (reconstruct_singletop,
+        reconstruct_singletop_columnar)
+    return {"event": reconstruct_singletop, "columnar": reconstruct_singletop_columnar}[engine]
+
+
+def setup_select(events, engine):
+    select = _select(engine)
+    return lambda: select(events)
+
+
+def setup_reconstruct(events, engine):
+    indexes, selected_objects = _select(engine)(events)
+    selected = events[indexes]
+    reconstruct = _reconstruct(engine)
+    return lambda: reconstruct(selected, selected_objects)
+
+
+def setup_vary_jer(events):
+    from analysis.framework.columnar import Events
+    from analysis.framework.systematics import vary_jer
+
+    # vary_jer replaces columns, so work on shallow copies to keep the input unchanged
+    return lambda: vary_jer(Events(OrderedDict(events.columns), n=len(events)), "up", seed=1)
+
+
+def setup_join_struct_arrays(events):
+    from analysis.framework.util import join_struct_arrays
+
+    indexes, selected_objects = _select("columnar")(events)
+    selected = events[indexes]
+    reco_data = _reconstruct("columnar")(selected, selected_objects)
+    struct = selected.to_struct()
+    return lambda: join_struct_arrays(struct, reco_data)
+
+
+def setup_stack_plot(events):
+    import os
+    import tempfile
+    import numpy as np
+    from analysis.framework.registry import get_config_inst
+    from analysis.framework.histograms import fill_hist
+    from analysis.framework.plotting import stack_plot
+
+    # fill histograms of the leading jet pt for all processes, using the same events
+    config_inst = get_config_inst("singletop", "singletop_opendata_2011")
+    variable = config_inst.get_variable("jet1_pt")
+    px, py = events["Jet_Px"], events["Jet_Py"]
+    first = px.starts[px.counts > 0]
+    values = np.hypot(px.content[first], py.content[first])
+    sumw = fill_hist(values, variable.bin_edges)[0]
+    hists = OrderedDict(
+        (process, {variable.name + ".sumw": sumw, "sum_weights": float(len(values))})
+        for process in config_inst.processes
+    )
+
+    path = os.path.join(tempfile.mkdtemp(), variable.name + ".pdf")
+    return lambda: stack_plot(hists, variable, path)
+
+
+# registered benchmarks, mapping names to setup functions that receive events and return the
+# callable to time
+benchmarks = OrderedDict([
+    ("select_singletop", lambda events: setup_select(events, "event")),
+    ("select_singletop_columnar", lambda events: setup_select(events, "columnar")),
+    ("reconstruct_singletop", lambda events: setup_reconstruct(events, "event")),
+    ("reconstruct_singletop_columnar", lambda events: setup_reconstruct(events, "columnar")),
+    ("vary_jer", setup_vary_jer),
+    ("join_struct_arrays", setup_join_struct_arrays),
+    ("stack_plot", setup_stack_plot),
+])
+
+
+def measure(func, repeat=3):
+    """
+    Calls *func* *repeat* times and returns the minimum wall time in seconds and the peak memory in
+    bytes allocated during an additional call, or *None* when memory tracing is not available.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+
+    # measure memory separately as tracing slows down python code considerably
+    try:
+        import tracemalloc
+    except ImportError:
+        peak = None
+    else:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return min(times), peak
+
+
+def run(names=None, sizes=None, repeat=3, seed=0, multiplicities=None, callback=None):
+    """
+    Runs the benchmarks *names*, defaulting to all, for all event counts in *sizes* and returns a
+    list of result dictionaries. *callback* is invoked with each result once available. Rates
+    always refer to the number of generated events, also for benchmarks that only process selected
+    events. Benchmarks that fail do not stop the run, their results contain the error message and
+    no time.
+    """
+    names = list(benchmarks) if names is None else names
+    sizes = default_sizes if sizes is None else sizes
+
+    unknown = set(names) - set(benchmarks)
+    if unknown:
+        raise ValueError("unknown benchmarks: {}".format(", ".join(sorted(unknown))))
+
+    results = []
+    for n in sizes:
+        events = generate_events(n, seed=seed, multiplicities=multiplicities)
+        for name in names:
+            try:
+                best, peak = measure(benchmarks[name](events), repeat=repeat)
+                error = None
+            except Exception as e:
+                best, peak = None, None
+                error = "{}: {}".format(e.__class__.__name__, e)
+            result = OrderedDict([
+                ("name", name),
+                ("n_events", n),
+                ("time", best),
+                ("rate", n / best if best else None),
+                ("peak_memory", peak),
+                ("error", error),
+            ])
+            results.append(result)
+            if callable(callback):
+                callback(result)
+
+    return results
+
+
+def compare(results, baseline):
+    """
+    Compares *results* to *baseline* results and returns a list of ``(result, baseline_result,
+    ratio)`` tuples for all matching benchmarks and sizes, where *ratio* is the time relative to
+    the baseline.
+    """
+    lookup = {(r["name"], r["n_events"]): r for r in baseline}
+
+    comparisons = []
+    for result in results:
+        base = lookup.get((result["name"], result["n_events"]))
+        if result["time"] is not None and base and base["time"]:
+            comparisons.append((result, base, result["time"] / base["time"]))
+
+    return comparisons
+
+
+def _format_memory(peak):
+    return "-" if peak is None else "{:.1f} MB".format(peak / 1024.**2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes, help="event counts, "
+        "default: {}".format(" ".join(map(str, default_sizes))))
+    parser.add_argument("--benchmarks", nargs="+", choices=list(benchmarks), help="benchmarks to "
+        "run, default: all")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed repetitions, the "
+        "minimum is reported, default: 3")
+    parser.add_argument("--seed", type=int, default=0, help="random seed, default: 0")
+    parser.add_argument("--jets", type=float, help="mean number of jets per event")
+    parser.add_argument("--muons", type=float, help="mean number of muons per event")
+    parser.add_argument("--electrons", type=float, help="mean number of electrons per event")
+    parser.add_argument("--output", help="json file to save results in")
+    parser.add_argument("--baseline", help="json file with baseline results to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown with "
+        "respect to the baseline that is considered a regression, default: 0.2")
+    args = parser.parse_args(argv)
+
+    multiplicities = {}
+    for name, value in [("Jet", args.jets), ("Muon", args.muons), ("Electron", args.electrons)]:
+        if value is not None:
+            multiplicities[name] = value
+
+    def print_result(result):
+        if result["error"]:
+            print("{:<32} {:>9d} events FAILED {}".format(result["name"], result["n_events"],
+                result["error"]))
+            sys.stdout.flush()
+            return
+        print("{:<32} {:>9d} events {:>10.4f} s {:>14.1f} events/s {:>10}".format(result["name"],
+            result["n_events"], result["time"], result["rate"] or 0.,
+            _format_memory(result["peak_memory"])))
+        sys.stdout.flush()
+
+    results = run(args.benchmarks, args.sizes, repeat=args.repeat, seed=args.seed,
+        multiplicities=multiplicities, callback=print_result)
+
+    if args.output:
+        data = OrderedDict([
+            ("meta", OrderedDict([
+                ("time", time.time()),
+                ("python", platform.python_version()),
+                ("platform", platform.platform()),
+                ("seed", args.seed),
+                ("multiplicities", multiplicities),
+            ])),
+            ("results", results),
+        ])
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=4)
+
+    n_regressions = 0
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+
+        print("\ncomparison to baseline {}:".format(args.baseline))
+        for result, base, ratio in compare(results, baseline):
+            regression = ratio > 1. + args.tolerance
+            n_regressions += regression
+            print("{:<32} {:>9d} events {:>10.4f} s -> {:>10.4f} s ({:+.1f}%){}".format(
+                result["name"], result["n_events"], base["time"], result["time"],
+                100. * (ratio - 1.), "  REGRESSION" if regression else ""))
+
+    n_failures = sum(bool(result["error"]) for result in results)
+    if n_failures:
+        print("\n{} benchmark(s) failed".format(n_failures))
+
+    return 1 if n_regressions or n_failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,82 @@
+# coding: utf-8
+
+"""
+Benchmark of the task graph construction. Measures the time to import the analysis tasks and to
+build the full dependency tree of the CreateHistograms task, including all workflow branches.
+Usage:
+
+.. code-block:: bash
+
+   python -m analysis.benchmarks.startup [--repeat N] [--json]
+"""
+
+
+import sys
+import json
+import time
+import argparse
+
+
+def walk_tree(task):
+    """
+    Traverses the dependency tree of *task*, including the branch tasks of workflows, and returns
+    the number of unique tasks.
+    """
+    seen = set()
+    stack = [task]
+    while stack:
+        task = stack.pop()
+        if task.task_id in seen:
+            continue
+        seen.add(task.task_id)
+
+        stack.extend(task.deps())
+        if getattr(task, "is_workflow", lambda: False)():
+            stack.extend(task.get_branch_tasks().values())
+
+    return len(seen)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="number of repetitions of the tree "
+        "construction, default: 5")
+    parser.add_argument("--version", default="benchmark", help="task version, default: benchmark")
+    parser.add_argument("--json", action="store_true", help="print results in json format")
+    args = parser.parse_args(argv)
+
+    t0 = time.time()
+    import luigi
+    from analysis.tasks.simple import CreateHistograms
+    import_time = time.time() - t0
+
+    times = []
+    for i in range(args.repeat):
+        # clear cached task instances so that each repetition builds the tree from scratch
+        luigi.task_register.Register.clear_instance_cache()
+
+        t0 = time.time()
+        n_tasks = walk_tree(CreateHistograms(version=args.version))
+        times.append(time.time() - t0)
+
+    results = {
+        "import_time": import_time,
+        "n_tasks": n_tasks,
+        "tree_times": times,
+        "tree_time_min": min(times),
+        "tree_time_mean": sum(times) / len(times),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print("import time    : {:.3f} s".format(import_time))
+        print("number of tasks: {}".format(n_tasks))
+        print("tree time      : {:.3f} s (min), {:.3f} s (mean) over {} repetitions".format(
+            results["tree_time_min"], results["tree_time_mean"], args.repeat))
+
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,97 @@
+# coding: utf-8
+
+"""
+Generation of synthetic events with the same columns as the output of the ConvertData task.
+Kinematics are drawn from simple distributions that roughly resemble the CMS Open Data samples so
+that selection efficiencies and object multiplicities are of a realistic order of magnitude.
+"""
+
+
+__all__ = ["generate_events"]
+
+
+from collections import OrderedDict
+
+from analysis.framework.columnar import JaggedArray, Events
+
+
+# default mean multiplicities of object collections
+default_multiplicities = {
+    "Jet": 3.,
+    "Muon": 1.,
+    "Electron": 0.3,
+    "Photon": 0.5,
+}
+
+# attributes per object collection in addition to four-vector components, with their dtypes
+_collection_attrs = {
+    "Jet": [("btag", "<f4"), ("ID", "?")],
+    "Muon": [("Charge", "<i4"), ("Iso", "<f4")],
+    "Electron": [("Charge", "<i4"), ("Iso", "<f4")],
+    "Photon": [("Iso", "<f4")],
+}
+
+# object masses in GeV used to compute energies
+_collection_masses = {
+    "Jet": 10.,
+    "Muon": 0.106,
+    "Electron": 0.000511,
+    "Photon": 0.,
+}
+
+
+def generate_events(n, seed=0, multiplicities=None):
+    """
+    Generates *n* synthetic events and returns them as an :py:class:`Events` instance. The number
+    of objects per collection is poisson distributed with mean values given in *multiplicities*
+    which defaults to :py:attr:`default_multiplicities`. All random numbers are derived from
+    *seed*. Use :py:meth:`Events.to_struct` to obtain a structured array as produced by root_numpy.
+    """
+    import numpy as np
+
+    rng = np.random.RandomState(seed)
+    _multiplicities = dict(default_multiplicities)
+    _multiplicities.update(multiplicities or {})
+
+    columns = OrderedDict()
+    columns["NPrimaryVertices"] = rng.poisson(8., n).astype(np.int32)
+    columns["triggerIsoMu24"] = rng.rand(n) < 0.8
+    columns["EventWeight"] = rng.uniform(0.5, 1., n).astype(np.float32)
+    columns["MET_px"] = rng.normal(0., 35., n).astype(np.float32)
+    columns["MET_py"] = rng.normal(0., 35., n).astype(np.float32)
+
+    for name in ["Jet", "Muon", "Electron", "Photon"]:
+        counts = rng.poisson(_multiplicities[name], n).astype(np.int32)
+        m = counts.sum()
+
+        # transverse momenta falling exponentially above a threshold, uniform phi and eta
+        pt = 10. + rng.exponential(30. if name == "Jet" else 20., m)
+        phi = rng.uniform(-np.pi, np.pi, m)
+        eta = rng.uniform(-4.7 if name == "Jet" else -2.5, 4.7 if name == "Jet" else 2.5, m)
+        px, py, pz = pt * np.cos(phi), pt * np.sin(phi), pt * np.sinh(eta)
+        e = np.sqrt(px**2. + py**2. + pz**2. + _collection_masses[name]**2.)
+
+        columns["N" + name] = counts
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        for attr, values in [("Px", px), ("Py", py), ("Pz", pz), ("E", e)]:
+            columns[name + "_" + attr] = JaggedArray(values.astype(np.float32), offsets)
+
+        for attr, dtype in _collection_attrs[name]:
+            if attr == "btag":
+                values = rng.exponential(1., m)
+            elif attr == "ID":
+                values = rng.rand(m) < 0.95
+            elif attr == "Charge":
+                values = rng.choice([-1, 1], m)
+            elif attr == "Iso":
+                values = rng.exponential(0.08, m)
+            columns[name + "_" + attr] = JaggedArray(values.astype(dtype), offsets)
+
+    # generator level lepton and neutrino
+    for name in ["MClepton", "MCneutrino"]:
+        for attr in ["px", "py", "pz"]:
+            columns[name + "_" + attr] = rng.normal(0., 40., n).astype(np.float32)
+    columns["MCleptonPDGid"] = rng.choice([-13, 13], n).astype(np.int32)
+
+    return Events(columns, n=n)
@@ -9,6 +9,7 @@ __all__ = ["analysis_singletop", "config_singletop_opendata_2011"]
 
 
 import order as od
+import scinum as sn
 
 from analysis.config.opendata_2011 import campaign_opendata_2011
 
@@ -34,16 +35,22 @@ for name in ["singleTop", "WJets", "ZJets", "WWJets", "WZJets", "ZZJets"]:
     dset = cfg.add_dataset(campaign_opendata_2011.get_dataset(name))
     cfg.add_process(dset.get_process(name))
 
+# integrated luminosity with its uncertainty, used for normalization and by rate-type shifts
+cfg.set_aux("luminosity", sn.Number(5.55, ("rel", 0.022)))  # 1/fb
+
 # add channels
+# (their luminosity refers to the one of the config, see analysis.framework.weights.luminosity)
 cfg.add_channel("mu", 1,
     label=r"$\mu$",
     label_short="mu",
     aux={
-        "luminosity": 5.55,  # 1/fb
+        "luminosity": cfg.get_aux("luminosity"),
     },
 )
 
 # add systematic shifts
+# (rate shifts are evaluated as weight variations, their source refers to
+# analysis.framework.weights.rate_sources)
 cfg.add_shift("nominal", 1)
 cfg.add_shift("lumi_up", 2,
     type="rate",
@@ -61,6 +68,14 @@ cfg.add_shift("jer_down", 5,
     type="shape",
     label="Jet energy resolution",
 )
+cfg.add_shift("xsec_up", 6,
+    type="rate",
+    label="Cross section",
+)
+cfg.add_shift("xsec_down", 7,
+    type="rate",
+    label="Cross section",
+)
 
 # variables
 cfg.add_variable("jet1_pt",
@@ -69,6 +84,22 @@ cfg.add_variable("jet1_pt",
     unit="GeV",
     x_title=r"Leading jet $p_{T}$",
 )
+cfg.add_variable("top_mass",
+    expression="Top_M",
+    binning=(25, 50., 400.,),
+    unit="GeV",
+    x_title="Top quark mass",
+)
+cfg.add_variable("fwd_jet_eta",
+    expression="FwdJet_Eta",
+    binning=(20, -5., 5.,),
+    x_title=r"Forward jet $\eta$",
+)
+cfg.add_variable("cos_theta_star",
+    expression="CosThetaStar",
+    binning=(20, -1., 1.,),
+    x_title=r"$\cos(\theta^{*})$",
+)
 cfg.add_variable("weight",
     expression="EventWeight",
     binning=(20, 0., 1.,),
@@ -0,0 +1,280 @@
+# coding: utf-8
+
+"""
+Content-addressed cache for downloaded input files.
+"""
+
+
+__all__ = ["DownloadCache", "file_sha256"]
+
+
+import os
+import re
+import json
+import time
+import shutil
+import fcntl
+import hashlib
+import contextlib
+
+import six
+
+
+# ioctl request to clone the data blocks of a file into another one on linux
+FICLONE = 0x40049409
+
+
+def file_sha256(path, chunk_size=1024**2):
+    """
+    Returns the sha256 checksum of the content of the file at *path*.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DownloadCache(object):
+    """
+    Cache of downloaded files in a directory *root*, shared across tasks, datasets and versions.
+    Files are stored once per content under their sha256 checksum and source urls refer to them
+    through an index, so that the same source is only downloaded once. Downloads are chunked and
+    resumed from partial files after interruptions. When *max_size* (in bytes) is set, least
+    recently used files are removed once the total size of cached files exceeds it. Layout:
+
+    - ``objects/<checksum[:2]>/<checksum>``: cached files
+    - ``urls/<hash of url>.json``: index entries mapping urls to checksums
+    - ``partial/<hash of url>``: incomplete downloads
+    - ``locks/<hash of url>``: lock files to synchronize concurrent fetches
+
+    Example:
+
+    .. code-block:: python
+
+       cache = DownloadCache("/tmp/cache", max_size=10 * 1024**3)
+       path = cache.fetch("http://opendata.cern.ch/record/206/files/dy.root")
+    """
+
+    chunk_size = 1024**2
+
+    @classmethod
+    def from_env(cls):
+        """
+        Creates a cache in the directory defined by ``ANALYSIS_CACHE`` and a maximum size in MB
+        given by ``ANALYSIS_CACHE_MAX_SIZE``, if set.
+        """
+        max_size = os.getenv("ANALYSIS_CACHE_MAX_SIZE")
+        return cls(os.path.expandvars(os.environ["ANALYSIS_CACHE"]),
+            max_size=int(float(max_size) * 1024**2) if max_size else None)
+
+    def __init__(self, root, max_size=None):
+        super(DownloadCache, self).__init__()
+
+        self.root = root
+        self.max_size = max_size
+
+        for d in ["objects", "urls", "partial", "locks"]:
+            path = os.path.join(self.root, d)
+            if not os.path.exists(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    # might have been created concurrently
+                    if not os.path.exists(path):
+                        raise
+
+    @staticmethod
+    def url_key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def object_path(self, checksum):
+        return os.path.join(self.root, "objects", checksum[:2], checksum)
+
+    def _index_path(self, url):
+        return os.path.join(self.root, "urls", self.url_key(url) + ".json")
+
+    @contextlib.contextmanager
+    def lock(self, url):
+        """
+        Context manager that holds an exclusive lock for *url* across threads and processes.
+        """
+        with open(os.path.join(self.root, "locks", self.url_key(url)), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def lookup(self, url, checksum=None):
+        """
+        Returns the path of the cached file for *url* or *None* if it is not cached. When *checksum*
+        is given, a cached file with this content is accepted regardless of the url it was fetched
+        from.
+        """
+        if checksum and os.path.exists(self.object_path(checksum)):
+            return self.object_path(checksum)
+
+        index_path = self._index_path(url)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path, "r") as f:
+            entry = json.load(f)
+        path = self.object_path(entry["checksum"])
+
+        return path if os.path.exists(path) else None
+
+    def fetch(self, url, checksum=None, callback=None):
+        """
+        Returns the path of the cached file for *url* and downloads it first if it is not cached
+        yet. When *checksum* (sha256) is set, the content is verified. *callback* is invoked with
+        the number of downloaded and total bytes (or *None* if unknown) after each chunk.
+        """
+        with self.lock(url):
+            path = self.lookup(url, checksum=checksum)
+            if not path:
+                path = self._download(url, checksum=checksum, callback=callback)
+
+            # mark as recently used
+            os.utime(path, None)
+
+        self.evict(keep=[path])
+
+        return path
+
+    def partial_path(self, url):
+        return os.path.join(self.root, "partial", self.url_key(url))
+
+    def _download(self, url, checksum=None, callback=None):
+        partial_path = self.partial_path(url)
+
+        # resume from an existing partial file
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        request = six.moves.urllib.request.Request(url)
+        if offset:
+            request.add_header("Range", "bytes={}-".format(offset))
+
+        h = hashlib.sha256()
+        try:
+            response = six.moves.urllib.request.urlopen(request)
+        except six.moves.urllib.error.HTTPError as e:
+            if not offset or e.code != 416:
+                raise
+            # the range starts at the end of the file, so the partial file is either complete,
+            # e.g. when the process was killed before storing it, or invalid and fetched again
+            m = re.match(r"^bytes\s+\*/(\d+)$", e.info().get("Content-Range") or "")
+            e.close()
+            if m and int(m.group(1)) == offset:
+                return self._store_partial(url, partial_path, checksum=checksum)
+            os.remove(partial_path)
+            return self._download(url, checksum=checksum, callback=callback)
+
+        try:
+            if offset and response.getcode() == 206:
+                # hash the already downloaded part
+                with open(partial_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                        h.update(chunk)
+                mode = "ab"
+            else:
+                offset, mode = 0, "wb"
+
+            length = response.info().get("Content-Length")
+            total = offset + int(length) if length else None
+
+            with open(partial_path, mode) as f:
+                n = offset
+                for chunk in iter(lambda: response.read(self.chunk_size), b""):
+                    f.write(chunk)
+                    h.update(chunk)
+                    n += len(chunk)
+                    if callable(callback):
+                        callback(n, total)
+        finally:
+            response.close()
+
+        if total is not None and n != total:
+            raise IOError("incomplete download of {}, received {} of {} bytes".format(url, n,
+                total))
+
+        return self._store_partial(url, partial_path, checksum=checksum, digest=h.hexdigest())
+
+    def _store_partial(self, url, partial_path, checksum=None, digest=None):
+        # verify and store a complete partial file, computing its digest if not given
+        if digest is None:
+            digest = file_sha256(partial_path)
+        if checksum and digest != checksum:
+            os.remove(partial_path)
+            raise IOError("checksum mismatch for {}: expected {}, got {}".format(url, checksum,
+                digest))
+
+        return self.store(url, partial_path, digest)
+
+    def store(self, url, src, checksum):
+        """
+        Moves the complete file at *src* with the sha256 *checksum* into the cache as the content of
+        *url* and returns its cached path. The checksum is not verified.
+        """
+        path = self.object_path(checksum)
+        if not os.path.exists(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                # might have been created concurrently
+                if not os.path.exists(os.path.dirname(path)):
+                    raise
+        size = os.path.getsize(src)
+        shutil.move(src, path)
+
+        index_path = self._index_path(url)
+        tmp_path = "{}.{}.tmp".format(index_path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump({"url": url, "checksum": checksum, "size": size, "time": time.time()}, f)
+        os.rename(tmp_path, index_path)
+
+        return path
+
+    def copy(self, url, dst, checksum=None, callback=None):
+        """
+        Fetches *url* and places a copy of the cached file at *dst*, which shares the data blocks of
+        the cached file on file systems supporting reflinks. The copy is independent of the cache,
+        so that neither updates of access times nor evictions affect it.
+        """
+        path = self.fetch(url, checksum=checksum, callback=callback)
+
+        if os.path.exists(dst):
+            os.remove(dst)
+        with open(path, "rb") as fsrc, open(dst, "wb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except (IOError, OSError):
+                shutil.copyfileobj(fsrc, fdst, 1024**2)
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used files until the total size is below *max_size*. Paths in *keep*
+        are never removed.
+        """
+        if not self.max_size:
+            return
+
+        keep = set(keep or [])
+        objects = []
+        objects_dir = os.path.join(self.root, "objects")
+        for d in os.listdir(objects_dir):
+            for name in os.listdir(os.path.join(objects_dir, d)):
+                path = os.path.join(objects_dir, d, name)
+                stat = os.stat(path)
+                objects.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in objects)
+        for _, size, path in sorted(objects):
+            if total <= self.max_size:
+                break
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
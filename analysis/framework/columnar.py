@@ -0,0 +1,341 @@
+# coding: utf-8
+
+"""
+Helpers for columnar, numpy-vectorized processing of jagged per-object columns.
+"""
+
+
+__all__ = ["JaggedArray", "Events", "EventView", "get_jagged", "get_scalar"]
+
+
+from collections import OrderedDict
+
+import six
+
+
+class JaggedArray(object):
+    """
+    Minimal jagged array consisting of a flat, contiguous *content* array and an *offsets* array of
+    length ``n + 1`` that marks the start and stop positions of each of the *n* entries. Example:
+
+    .. code-block:: python
+
+       arr = JaggedArray(np.array([1., 2., 3.]), np.array([0, 2, 2, 3]))
+       len(arr)    # => 3
+       arr.counts  # => array([2, 0, 1])
+       arr[0]      # => array([1., 2.])
+    """
+
+    __slots__ = ("content", "offsets")
+
+    def __init__(self, content, offsets):
+        super(JaggedArray, self).__init__()
+
+        self.content = content
+        self.offsets = offsets
+
+    @classmethod
+    def from_counts(cls, content, counts):
+        import numpy as np
+
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return cls(content, offsets)
+
+    @classmethod
+    def from_objects(cls, objects, dtype=None):
+        """
+        Converts an array of per-entry arrays, e.g. the object-dtype cells of variable-length
+        branches produced by root_numpy, into a jagged array.
+        """
+        import numpy as np
+
+        counts = np.fromiter((len(obj) for obj in objects), dtype=np.int64, count=len(objects))
+        if counts.sum() > 0:
+            content = np.concatenate(list(objects))
+            if dtype is not None:
+                content = content.astype(dtype, copy=False)
+        else:
+            content = np.array([], dtype=dtype or np.float32)
+
+        return cls.from_counts(content, counts)
+
+    @classmethod
+    def concatenate(cls, arrays):
+        import numpy as np
+
+        contents = [arr.content for arr in arrays]
+        counts = [arr.counts for arr in arrays]
+
+        return cls.from_counts(np.concatenate(contents), np.concatenate(counts))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __repr__(self):
+        return "<{} len={} content={} at {}>".format(self.__class__.__name__, len(self),
+            len(self.content), hex(id(self)))
+
+    def __getitem__(self, key):
+        import numpy as np
+
+        # integer access returns a view on the content
+        if isinstance(key, (int, np.integer)):
+            return self.content[self.offsets[key]:self.offsets[key + 1]]
+
+        # contiguous slices only require offset shifts
+        if isinstance(key, slice) and key.step in (None, 1):
+            start, stop, _ = key.indices(len(self))
+            stop = max(start, stop)
+            offsets = self.offsets[start:stop + 1]
+            return self.__class__(self.content[offsets[0]:offsets[-1]], offsets - offsets[0])
+
+        # masks and index arrays, gather selected entries
+        idx = np.arange(len(self))[key]
+        counts = self.counts[idx]
+        sel = self.__class__.from_counts(None, counts)
+        pos = np.repeat(self.starts[idx] - sel.offsets[:-1], counts) + np.arange(sel.offsets[-1])
+        sel.content = self.content[pos]
+
+        return sel
+
+    @property
+    def starts(self):
+        return self.offsets[:-1]
+
+    @property
+    def stops(self):
+        return self.offsets[1:]
+
+    @property
+    def counts(self):
+        import numpy as np
+
+        return np.diff(self.offsets)
+
+    @property
+    def parents(self):
+        """
+        Index of the entry that each content element belongs to.
+        """
+        import numpy as np
+
+        return np.repeat(np.arange(len(self)), self.counts)
+
+    @property
+    def local_index(self):
+        """
+        Position of each content element within its entry.
+        """
+        import numpy as np
+
+        return np.arange(len(self.content)) - np.repeat(self.starts, self.counts)
+
+    def with_content(self, content):
+        """
+        Returns a new jagged array with the same structure but a different *content* array.
+        """
+        return self.__class__(content, self.offsets)
+
+    def mask(self, content_mask):
+        """
+        Returns a new jagged array that only contains the elements that pass *content_mask*.
+        """
+        return self.__class__.from_counts(self.content[content_mask], self.count_nonzero(
+            content_mask))
+
+    def count_nonzero(self, content_mask):
+        """
+        Counts the elements that pass *content_mask* per entry.
+        """
+        import numpy as np
+
+        return np.bincount(self.parents[content_mask], minlength=len(self)).astype(np.int64)
+
+    def argsort(self, key, descending=False):
+        """
+        Returns the stable ordering of content positions that sorts elements within each entry by
+        *key*, which should have the same length as the content.
+        """
+        import numpy as np
+
+        return np.lexsort((-key if descending else key, self.parents))
+
+    def to_objects(self):
+        import numpy as np
+
+        objects = np.empty(len(self), dtype=object)
+        for i, obj in enumerate(np.split(self.content, self.offsets[1:-1])):
+            objects[i] = obj
+        return objects
+
+
+class Events(object):
+    """
+    Collection of named event columns of equal length. Scalar columns are plain numpy arrays,
+    variable-length columns are :py:class:`JaggedArray`'s. Field access returns columns, integer
+    access returns a :py:class:`EventView` that behaves like a row of a structured array, and any
+    other key selects a subset of events. Example:
+
+    .. code-block:: python
+
+       events = Events.from_struct(struct_array)
+       events["NJet"]       # => array of jet multiplicities
+       events["Jet_Px"]     # => JaggedArray
+       events[0]["Jet_Px"]  # => array of jet px values in the first event
+       events[[0, 2]]       # => Events with two events
+    """
+
+    def __init__(self, columns=None, n=None):
+        super(Events, self).__init__()
+
+        self.columns = OrderedDict(columns or [])
+        self.n = n
+
+        # infer the length from the first column
+        if self.n is None:
+            self.n = len(next(iter(self.columns.values()))) if self.columns else 0
+
+    @classmethod
+    def from_struct(cls, struct):
+        """
+        Creates an event collection from a structured array *struct* whose variable-length fields
+        are stored as object-dtype cells, such as produced by root_numpy.
+        """
+        columns = OrderedDict()
+        for name in struct.dtype.names:
+            col = struct[name]
+            columns[name] = JaggedArray.from_objects(col) if col.dtype.hasobject else col
+
+        return cls(columns, n=len(struct))
+
+    @classmethod
+    def concatenate(cls, events_list):
+        """
+        Concatenates the columns of multiple event collections in *events_list* which must have the
+        same fields.
+        """
+        import numpy as np
+
+        columns = OrderedDict()
+        for name, col in events_list[0].columns.items():
+            cols = [events[name] for events in events_list]
+            columns[name] = JaggedArray.concatenate(cols) if isinstance(col, JaggedArray) else \
+                np.concatenate(cols)
+
+        return cls(columns, n=sum(len(events) for events in events_list))
+
+    @property
+    def fields(self):
+        return list(self.columns.keys())
+
+    def __len__(self):
+        return self.n
+
+    def __contains__(self, field):
+        return field in self.columns
+
+    def __iter__(self):
+        for i in six.moves.range(self.n):
+            yield EventView(self, i)
+
+    def __getitem__(self, key):
+        import numpy as np
+
+        if isinstance(key, six.string_types):
+            return self.columns[key]
+
+        if isinstance(key, (int, np.integer)):
+            return EventView(self, key if key >= 0 else key + self.n)
+
+        columns = OrderedDict((name, col[key]) for name, col in self.columns.items())
+        return self.__class__(columns, n=len(np.arange(self.n)[key]))
+
+    def __setitem__(self, field, column):
+        if len(column) != self.n:
+            raise ValueError("column {} has length {}, expected {}".format(field, len(column),
+                self.n))
+        self.columns[field] = column
+
+    def select(self, fields):
+        """
+        Returns a new event collection that only contains the columns *fields*.
+        """
+        return self.__class__(OrderedDict((name, self.columns[name]) for name in fields), n=self.n)
+
+    def overlay(self, other):
+        """
+        Returns a new event collection whose columns are taken from *other* when existing, and from
+        this instance otherwise. No column data is copied.
+        """
+        if len(other) != self.n:
+            raise ValueError("cannot overlay {} events on {} events".format(len(other), self.n))
+
+        columns = OrderedDict(self.columns)
+        columns.update(other.columns)
+
+        return self.__class__(columns, n=self.n)
+
+    def to_struct(self, fields=None):
+        """
+        Converts the events into a structured array, storing variable-length columns as
+        object-dtype cells that view the jagged content.
+        """
+        import numpy as np
+
+        fields = fields or self.fields
+        dtype = [(name, object if isinstance(self.columns[name], JaggedArray) else
+            self.columns[name].dtype) for name in fields]
+
+        struct = np.empty(self.n, dtype=dtype)
+        for name in fields:
+            col = self.columns[name]
+            struct[name] = col.to_objects() if isinstance(col, JaggedArray) else col
+
+        return struct
+
+
+class EventView(object):
+    """
+    View on a single event of an :py:class:`Events` collection that mimics a row of a structured
+    array, i.e., fields of variable-length columns yield writable views on the jagged content.
+    """
+
+    __slots__ = ("events", "index")
+
+    def __init__(self, events, index):
+        super(EventView, self).__init__()
+
+        self.events = events
+        self.index = index
+
+    def __getitem__(self, field):
+        return self.events.columns[field][self.index]
+
+    def __setitem__(self, field, value):
+        col = self.events.columns[field]
+        if isinstance(col, JaggedArray):
+            col[self.index][:] = value
+        else:
+            col[self.index] = value
+
+
+def get_jagged(events, field, dtype=None):
+    """
+    Returns the jagged array of a variable-length *field* of *events*. Structured arrays with
+    object-dtype cells are converted on the fly.
+    """
+    column = events[field]
+    if isinstance(column, JaggedArray):
+        return column
+    return JaggedArray.from_objects(column, dtype=dtype)
+
+
+def get_scalar(events, field, dtype=None):
+    """
+    Returns the contiguous column of a scalar *field* of *events*.
+    """
+    import numpy as np
+
+    return np.ascontiguousarray(events[field], dtype=dtype)
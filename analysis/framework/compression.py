@@ -0,0 +1,245 @@
+# coding: utf-8
+
+"""
+Compression codecs for columns of event stores. A codec is selected by a specification string
+``"[shuffle+]<name>[:<level>]"``, e.g. ``"shuffle+zstd:3"``. The byte-shuffle filter groups the
+n-th bytes of all items before compression, which considerably improves compression ratios of
+numeric columns. Codecs whose packages are not installed fall back to zlib when writing. Example:
+
+.. code-block:: python
+
+   codec = get_codec("shuffle+zstd")
+   data = codec.encode(arr)
+   arr2 = codec.decode(data, arr.dtype, len(arr))
+"""
+
+
+__all__ = [
+    "Codec", "ColumnCodec", "NoneCodec", "ZlibCodec", "ZstdCodec", "LZ4Codec", "codecs",
+    "register_codec", "get_codec", "parse_codecs",
+]
+
+
+import fnmatch
+import logging
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+# registered codec classes mapped to their names
+codecs = OrderedDict()
+
+# names of unavailable codecs for which a fallback warning was already issued
+_fallback_warned = set()
+
+
+def register_codec(cls):
+    """
+    Class decorator that registers a :py:class:`Codec` subclass under its *name*.
+    """
+    codecs[cls.name] = cls
+    return cls
+
+
+class Codec(object):
+    """
+    Base class of byte-level compression codecs. Subclasses define a *name*, a *default_level*,
+    implement :py:meth:`encode` and :py:meth:`decode`, and can overwrite :py:meth:`available` when
+    they depend on optional packages.
+    """
+
+    name = None
+    default_level = None
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def __init__(self, level=None):
+        super(Codec, self).__init__()
+
+        self.level = self.default_level if level is None else level
+
+    def encode(self, data):
+        raise NotImplementedError
+
+    def decode(self, data, nbytes):
+        raise NotImplementedError
+
+
+@register_codec
+class NoneCodec(Codec):
+
+    name = "none"
+
+    def encode(self, data):
+        return bytes(data)
+
+    def decode(self, data, nbytes):
+        return bytes(data)
+
+
+@register_codec
+class ZlibCodec(Codec):
+
+    name = "zlib"
+    default_level = 6
+
+    def encode(self, data):
+        import zlib
+        return zlib.compress(data, self.level)
+
+    def decode(self, data, nbytes):
+        import zlib
+        return zlib.decompress(data)
+
+
+@register_codec
+class ZstdCodec(Codec):
+
+    name = "zstd"
+    default_level = 3
+
+    @classmethod
+    def available(cls):
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def encode(self, data):
+        import zstandard
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decode(self, data, nbytes):
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=nbytes)
+
+
+@register_codec
+class LZ4Codec(Codec):
+
+    name = "lz4"
+    default_level = 0
+
+    @classmethod
+    def available(cls):
+        try:
+            import lz4.block  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def encode(self, data):
+        import lz4.block
+        mode = "high_compression" if self.level > 0 else "default"
+        return lz4.block.compress(data, mode=mode, compression=self.level, store_size=False)
+
+    def decode(self, data, nbytes):
+        import lz4.block
+        return lz4.block.decompress(data, uncompressed_size=nbytes)
+
+
+class ColumnCodec(object):
+    """
+    Combination of an optional byte-shuffle filter and a :py:class:`Codec` that encodes and decodes
+    numpy arrays, as described by a specification string (see :py:func:`get_codec`).
+    """
+
+    def __init__(self, codec, shuffle=False):
+        super(ColumnCodec, self).__init__()
+
+        self.codec = codec
+        self.shuffle = shuffle
+
+    @property
+    def spec(self):
+        spec = self.codec.name
+        if self.codec.level is not None and self.codec.level != self.codec.default_level:
+            spec += ":{}".format(self.codec.level)
+        return ("shuffle+" if self.shuffle else "") + spec
+
+    @property
+    def is_none(self):
+        return isinstance(self.codec, NoneCodec) and not self.shuffle
+
+    def encode(self, arr):
+        import numpy as np
+
+        arr = np.ascontiguousarray(arr)
+        if self.shuffle and arr.dtype.itemsize > 1:
+            data = arr.view(np.uint8).reshape(len(arr), arr.dtype.itemsize).T.tobytes()
+        else:
+            data = arr.tobytes()
+
+        return self.codec.encode(data)
+
+    def decode(self, data, dtype, n):
+        import numpy as np
+
+        dtype = np.dtype(dtype)
+        data = np.frombuffer(self.codec.decode(data, n * dtype.itemsize), dtype=np.uint8)
+        if self.shuffle and dtype.itemsize > 1:
+            data = np.ascontiguousarray(data.reshape(dtype.itemsize, n).T)
+
+        return data.view(dtype).reshape(n)
+
+
+def get_codec(spec, fallback=False):
+    """
+    Returns a :py:class:`ColumnCodec` for a specification string *spec*, e.g. ``"zlib"``,
+    ``"shuffle+zstd"`` or ``"lz4:9"``. When the codec is not available and *fallback* is *True*,
+    zlib is used instead, otherwise an exception is raised.
+    """
+    parts = (spec or "none").split("+")
+    shuffle = "shuffle" in parts[:-1]
+    if any(part != "shuffle" for part in parts[:-1]):
+        raise ValueError("unknown filter in codec specification '{}'".format(spec))
+
+    name, level = (parts[-1].split(":", 1) + [None])[:2]
+    if name not in codecs:
+        raise ValueError("unknown codec '{}' in specification '{}', known codecs are {}".format(
+            name, spec, ", ".join(codecs)))
+
+    cls = codecs[name]
+    if not cls.available():
+        if not fallback:
+            raise Exception("codec '{}' is not available, please install the required "
+                "package".format(name))
+        if name not in _fallback_warned:
+            logger.warning("codec '{}' is not available, falling back to zlib".format(name))
+            _fallback_warned.add(name)
+        cls, level = ZlibCodec, None
+
+    return ColumnCodec(cls(level=None if level is None else int(level)), shuffle=shuffle)
+
+
+def parse_codecs(spec):
+    """
+    Parses a per-column codec specification *spec* with comma-separated entries
+    ``[<pattern>=]<codec>``, where *pattern* is matched against column names with ``fnmatch``
+    and defaults to ``"*"``, and returns a function that maps a column name to the codec
+    specification of the first matching entry, or ``"none"``. Example:
+
+    .. code-block:: python
+
+       get_spec = parse_codecs("Jet_ID=zlib,*=shuffle+zstd")
+       get_spec("Jet_ID")  # -> "zlib"
+       get_spec("Jet_Px")  # -> "shuffle+zstd"
+    """
+    entries = []
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if entry:
+            pattern, codec = entry.split("=", 1) if "=" in entry else ("*", entry)
+            entries.append((pattern.strip(), codec.strip()))
+
+    def get_spec(name):
+        for pattern, codec in entries:
+            if fnmatch.fnmatch(name, pattern):
+                return codec
+        return "none"
+
+    return get_spec
@@ -0,0 +1,131 @@
+# coding: utf-8
+
+"""
+Cutflow bookkeeping.
+"""
+
+
+__all__ = ["Cutflow"]
+
+
+import time
+from collections import OrderedDict
+
+import six
+
+
+class Cutflow(object):
+    """
+    Records the number of events, the sum of their *weights* and the wall time of a sequence of
+    cuts. Each call to :py:meth:`add` receives the cumulative boolean mask of events passing all
+    cuts so far, so counts are computed with array operations only. The time of a cut is measured
+    from the previous call to :py:meth:`add` or :py:meth:`start`. Cutflows can be serialized to
+    json-compatible dictionaries and merged, e.g. across branches and datasets. Example:
+
+    .. code-block:: python
+
+       cutflow = Cutflow(weights=events["EventWeight"])
+       cutflow.start()
+       mask = events["triggerIsoMu24"].astype(bool)
+       cutflow.add("trigger", mask)
+       mask &= met_pt > 25
+       cutflow.add("met", mask)
+
+       print(cutflow.table())
+    """
+
+    def __init__(self, weights=None, steps=None):
+        super(Cutflow, self).__init__()
+
+        self.weights = weights
+        self.steps = OrderedDict()
+        self._t0 = time.time()
+
+        for name, step in (steps or {}).items():
+            self.steps[name] = dict(step)
+
+    def start(self):
+        """
+        Starts the timer of the next cut.
+        """
+        self._t0 = time.time()
+
+    def add(self, name, mask=None, n=None, sumw=None):
+        """
+        Adds a cut *name* with the cumulative boolean *mask* of passing events. Instead of a mask,
+        the number of passing events *n* and, for weighted cutflows, their sum of weights *sumw* can
+        be passed.
+        """
+        import numpy as np
+
+        elapsed = time.time() - self._t0
+
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
+            n = int(np.count_nonzero(mask))
+            if self.weights is not None:
+                sumw = float(np.dot(mask, np.asarray(self.weights, dtype=np.float64)))
+        if n is None:
+            raise ValueError("either mask or n must be set for cut {}".format(name))
+        if sumw is None:
+            sumw = float(n)
+
+        step = self.steps.setdefault(name, {"n": 0, "sumw": 0., "time": 0.})
+        step["n"] += n
+        step["sumw"] += sumw
+        step["time"] += elapsed
+
+        # do not count the bookkeeping into the next cut
+        self.start()
+
+    def __contains__(self, name):
+        return name in self.steps
+
+    def __getitem__(self, name):
+        return self.steps[name]
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def to_dict(self):
+        return OrderedDict((name, dict(step)) for name, step in self.steps.items())
+
+    @classmethod
+    def from_dict(cls, steps):
+        return cls(steps=steps)
+
+    @classmethod
+    def merge(cls, cutflows):
+        """
+        Merges *cutflows* by summing counts, weights and times of cuts with the same name. The order
+        of cuts follows their first occurrence.
+        """
+        merged = cls()
+        for cutflow in cutflows:
+            if not isinstance(cutflow, cls):
+                cutflow = cls.from_dict(cutflow)
+            for name, step in cutflow.steps.items():
+                merged.steps.setdefault(name, {"n": 0, "sumw": 0., "time": 0.})
+                for key in ("n", "sumw", "time"):
+                    merged.steps[name][key] += step[key]
+
+        return merged
+
+    def table(self):
+        """
+        Returns a printable table with counts, weights, efficiencies relative to the previous cut
+        and times of all cuts.
+        """
+        lines = ["{:<16} {:>10} {:>14} {:>8} {:>10}".format("cut", "events", "sum weights",
+            "eff", "time / s")]
+        prev = None
+        for name, step in six.iteritems(self.steps):
+            eff = float(step["n"]) / prev if prev else 1.
+            lines.append("{:<16} {:>10d} {:>14.3f} {:>8.4f} {:>10.4f}".format(name, step["n"],
+                step["sumw"], eff, step["time"]))
+            prev = step["n"]
+
+        return "\n".join(lines)
@@ -0,0 +1,144 @@
+# coding: utf-8
+
+"""
+Bulk downloads into the :py:class:`analysis.framework.cache.DownloadCache`. Downloads are
+concurrent with asyncio on python 3 (see :py:mod:`analysis.framework.fetch_async`) and sequential
+otherwise.
+"""
+
+
+__all__ = ["HTTPClientError", "ConnectionPool", "fetch_all"]
+
+
+import os
+import socket
+import threading
+from collections import OrderedDict
+
+import six
+from six.moves import http_client
+from six.moves.urllib.parse import urlsplit
+
+
+class HTTPClientError(Exception):
+    """
+    Error raised for responses with 4xx status codes, which are not retried.
+    """
+
+
+# errors after which a request is retried on a new connection
+retry_errors = (IOError, OSError, socket.error, http_client.HTTPException)
+
+
+class ConnectionPool(object):
+    """
+    Pool of keep-alive http(s) connections per host. Idle connections are reused by subsequent
+    requests to the same host. At most *max_connections* connections per host are in use at a
+    time, which is enforced by the :py:meth:`semaphore` of the host. Connections time out after
+    *timeout* seconds without data.
+    """
+
+    def __init__(self, max_connections=4, timeout=60.):
+        super(ConnectionPool, self).__init__()
+
+        self.max_connections = max_connections
+        self.timeout = timeout
+
+        self._idle = {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_key(url):
+        parts = urlsplit(url)
+        default_port = 443 if parts.scheme == "https" else 80
+        return parts.scheme, parts.hostname, parts.port or default_port
+
+    def semaphore(self, key):
+        # must be called from within the event loop
+        import asyncio
+
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.max_connections)
+        return self._semaphores[key]
+
+    def get(self, key):
+        """
+        Returns an idle connection to the host *key* or opens a new one.
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+
+        scheme, host, port = key
+        cls = http_client.HTTPSConnection if scheme == "https" else http_client.HTTPConnection
+        return cls(host, port, timeout=self.timeout)
+
+    def put(self, key, conn):
+        """
+        Returns the connection *conn* to the host *key* to the pool of idle connections.
+        """
+        with self._lock:
+            self._idle.setdefault(key, []).append(conn)
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+def fetch_all(cache, urls, checksums=None, callback=None, **kwargs):
+    """
+    Downloads *urls* into *cache* and returns an ordered dictionary mapping them to cached paths.
+    *checksums* can map urls to expected sha256 checksums. *callback* is invoked with the number of
+    received bytes and the total number of bytes known so far. On python 3, files are downloaded
+    concurrently via :py:class:`analysis.framework.fetch_async.BulkFetcher`, which receives all
+    *kwargs*. Otherwise, they are downloaded one after another with
+    :py:meth:`analysis.framework.cache.DownloadCache.fetch` and *kwargs* are ignored. Example:
+
+    .. code-block:: python
+
+       cache = DownloadCache.from_env()
+       paths = fetch_all(cache, ["http://opendata.cern.ch/record/206/files/dy.root", ...],
+           max_connections=4)
+    """
+    if six.PY3:
+        from analysis.framework.fetch_async import fetch_all
+        return fetch_all(cache, urls, checksums=checksums, callback=callback, **kwargs)
+
+    return fetch_all_blocking(cache, urls, checksums=checksums, callback=callback)
+
+
+def fetch_all_blocking(cache, urls, checksums=None, callback=None):
+    """
+    Blocking fallback of :py:func:`fetch_all` that downloads *urls* one after another.
+    """
+    checksums = checksums or {}
+    urls = list(OrderedDict.fromkeys(urls))
+
+    # progress of previous files is added to the one of the current file
+    state = {"received": 0, "total": 0}
+
+    def _callback(n, total):
+        if callable(callback):
+            callback(state["received"] + n, state["total"] + (total or n))
+
+    paths = OrderedDict()
+    for url in urls:
+        try:
+            paths[url] = cache.fetch(url, checksum=checksums.get(url), callback=_callback)
+        except six.moves.urllib.error.HTTPError as e:
+            if not 400 <= e.code < 500:
+                raise
+            raise HTTPClientError("request GET {} failed with status {} {}".format(url, e.code,
+                e.msg))
+        size = os.path.getsize(paths[url])
+        state["received"] += size
+        state["total"] += size
+        if callable(callback):
+            callback(state["received"], state["total"])
+
+    return paths
@@ -0,0 +1,325 @@
+# coding: utf-8
+
+"""
+Concurrent bulk downloads into the :py:class:`analysis.framework.cache.DownloadCache` with asyncio.
+Requires python 3 and is therefore excluded from the python 2 lint, use
+:py:func:`analysis.framework.fetch.fetch_all` which falls back to blocking downloads otherwise.
+"""
+
+
+__all__ = ["BulkFetcher", "fetch_all"]
+
+
+import os
+import re
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import six
+from six.moves import http_client
+from six.moves.urllib.parse import urlsplit, urljoin
+
+from analysis.framework.cache import file_sha256
+from analysis.framework.fetch import HTTPClientError, ConnectionPool, retry_errors
+
+
+_content_range_cre = re.compile(r"^bytes\s+(\d+)-(\d+)/(\d+|\*)$")
+
+
+class BulkFetcher(object):
+    """
+    Downloads files concurrently into a *cache* with asyncio, using blocking connections of a
+    :py:class:`ConnectionPool` in a thread pool. Files are requested in ranges of *range_size*
+    bytes. When the server supports range requests, the first range reveals the file size and all
+    remaining ranges are fetched in parallel, otherwise the file is streamed in a single request.
+    Failed requests are retried up to *retries* times, except for responses with 4xx status codes
+    which raise a :py:class:`HTTPClientError`. Received lengths are verified against the
+    headers, and the sha256 checksum of each file against the expected checksum when given.
+    *callback* is invoked with the number of received bytes and the total number of bytes known so
+    far after each received block.
+    """
+
+    block_size = 1024**2
+
+    max_redirects = 5
+
+    def __init__(self, cache, max_connections=4, range_size=16 * 1024**2, retries=3, timeout=60.,
+            callback=None):
+        super(BulkFetcher, self).__init__()
+
+        self.cache = cache
+        self.pool = ConnectionPool(max_connections=max_connections, timeout=timeout)
+        self.range_size = range_size
+        self.retries = retries
+        self.callback = callback
+
+        self._loop = None
+        self._executor = None
+        self._lock_executor = None
+        self._received = 0
+        self._total = 0
+
+    def _progress(self, n):
+        # called in the event loop thread
+        self._received += n
+        if callable(self.callback):
+            self.callback(self._received, self._total)
+
+    def _add_total(self, n):
+        # called in the event loop thread
+        self._total += n
+
+    def _request(self, conn, method, url, headers, sink):
+        # blocking request on conn, returns the response and the redirect location, if any, the
+        # body is read completely and passed block-wise to sink so that the connection can be reused
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        conn.request(method, path, headers=headers)
+        response = conn.getresponse()
+        if response.status in (301, 302, 303, 307, 308):
+            response.read()
+            return response, urljoin(url, response.getheader("Location"))
+        if response.status >= 400:
+            response.read()
+            msg = "request {} {} failed with status {} {}".format(method, url, response.status,
+                response.reason)
+            raise (HTTPClientError if response.status < 500 else IOError)(msg)
+
+        sink(response, None)
+        while True:
+            block = response.read(self.block_size)
+            if not block:
+                break
+            sink(response, block)
+
+        # reads end silently when the connection closes before the announced length is received
+        if response.length:
+            raise http_client.IncompleteRead(b"", response.length)
+
+        return response, None
+
+    async def request(self, method, url, headers=None, sink=None):
+        """
+        Sends a request to *url* on a pooled connection, following redirects, and passes the
+        response and received blocks to ``sink(response, block)``, which is first called with
+        *None* as the block once the headers are received. Returns the url after redirects.
+        """
+        headers = dict(headers or {})
+        sink = sink or (lambda response, block: None)
+
+        for _ in range(self.max_redirects + 1):
+            key = self.pool.host_key(url)
+            async with self.pool.semaphore(key):
+                conn = self.pool.get(key)
+                try:
+                    response, location = await self._loop.run_in_executor(self._executor,
+                        self._request, conn, method, url, headers, sink)
+                except BaseException:
+                    conn.close()
+                    raise
+                if response.will_close:
+                    conn.close()
+                else:
+                    self.pool.put(key, conn)
+
+            if not location:
+                return url
+            url = location
+
+        raise IOError("too many redirects for {}".format(url))
+
+    async def _fetch_range(self, url, path, start, stop, probe=False):
+        # fetch bytes [start, stop) into the file at path and return the url after redirects,
+        # whether the server sent a range, the total file size if known, and the end position,
+        # when probe is set, servers not supporting ranges can send the full file instead
+        state = {"counted": False}
+
+        def sink(response, block):
+            if block is None:
+                content_range = response.getheader("Content-Range")
+                m = _content_range_cre.match(content_range or "")
+                if response.status == 206 and m:
+                    if int(m.group(1)) != start:
+                        raise IOError("unexpected range {} for {}".format(content_range, url))
+                    state["total"] = None if m.group(3) == "*" else int(m.group(3))
+                elif probe and response.status == 200:
+                    # ranges not supported, the full file is sent
+                    length = response.getheader("Content-Length")
+                    state.update(ranged=False, pos=0, total=int(length) if length else None)
+                else:
+                    raise IOError("range request for {} returned status {}".format(url,
+                        response.status))
+                # count the file size towards the total once
+                if probe and not state["counted"] and state["total"] is not None:
+                    state["counted"] = True
+                    self._loop.call_soon_threadsafe(self._add_total, state["total"])
+                state["f"] = open(path, "r+b")
+                state["f"].seek(state["pos"])
+                return
+
+            state["f"].write(block)
+            state["pos"] += len(block)
+            state["received"] += len(block)
+            self._loop.call_soon_threadsafe(self._progress, len(block))
+
+        headers = {"Range": "bytes={}-{}".format(start, stop - 1)}
+        for attempt in range(self.retries + 1):
+            state.update(f=None, ranged=True, pos=start, total=None, received=0)
+            try:
+                url = await self.request("GET", url, headers=headers, sink=sink)
+                break
+            except retry_errors:
+                # bytes of failed attempts are received again, so do not count them twice, pending
+                # progress callbacks were scheduled before the request returned and ran already
+                self._progress(-state["received"])
+                if attempt == self.retries:
+                    raise
+            finally:
+                if state["f"]:
+                    state["f"].close()
+
+        # verify the received length
+        if state["ranged"]:
+            expected = stop if state["total"] is None else min(stop, state["total"])
+        else:
+            expected = state["total"]
+        if expected is not None and state["pos"] != expected:
+            raise IOError("incomplete download of {}, received bytes up to {} of {}".format(url,
+                state["pos"], expected))
+
+        return url, state["ranged"], state["total"], state["pos"]
+
+    async def fetch(self, url, checksum=None):
+        """
+        Downloads *url* into the cache unless it is cached already and returns its cached path.
+        """
+        # hold the lock of the cache for the url while fetching, acquired in a separate executor so
+        # that waiting for other processes does not block the pool of request threads
+        lock = self.cache.lock(url)
+        acquire = self._lock_executor.submit(lock.__enter__)
+        try:
+            await asyncio.wrap_future(acquire, loop=self._loop)
+        except BaseException:
+            # when cancelled while waiting, the executor thread still acquires the lock eventually,
+            # so release it right after, unless acquiring was cancelled before it started or failed
+            def release(future):
+                if not future.cancelled() and future.exception() is None:
+                    lock.__exit__(None, None, None)
+            acquire.add_done_callback(release)
+            raise
+
+        try:
+            path = self.cache.lookup(url, checksum=checksum)
+            if not path:
+                path = await self._fetch(url, checksum=checksum)
+
+            # mark as recently used
+            os.utime(path, None)
+        finally:
+            lock.__exit__(None, None, None)
+
+        return path
+
+    async def _fetch(self, url, checksum=None):
+        # ranges are written out of order, so use a dedicated partial file next to the contiguous
+        # one of the cache which would be resumed incorrectly otherwise, and remove it on failures
+        partial_path = self.cache.partial_path(url) + ".ranges"
+        open(partial_path, "wb").close()
+        try:
+            return await self._fetch_ranges(url, partial_path, checksum=checksum)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+    async def _fetch_ranges(self, url, partial_path, checksum=None):
+        # the first range reveals the total size and whether ranges are supported
+        final_url, ranged, total, received = await self._fetch_range(url, partial_path, 0,
+            self.range_size, probe=True)
+        if total is None:
+            self._add_total(received)
+        if ranged and total is not None and total > received:
+            with open(partial_path, "r+b") as f:
+                f.truncate(total)
+            starts = six.moves.range(received, total, self.range_size)
+            tasks = [
+                asyncio.ensure_future(self._fetch_range(final_url, partial_path, start,
+                    min(start + self.range_size, total)))
+                for start in starts
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # stop remaining ranges before the partial file is removed
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        elif total is not None and received != total:
+            raise IOError("incomplete download of {}, received {} of {} bytes".format(url,
+                received, total))
+
+        # verify the content
+        digest = await self._loop.run_in_executor(self._executor, file_sha256, partial_path)
+        if checksum and digest != checksum:
+            raise IOError("checksum mismatch for {}: expected {}, got {}".format(url, checksum,
+                digest))
+
+        return self.cache.store(url, partial_path, digest)
+
+    async def fetch_all(self, urls, checksums=None):
+        """
+        Downloads all *urls* concurrently and returns an ordered dictionary mapping them to their
+        cached paths. *checksums* can map urls to expected sha256 checksums.
+        """
+        checksums = checksums or {}
+        urls = list(OrderedDict.fromkeys(urls))
+
+        n_hosts = len(set(self.pool.host_key(url) for url in urls))
+        self._loop = asyncio.get_event_loop()
+        self._executor = ThreadPoolExecutor(max(n_hosts * self.pool.max_connections, 1))
+        self._lock_executor = ThreadPoolExecutor(max(len(urls), 1))
+        tasks = [asyncio.ensure_future(self.fetch(url, checksums.get(url))) for url in urls]
+        try:
+            paths = await asyncio.gather(*tasks)
+        except BaseException:
+            # cancel remaining downloads so that they remove their partial files
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            self._executor.shutdown(wait=True)
+            # threads still waiting for locks of cancelled fetches release them once acquired
+            self._lock_executor.shutdown(wait=False)
+            self.pool.close()
+
+        self.cache.evict(keep=paths)
+
+        return OrderedDict(zip(urls, paths))
+
+
+def fetch_all(cache, urls, checksums=None, **kwargs):
+    """
+    Downloads *urls* concurrently into *cache* via :py:class:`BulkFetcher`, which receives all
+    *kwargs*, and returns an ordered dictionary mapping urls to cached paths. *checksums* can map
+    urls to expected sha256 checksums. Example:
+
+    .. code-block:: python
+
+       cache = DownloadCache.from_env()
+       paths = fetch_all(cache, ["http://opendata.cern.ch/record/206/files/dy.root", ...],
+           max_connections=4)
+    """
+    fetcher = BulkFetcher(cache, **kwargs)
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(fetcher.fetch_all(urls, checksums=checksums))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
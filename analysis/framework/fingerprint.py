@@ -0,0 +1,183 @@
+# coding: utf-8
+
+"""
+Fingerprints of files, source code and parameters used to detect outdated task outputs.
+"""
+
+
+__all__ = ["file_checksum", "source_checksum", "source_dependencies", "fingerprint"]
+
+
+import os
+import ast
+import json
+import inspect
+import hashlib
+import textwrap
+import importlib
+
+import six
+
+
+def file_checksum(path, cache=None, chunk_size=1024**2):
+    """
+    Returns the sha256 checksum of the content of the file at *path*. When *cache* is given, it
+    should be a dictionary mapping paths to previously computed entries ``{"stat": [size, mtime],
+    "sha256": checksum}``, e.g. as stored in task fingerprints. The checksum is only recomputed
+    when the file changed, and the entry in *cache* is updated.
+    """
+    path = os.path.abspath(os.path.expandvars(os.path.expanduser(path)))
+    stat = os.stat(path)
+    key = [stat.st_size, stat.st_mtime]
+
+    if cache is not None:
+        entry = cache.get(path)
+        if entry and entry.get("stat") == key:
+            return entry["sha256"]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    checksum = h.hexdigest()
+
+    if cache is not None:
+        cache[path] = {"stat": key, "sha256": checksum}
+
+    return checksum
+
+
+def _resolve(name):
+    # resolve a dotted name to a module or an object within a module
+    parts = name.split(".")
+    for i in range(len(parts), 0, -1):
+        try:
+            obj = importlib.import_module(".".join(parts[:i]))
+        except ImportError:
+            continue
+        for attr in parts[i:]:
+            obj = getattr(obj, attr)
+        return obj
+
+    raise ImportError("cannot resolve {}".format(name))
+
+
+def _is_module(name):
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        return False
+    return True
+
+
+def _imports(nodes, package):
+    # names of modules within package imported by import statements in nodes
+    names = []
+    for node in nodes:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                # the imported name can be a module itself
+                name = node.module + "." + alias.name
+                names.append(name if _is_module(name) else node.module)
+
+    return [name for name in names if name.split(".")[0] == package]
+
+
+# sources and imports of modules, keyed by file path, size and modification time, and of classes
+# and functions, keyed by the object and the source of its module
+_module_cache = {}
+_object_cache = {}
+
+
+def _module_info(name):
+    # returns the encoded source of the module name and the modules of the same package it imports
+    module = importlib.import_module(name)
+    path = inspect.getsourcefile(module)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
+    if key not in _module_cache:
+        with open(path, "rb") as f:
+            source = f.read()
+        imports = _imports(ast.walk(ast.parse(source)), name.split(".")[0])
+        _module_cache[key] = (source, imports)
+
+    return _module_cache[key]
+
+
+def _object_info(obj):
+    # returns the encoded source of a class or function and the modules of the same package
+    # imported within it or at the top level of its module
+    module_source = _module_info(obj.__module__)[0]
+    key = (obj, module_source)
+    if key not in _object_cache:
+        source = inspect.getsource(obj)
+        package = obj.__module__.split(".")[0]
+        imports = _imports(ast.walk(ast.parse(textwrap.dedent(source))), package)
+        imports += _imports(ast.parse(module_source).body, package)
+        _object_cache[key] = (source.encode("utf-8"), imports)
+
+    return _object_cache[key]
+
+
+def _code_objects(objects):
+    # returns the encoded source and the directly imported modules of each code object, or its
+    # representation for other objects such as constant lists
+    for obj in objects:
+        if isinstance(obj, six.string_types):
+            obj = _resolve(obj)
+        while hasattr(obj, "__wrapped__"):
+            obj = obj.__wrapped__
+
+        if inspect.ismodule(obj):
+            yield _module_info(obj.__name__)
+        elif inspect.isclass(obj) or inspect.isroutine(obj):
+            yield _object_info(obj)
+        else:
+            yield repr(obj).encode("utf-8"), []
+
+
+def source_dependencies(*objects):
+    """
+    Returns the sorted names of all modules whose source enters :py:func:`source_checksum` of
+    *objects*.
+    """
+    modules = set()
+    queue = [name for _, imports in _code_objects(objects) for name in imports]
+    while queue:
+        name = queue.pop()
+        if name not in modules:
+            modules.add(name)
+            queue.extend(_module_info(name)[1])
+
+    return sorted(modules)
+
+
+def source_checksum(*objects):
+    """
+    Returns the sha256 checksum of the source code of *objects*, which can be modules, classes or
+    functions, or their dotted names such as
+    ``"analysis.framework.selection.select_singletop"``. Imports are followed within the top-level
+    package of each object: the full source of all modules imported by the objects, including
+    imports within functions and at the top level of the module of classes and functions, and of
+    all modules imported by those in turn, is considered as well. Decorated functions are
+    unwrapped. For other objects such as constant lists, their representation is used instead.
+    """
+    h = hashlib.sha256()
+    for source, _ in _code_objects(objects):
+        h.update(source)
+    for name in source_dependencies(*objects):
+        h.update(name.encode("utf-8"))
+        h.update(_module_info(name)[0])
+
+    return h.hexdigest()
+
+
+def fingerprint(*parts):
+    """
+    Returns a sha256 checksum of *parts*, which must be json serializable, e.g. parameter
+    dictionaries and file or source checksums. Dictionaries are serialized with sorted keys.
+    """
+    data = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
@@ -0,0 +1,139 @@
+# coding: utf-8
+
+"""
+Histogram filling functions.
+"""
+
+
+__all__ = ["bin_indexes", "fill_hist", "fill_variables", "fill_variations", "select_variation"]
+
+
+from collections import OrderedDict
+
+
+def bin_indexes(values, bin_edges):
+    """
+    Returns a boolean mask of *values* that are within the binning defined by *bin_edges*, and the
+    bin index of each of these values. As in ``numpy.histogram``, the last bin includes its upper
+    edge. Bin indexes are computed arithmetically and only corrected at bin edges, which is
+    considerably faster than sorting-based approaches.
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    bin_edges = np.asarray(bin_edges, dtype=np.float64)
+    n_bins = len(bin_edges) - 1
+
+    # estimate the bin index assuming equidistant bins, then correct it at edges
+    x_min, x_max = bin_edges[0], bin_edges[-1]
+    valid = (values >= x_min) & (values <= x_max)
+    values = values[valid]
+    idx = ((values - x_min) * (n_bins / (x_max - x_min))).astype(np.int64)
+    np.clip(idx, 0, n_bins - 1, out=idx)
+    if not np.allclose(np.diff(bin_edges), (x_max - x_min) / n_bins):
+        idx = np.searchsorted(bin_edges, values, side="right") - 1
+        np.clip(idx, 0, n_bins - 1, out=idx)
+    idx -= values < bin_edges[idx]
+    idx += (values >= bin_edges[idx + 1]) & (idx < n_bins - 1)
+
+    return valid, idx
+
+
+def _fill_indexes(valid, idx, n_bins, weights=None):
+    import numpy as np
+
+    if weights is None:
+        sumw = np.bincount(idx, minlength=n_bins).astype(np.float64)
+        return sumw, sumw.copy()
+
+    weights = np.asarray(weights, dtype=np.float64)[valid]
+    sumw = np.bincount(idx, weights=weights, minlength=n_bins)
+    sumw2 = np.bincount(idx, weights=weights**2., minlength=n_bins)
+
+    return sumw, sumw2
+
+
+def fill_hist(values, bin_edges, weights=None):
+    """
+    Fills *values* with optional *weights* into a histogram with *bin_edges* and returns the sum of
+    weights and the sum of squared weights per bin. As in ``numpy.histogram``, the last bin includes
+    its upper edge and values outside the binning are ignored. Bin indexes are computed with
+    :py:func:`bin_indexes`, followed by a ``numpy.bincount``. Example:
+
+    .. code-block:: python
+
+       fill_hist(np.array([0.5, 1.5, 1.7, 5.]), [0., 1., 2.], np.array([1., 2., 3., 4.]))
+       # -> "(array([1., 5.]), array([ 1., 13.]))"
+    """
+    valid, idx = bin_indexes(values, bin_edges)
+    return _fill_indexes(valid, idx, len(bin_edges) - 1, weights)
+
+
+def fill_variables(events, variables, weight="EventWeight"):
+    """
+    Fills histograms for all *variables* (order.Variable instances) with values of *events* and
+    returns them in an ordered dictionary mapping variable names to ``(sumw, sumw2)`` tuples.
+    Variables whose *weight* auxiliary data is *False* are filled without weights.
+    """
+    weights = events[weight]
+
+    hists = OrderedDict()
+    for variable in variables:
+        use_weight = variable.get_aux("weight", True)
+        hists[variable.name] = fill_hist(events[variable.expression], variable.bin_edges,
+            weights=weights if use_weight else None)
+
+    return hists
+
+
+def fill_variations(events, variables, weights):
+    """
+    Fills histograms for all *variables* with values of *events* in a single pass, once for each
+    weight column in *weights*, an ordered dictionary mapping variation names to per-event weights,
+    e.g. as returned by :py:func:`analysis.framework.weights.weight_variations`. Bin indexes are
+    computed only once per variable, so each additional variation only costs one weighted
+    ``numpy.bincount``. Returns an ordered dictionary mapping variable names to ordered dictionaries
+    that map variation names to ``(sumw, sumw2)`` tuples. Variables whose *weight* auxiliary data
+    is *False* are filled without weights and hence identical for all variations.
+    """
+    hists = OrderedDict()
+    for variable in variables:
+        valid, idx = bin_indexes(events[variable.expression], variable.bin_edges)
+        n_bins = len(variable.bin_edges) - 1
+
+        hists[variable.name] = OrderedDict()
+        if not variable.get_aux("weight", True):
+            hist = _fill_indexes(valid, idx, n_bins)
+            for name in weights:
+                hists[variable.name][name] = hist
+        else:
+            for name, _weights in weights.items():
+                hists[variable.name][name] = _fill_indexes(valid, idx, n_bins, _weights)
+
+    return hists
+
+
+def select_variation(hists, variation):
+    """
+    Returns a copy of the flat histogram data *hists* as saved by the FillHistograms task, where
+    entries of the *variation* (``"<variable>.<variation>.sumw"``, ``"sum_weights.<variation>"``)
+    replace the nominal entries (``"<variable>.sumw"``, ``"sum_weights"``), so that it can be passed
+    to plotting functions unchanged. A *KeyError* is raised when *hists* contain no entries for
+    *variation*.
+    """
+    if variation == "nominal":
+        return dict(hists)
+
+    if "sum_weights." + variation not in hists:
+        raise KeyError("no histograms found for variation {}".format(variation))
+
+    # start from nominal entries, then replace those with a counterpart in the variation
+    data = {key: value for key, value in hists.items()
+        if key.count(".") == 1 and not key.startswith("sum_weights.")}
+    data["sum_weights"] = hists["sum_weights." + variation]
+    for key, value in hists.items():
+        parts = key.split(".")
+        if len(parts) == 3 and parts[1] == variation:
+            data[parts[0] + "." + parts[2]] = value
+
+    return data
@@ -0,0 +1,272 @@
+# coding: utf-8
+
+"""
+Lightweight, numpy-backed Lorentz vectors as a replacement of ROOT.TLorentzVector.
+"""
+
+
+__all__ = ["LorentzVectorArray", "LorentzVector"]
+
+
+class LorentzVectorArray(object):
+    """
+    Collection of Lorentz vectors whose components are stored in a single ``(4, n)`` array *data*
+    with rows E, px, py and pz. Kinematic quantities are computed vectorized over all vectors.
+    Integer access returns a :py:class:`LorentzVector` that views the data. Example:
+
+    .. code-block:: python
+
+       jets = LorentzVectorArray.from_components(jet_e, jet_px, jet_py, jet_pz)
+       jets.pt          # => array of transverse momenta
+       (jets + mu).mass  # => array of invariant masses
+       jets[0].Pt()     # => pt of the first jet
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        super(LorentzVectorArray, self).__init__()
+
+        import numpy as np
+
+        self.data = np.asarray(data, dtype=np.float64)
+
+    @classmethod
+    def from_components(cls, e, px, py, pz):
+        import numpy as np
+
+        return cls(np.vstack([e, px, py, pz]).astype(np.float64))
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def __repr__(self):
+        return "<{} len={} at {}>".format(self.__class__.__name__, len(self), hex(id(self)))
+
+    def __getitem__(self, key):
+        import numpy as np
+
+        if isinstance(key, (int, np.integer)):
+            return LorentzVector(self.data, key)
+        return self.__class__(self.data[:, key])
+
+    def __add__(self, other):
+        return self.__class__(self.data + _get_data(other))
+
+    def __sub__(self, other):
+        return self.__class__(self.data - _get_data(other))
+
+    def __mul__(self, factor):
+        return self.__class__(self.data * factor)
+
+    __rmul__ = __mul__
+
+    def __imul__(self, factor):
+        self.data *= factor
+        return self
+
+    @property
+    def e(self):
+        return self.data[0]
+
+    @property
+    def px(self):
+        return self.data[1]
+
+    @property
+    def py(self):
+        return self.data[2]
+
+    @property
+    def pz(self):
+        return self.data[3]
+
+    @property
+    def pt(self):
+        import numpy as np
+
+        return np.hypot(self.data[1], self.data[2])
+
+    @property
+    def p(self):
+        import numpy as np
+
+        return np.sqrt(self.data[1]**2. + self.data[2]**2. + self.data[3]**2.)
+
+    @property
+    def eta(self):
+        import numpy as np
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.arcsinh(self.data[3] / self.pt)
+
+    @property
+    def phi(self):
+        import numpy as np
+
+        return np.arctan2(self.data[2], self.data[1])
+
+    @property
+    def mass(self):
+        import numpy as np
+
+        # negative for space-like vectors, as in TLorentzVector.M
+        m2 = self.data[0]**2. - self.data[1]**2. - self.data[2]**2. - self.data[3]**2.
+        return np.sign(m2) * np.sqrt(np.abs(m2))
+
+    @property
+    def boost_vector(self):
+        return self.data[1:] / self.data[0]
+
+    def sum(self):
+        """
+        Returns the sum of all vectors as a single :py:class:`LorentzVector`.
+        """
+        return LorentzVector(self.data.sum(axis=1)[:, None], 0)
+
+    def boost(self, beta):
+        """
+        Returns the vectors boosted by *beta*, either a vector of three components or an array of
+        shape ``(3, n)``, following the conventions of TLorentzVector.Boost.
+        """
+        import numpy as np
+
+        beta = np.asarray(beta, dtype=np.float64).reshape(3, -1)
+        e, p = self.data[0], self.data[1:]
+
+        b2 = (beta**2.).sum(axis=0)
+        gamma = 1. / np.sqrt(1. - b2)
+        bp = (beta * p).sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gamma2 = np.where(b2 > 0, (gamma - 1.) / b2, 0.)
+
+        return self.__class__(np.vstack([gamma * (e + bp), p + (gamma2 * bp + gamma * e) * beta]))
+
+    def cos_angle(self, other):
+        """
+        Returns the cosine of the angle between the spatial components of these and *other*
+        vectors.
+        """
+        import numpy as np
+
+        p, q = self.data[1:], _get_data(other)[1:]
+        return (p * q).sum(axis=0) / np.sqrt((p**2.).sum(axis=0) * (q**2.).sum(axis=0))
+
+
+class LorentzVector(object):
+    """
+    Single Lorentz vector that views column *index* of a ``(4, n)`` array *data*, providing the
+    interface of ROOT.TLorentzVector that is used in the analysis. Additional attributes, such as
+    the isolation of leptons, are stored in *attrs* and are accessible as instance attributes.
+    """
+
+    __slots__ = ("_data", "_index", "attrs")
+
+    def __init__(self, data, index, attrs=None):
+        super(LorentzVector, self).__init__()
+
+        self._data = data
+        self._index = index
+        self.attrs = attrs or {}
+
+    @classmethod
+    def from_components(cls, e, px, py, pz):
+        import numpy as np
+
+        return cls(np.array([[e], [px], [py], [pz]], dtype=np.float64), 0)
+
+    def __getattr__(self, attr):
+        try:
+            return object.__getattribute__(self, "attrs")[attr]
+        except KeyError:
+            raise AttributeError("'{}' object has no attribute '{}'".format(
+                self.__class__.__name__, attr))
+
+    def __repr__(self):
+        return "<{} (E={}, px={}, py={}, pz={}) at {}>".format(self.__class__.__name__,
+            *(tuple(self.components) + (hex(id(self)),)))
+
+    @property
+    def components(self):
+        return self._data[:, self._index]
+
+    def __add__(self, other):
+        return self.__class__((self.components + other.components)[:, None], 0)
+
+    def __sub__(self, other):
+        return self.__class__((self.components - other.components)[:, None], 0)
+
+    def __mul__(self, factor):
+        return self.__class__((self.components * factor)[:, None], 0)
+
+    __rmul__ = __mul__
+
+    def __imul__(self, factor):
+        self._data[:, self._index] *= factor
+        return self
+
+    def E(self):
+        return float(self._data[0, self._index])
+
+    def Px(self):
+        return float(self._data[1, self._index])
+
+    def Py(self):
+        return float(self._data[2, self._index])
+
+    def Pz(self):
+        return float(self._data[3, self._index])
+
+    def SetE(self, e):
+        self._data[0, self._index] = e
+
+    def Pt(self):
+        return (self.Px()**2. + self.Py()**2.)**0.5
+
+    def P(self):
+        return (self.Px()**2. + self.Py()**2. + self.Pz()**2.)**0.5
+
+    def Eta(self):
+        import math
+
+        pt = self.Pt()
+        if pt == 0:
+            return 1e10 if self.Pz() >= 0 else -1e10
+        return math.asinh(self.Pz() / pt)
+
+    def Phi(self):
+        import math
+
+        return math.atan2(self.Py(), self.Px())
+
+    def M(self):
+        m2 = self.E()**2. - self.P()**2.
+        return m2**0.5 if m2 >= 0 else -(-m2)**0.5
+
+    def Vect(self):
+        return self.components[1:].copy()
+
+    def BoostVector(self):
+        return self.components[1:] / self.E()
+
+    def Boost(self, *beta):
+        # accept both a single vector and three components
+        beta = beta[0] if len(beta) == 1 else beta
+        boosted = LorentzVectorArray(self.components[:, None]).boost(beta)
+        self._data[:, self._index] = boosted.data[:, 0]
+
+    def Angle(self, vect):
+        import math
+        import numpy as np
+
+        p = self.components[1:]
+        cos = np.dot(p, vect) / (np.dot(p, p) * np.dot(vect, vect))**0.5
+        return math.acos(max(-1., min(1., cos)))
+
+
+def _get_data(v):
+    if isinstance(v, LorentzVectorArray):
+        return v.data
+    if isinstance(v, LorentzVector):
+        return v.components[:, None]
+    return v
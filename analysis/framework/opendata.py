@@ -11,16 +11,15 @@ __all__ = [
 ]
 
 
+from analysis.framework.lorentz import LorentzVector
+
+
 # lorentz vector attributes
 _vector_attrs = ("_E", "_Px", "_Py", "_Pz")
 
 
 def make_particle(E, px, py, pz):
-    import ROOT
-    ROOT.PyConfig.IgnoreCommandLineOptions = True
-    ROOT.gROOT.SetBatch()
-
-    return ROOT.TLorentzVector(px, py, pz, E)
+    return LorentzVector.from_components(E, px, py, pz)
 
 
 def load_value(event, field, i=-1, default=0.):
@@ -51,7 +50,7 @@ def load_particle(event, i, name, vector_attrs=_vector_attrs, attrs=None):
         ext["i"] = i
     if attrs:
         ext.update({attr.strip("_"): load_value(event, name + attr, i) for attr in attrs})
-    particle.__dict__.update(ext)
+    particle.attrs.update(ext)
 
     return particle
 
@@ -0,0 +1,140 @@
+# coding: utf-8
+
+"""
+Parallel processing of events within a single event store.
+"""
+
+
+__all__ = ["map_event_chunks", "split_ranges", "cpu_count"]
+
+
+import os
+import logging
+import multiprocessing
+
+from six.moves import zip
+
+from analysis.framework.util import partial_slices
+
+
+logger = logging.getLogger(__name__)
+
+# data shared with worker processes, set by the pool initializer
+_shared = {}
+
+# paths of stores for which a warning on compressed columns was issued
+_compressed_warned = set()
+
+
+def cpu_count():
+    """
+    Returns the number of cores usable by the current process, respecting cpu affinity masks of
+    batch systems when available.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return multiprocessing.cpu_count()
+
+
+def map_event_chunks(func, paths, n_events, n_workers=1, n_chunks=None, chunks=None, fields=None,
+        mmap=True, callback=None):
+    """
+    Splits the *n_events* events of the event stores at *paths*, joined as in
+    :py:func:`analysis.framework.store.load_events`, into *n_chunks* chunks and calls *func* with
+    the events of each chunk in a pool of *n_workers* processes. Returns a list of ``(start,
+    result)`` tuples in the order of chunks, where *start* is the index of the first event of a
+    chunk. Workers do not receive copies of the events, but read only the columns *fields* of their
+    chunk through memory maps of the stores, so the operating system shares pages between
+    processes. This does not apply to compressed columns, which each worker decompresses into its
+    own memory, so a warning is issued once per store when they are read by multiple workers.
+    *n_chunks* defaults to four times the number of workers for a better load balance.
+    Instead, explicit *chunks* can be given as a list of ``(start, stop)`` event ranges, e.g. to
+    process only a subset of events, see :py:func:`split_ranges`. *callback* is invoked with the
+    number of processed events after each chunk. When *n_workers* is
+    1, chunks are processed in the current process. *func* must be picklable, e.g. a module-level
+    function or a ``functools.partial`` of it.
+    """
+    n_workers = max(int(n_workers), 1)
+    if chunks is None:
+        n_chunks = max(min(n_chunks or 4 * n_workers, n_events), 1)
+        chunks = partial_slices(n_events, n_chunks)
+    else:
+        chunks = [tuple(chunk) for chunk in chunks]
+        n_chunks = len(chunks)
+    if not chunks:
+        return []
+
+    paths = list(paths)
+    if n_workers > 1 and n_chunks > 1:
+        _warn_compressed(paths, fields)
+
+    args = (func, paths, fields, mmap)
+    if n_workers == 1:
+        _init_worker(*args)
+        results = (_worker(chunk) for chunk in chunks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(min(n_workers, n_chunks), _init_worker, args)
+        results = pool.imap(_worker, chunks)
+
+    try:
+        output = []
+        n_processed = 0
+        for (start, stop), result in zip(chunks, results):
+            output.append(result)
+            n_processed += stop - start
+            if callable(callback):
+                callback(n_processed)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        _shared.clear()
+
+    return output
+
+
+def split_ranges(ranges, n_chunks):
+    """
+    Splits the ``(start, stop)`` event *ranges* into at least about *n_chunks* chunks of similar
+    size and returns them as a list of ``(start, stop)`` tuples. Ranges are never merged.
+    """
+    n_total = sum(stop - start for start, stop in ranges)
+    chunk_size = max(n_total // max(n_chunks, 1), 1)
+
+    chunks = []
+    for start, stop in ranges:
+        n = max(int(round(float(stop - start) / chunk_size)), 1)
+        chunks.extend((start + a, start + b) for a, b in partial_slices(stop - start, n))
+
+    return chunks
+
+
+def _warn_compressed(paths, fields):
+    from analysis.framework.store import EventStore
+
+    for path in paths:
+        if path in _compressed_warned:
+            continue
+        with EventStore(path) as store:
+            names = [name for name in (store.fields if fields is None else fields)
+                if name in store and store.is_compressed(name)]
+        if names:
+            _compressed_warned.add(path)
+            logger.warning("columns {} of {} are compressed and therefore decompressed by each "
+                "worker instead of being shared through memory maps, consider an uncompressed "
+                "store for multiple workers".format(", ".join(names), path))
+
+
+def _init_worker(func, paths, fields, mmap):
+    _shared.update(func=func, paths=paths, fields=fields, mmap=mmap)
+
+
+def _worker(chunk):
+    from analysis.framework.store import load_events
+
+    start, stop = chunk
+    events = load_events(_shared["paths"], _shared["fields"], mmap=_shared["mmap"], start=start,
+        stop=stop)
+
+    return start, _shared["func"](events)
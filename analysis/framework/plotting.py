@@ -5,39 +5,102 @@ Plotting functions.
 """
 
 
-__all__ = ["stack_plot"]
+__all__ = ["stack_plot", "stack_plots"]
 
 
-def stack_plot(events, variable, path, weight="EventWeight"):
+import multiprocessing
+
+from six.moves import zip
+
+
+# histograms and variables shared with plotting worker processes
+_shared = {}
+
+
+def _full_title(variable, axis):
+    # newer versions of order renamed get_full_<axis>_title to full_<axis>_title
+    getter = getattr(variable, "full_{}_title".format(axis), None)
+    if not callable(getter):
+        getter = getattr(variable, "get_full_{}_title".format(axis))
+    return getter()
+
+
+def stack_plot(hists, variable, path):
+    """
+    Creates a stack plot of *variable* and saves it at *path*. *hists* should map processes to
+    histogram data as produced by :py:func:`analysis.framework.histograms.fill_variables`, i.e.,
+    mappings containing the sum of weights per bin (``"<variable>.sumw"``) and the total sum of
+    event weights (``"sum_weights"``).
+    """
+    import numpy as np
     import matplotlib
     matplotlib.use("AGG")
     import matplotlib.pyplot as plt
 
+    bin_edges = np.array(variable.bin_edges)
+    bin_centers = 0.5 * (bin_edges[1:] + bin_edges[:-1])
+
     values, weights, labels, colors = [], [], [], []
     s, b = 0., 0.
-    for process, evts in list(events.items())[::-1]:
-        values.append(evts[variable.expression])
-        weights.append(evts[weight])
+    for process, hist in list(hists.items())[::-1]:
+        values.append(bin_centers)
+        weights.append(hist[variable.name + ".sumw"])
         labels.append(process.label)
         colors.append(process.color)
         if process == "singleTop":
-            s += weights[-1].sum()
+            s += float(hist["sum_weights"])
         else:
-            b += weights[-1].sum()
-
-    use_weight = variable.get_aux("weight", True)
+            b += float(hist["sum_weights"])
 
     fig = plt.figure()
     ax = fig.add_subplot(1, 1, 1)
     ax.set_xlim(variable.x_min, variable.x_max)
-    ax.set_xlabel(variable.get_full_x_title())
-    ax.set_ylabel(variable.get_full_y_title())
+    ax.set_xlabel(_full_title(variable, "x"))
+    ax.set_ylabel(_full_title(variable, "y"))
     ax.tick_params("both", direction="in", top=True, right=True)
 
-    ax.hist(values, variable.bin_edges, weights=weights if use_weight else None, histtype="step",
-        stacked=True, fill=True, color=colors, edgecolor="black", linewidth=0.5)
+    # histograms are already filled, so use bin centers as values and bin contents as weights
+    ax.hist(values, bin_edges, weights=weights, histtype="step", stacked=True, fill=True,
+        color=colors, edgecolor="black", linewidth=0.5)
     ax.legend(labels[::-1])
     ax.text(1, 1, r"S / $\sqrt{B}$ = %.2f" % (s / b ** 0.5,), ha="right", va="bottom", size="small",
         transform=ax.transAxes)
 
+    # close the figure as pyplot keeps references to all open figures otherwise
     fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+def stack_plots(hists, variables, paths, n_workers=1):
+    """
+    Creates stack plots for all *variables* via :py:func:`stack_plot` and saves them at the
+    corresponding *paths*. This function is a generator that yields ``(variable, path)`` tuples
+    as soon as a plot is written. When *n_workers* is larger than one, plots are rendered in a
+    process pool whose workers receive a single, read-only copy of *hists* and *variables* upon
+    start, and the order of yielded plots can differ from the order of *variables*.
+    """
+    variables, paths = list(variables), list(paths)
+
+    if n_workers <= 1:
+        for variable, path in zip(variables, paths):
+            stack_plot(hists, variable, path)
+            yield variable, path
+        return
+
+    pool = multiprocessing.Pool(min(n_workers, len(variables)) or 1, _init_plot_worker,
+        (hists, variables, paths))
+    try:
+        for i in pool.imap_unordered(_plot_worker, range(len(variables))):
+            yield variables[i], paths[i]
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _init_plot_worker(hists, variables, paths):
+    _shared.update(hists=hists, variables=variables, paths=paths)
+
+
+def _plot_worker(i):
+    stack_plot(_shared["hists"], _shared["variables"][i], _shared["paths"][i])
+    return i
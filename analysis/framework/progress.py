@@ -0,0 +1,131 @@
+# coding: utf-8
+
+"""
+Throttled progress reporting.
+"""
+
+
+__all__ = ["ProgressReporter", "callback_step", "format_duration"]
+
+
+import time
+
+
+def callback_step(n, max_updates=100):
+    """
+    Returns the number of items after which loops over *n* items should invoke progress callbacks
+    so that they are called at most about *max_updates* times.
+    """
+    return max(int(n) // max(int(max_updates), 1), 1)
+
+
+def format_duration(seconds):
+    """
+    Formats a duration given in *seconds* as a compact string such as ``"1h02m03s"``.
+    """
+    seconds = int(round(max(seconds, 0)))
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    if h:
+        return "{:d}h{:02d}m{:02d}s".format(h, m, s)
+    if m:
+        return "{:d}m{:02d}s".format(m, s)
+    return "{:d}s".format(s)
+
+
+class ProgressReporter(object):
+    """
+    Aggregates progress updates of a computation over *n_total* items and forwards them at a
+    bounded rate. An update is emitted when at least *interval* seconds passed or the processed
+    fraction increased by at least *fraction_step* since the last emitted update, and always when
+    the computation is complete. Each emitted update calls *publish_progress* with the percentage,
+    mapped into the *reach* range, and *publish_message* with the number of processed items, the
+    throughput in *unit* per second and the estimated remaining time. Both callables are optional.
+    Updates in between are cheap, so :py:meth:`update` can be used as a callback of loops, chunks
+    or vectorized steps alike. Example:
+
+    .. code-block:: python
+
+       reporter = ProgressReporter(len(events), publish_progress=task.publish_progress,
+           publish_message=task.publish_message)
+       select_singletop(events, callback=lambda i: reporter.update(i + 1))
+    """
+
+    def __init__(self, n_total, publish_progress=None, publish_message=None, interval=5.,
+            fraction_step=0.05, unit="events", reach=(0., 100.)):
+        super(ProgressReporter, self).__init__()
+
+        self.n_total = n_total
+        self.publish_progress = publish_progress
+        self.publish_message = publish_message
+        self.interval = interval
+        self.fraction_step = fraction_step
+        self.unit = unit
+        self.reach = reach
+
+        self.n = 0
+        self.n_updates = 0
+        self.t0 = time.time()
+        self._last_time = self.t0
+        self._last_fraction = 0.
+
+    @property
+    def fraction(self):
+        return min(float(self.n) / self.n_total, 1.) if self.n_total else 1.
+
+    @property
+    def elapsed(self):
+        return time.time() - self.t0
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.n / elapsed if elapsed > 0 else 0.
+
+    @property
+    def eta(self):
+        rate = self.rate
+        return (self.n_total - self.n) / rate if rate > 0 else None
+
+    def update(self, n):
+        """
+        Sets the number of processed items to *n* and emits an update if due.
+        """
+        self.n = n
+        fraction = self.fraction
+        now = time.time()
+        if fraction < 1 and now - self._last_time < self.interval and \
+                fraction - self._last_fraction < self.fraction_step:
+            return
+
+        self._last_time = now
+        self._last_fraction = fraction
+        self.emit()
+
+    def advance(self, n=1):
+        """
+        Increments the number of processed items by *n* and emits an update if due.
+        """
+        self.update(self.n + n)
+
+    def update_fraction(self, fraction):
+        """
+        Sets the processed *fraction* of items and emits an update if due.
+        """
+        self.update(fraction * self.n_total)
+
+    def emit(self):
+        """
+        Emits an update unconditionally.
+        """
+        self.n_updates += 1
+
+        if callable(self.publish_progress):
+            start, end = self.reach
+            self.publish_progress(start + self.fraction * (end - start))
+
+        if callable(self.publish_message):
+            eta = self.eta
+            self.publish_message("processed {} / {} {} ({:.1f} {}/s, ETA {})".format(
+                int(self.n), int(self.n_total), self.unit, self.rate, self.unit,
+                "-" if eta is None else format_duration(eta)))
@@ -5,23 +5,49 @@ Event reconstruction and helpers.
 """
 
 
-__all__ = ["reconstruct_singletop"]
+__all__ = [
+    "reconstruct_singletop", "reconstruct_singletop_columnar", "select_and_reconstruct_singletop",
+    "solve_neutrino_pz",
+]
 
 
+import math
+
 from six.moves import zip
 
+from analysis.framework.opendata import make_particle
+from analysis.framework.lorentz import LorentzVectorArray
+from analysis.framework.progress import callback_step
+
+
+# names of reconstructed variables
+reco_names = [
+    "Jet1_Pt", "Nu_Pz", "W_Pt", "W_M", "Top_Pt", "Top_M", "FwdJet_Eta", "CosThetaStar",
+]
+
+# event columns read by the reconstruction, in addition to the selected objects
+reco_input_columns = [
+    "Jet_E", "Jet_Px", "Jet_Py", "Jet_Pz", "Muon_E", "Muon_Px", "Muon_Py", "Muon_Pz", "MET_px",
+    "MET_py",
+]
+
+# W boson mass in GeV used for the neutrino reconstruction
+w_mass = 80.385
+
 
 def reconstruct_singletop(events, selected_objects, callback=None):
     import numpy as np
 
-    names = ["Jet1_Pt"]
-
-    reco_data = np.empty((len(events),), dtype=[(name, "<f4") for name in names])
+    reco_data = np.empty((len(events),), dtype=[(name, "<f4") for name in reco_names])
 
+    # invoke the callback only every step events to keep it out of the hot loop
+    step = callback_step(len(events)) if callable(callback) else len(events) + 1
     for i, (event, objects, reco) in enumerate(zip(events, selected_objects, reco_data)):
         reconstruct_event_singletop(event, objects, reco)
-        if callable(callback):
+        if (i + 1) % step == 0:
             callback(i)
+    if callable(callback) and len(events) % step:
+        callback(len(events) - 1)
 
     return reco_data
 
@@ -30,4 +56,142 @@ def reconstruct_event_singletop(event, selected_objects, reco_data):
     jets, btagged_jets, mu, met = selected_objects
 
     reco_data["Jet1_Pt"] = jets[0].Pt()
-    # TODO
+
+    # neutrino from the W mass constraint
+    nu_pz = float(solve_neutrino_pz(mu.E(), mu.Px(), mu.Py(), mu.Pz(), met.Px(), met.Py()))
+    nu = make_particle(0., met.Px(), met.Py(), nu_pz)
+    nu.SetE(nu.P())
+    reco_data["Nu_Pz"] = nu_pz
+
+    # W and top candidates, using the leading btagged jet
+    w = mu + nu
+    bjet = btagged_jets[0]
+    top = w + bjet
+    reco_data["W_Pt"] = w.Pt()
+    reco_data["W_M"] = w.M()
+    reco_data["Top_Pt"] = top.Pt()
+    reco_data["Top_M"] = top.M()
+
+    # the most forward of the remaining jets
+    fwd_jet = max((jet for jet in jets if jet is not bjet), key=lambda jet: abs(jet.Eta()))
+    reco_data["FwdJet_Eta"] = fwd_jet.Eta()
+
+    # angle between the muon and the forward jet in the top rest frame
+    boost = -top.BoostVector()
+    mu_top = make_particle(mu.E(), mu.Px(), mu.Py(), mu.Pz())
+    mu_top.Boost(boost)
+    fwd_jet_top = make_particle(fwd_jet.E(), fwd_jet.Px(), fwd_jet.Py(), fwd_jet.Pz())
+    fwd_jet_top.Boost(boost)
+    reco_data["CosThetaStar"] = math.cos(mu_top.Angle(fwd_jet_top.Vect()))
+
+
+def reconstruct_singletop_columnar(events, selected_objects, callback=None):
+    """
+    Columnar equivalent of :py:func:`reconstruct_singletop` that reconstructs all selected *events*
+    at once. *selected_objects* must be a :py:class:`analysis.framework.selection.SelectedObjects`
+    instance as returned by :py:func:`analysis.framework.selection.select_singletop_columnar`.
+    """
+    import numpy as np
+
+    n = len(events)
+    reco_data = np.empty((n,), dtype=[(name, "<f4") for name in reco_names])
+    jets, btag_pos = selected_objects.jets, selected_objects.btag_positions
+
+    # helper to gather object four-vectors from jagged columns at local object indexes
+    def gather(name, local_idx, event_idx=np.arange(n)):
+        cols = [events[name + "_" + attr] for attr in ("E", "Px", "Py", "Pz")]
+        pos = cols[0].starts[event_idx] + local_idx
+        return LorentzVectorArray.from_components(*(col.content[pos] for col in cols))
+
+    # muons
+    mu = gather("Muon", selected_objects.muons)
+    met_px = np.asarray(events["MET_px"], dtype=np.float64)
+    met_py = np.asarray(events["MET_py"], dtype=np.float64)
+
+    # leading jet
+    reco_data["Jet1_Pt"] = gather("Jet", jets.content[jets.starts]).pt
+
+    # neutrino from the W mass constraint
+    nu_pz = solve_neutrino_pz(mu.e, mu.px, mu.py, mu.pz, met_px, met_py)
+    nu = LorentzVectorArray.from_components(np.sqrt(met_px**2. + met_py**2. + nu_pz**2.), met_px,
+        met_py, nu_pz)
+    reco_data["Nu_Pz"] = nu_pz
+
+    # W and top candidates, using the leading btagged jet
+    w = mu + nu
+    bjet_pos = jets.starts + btag_pos.content[btag_pos.starts]
+    top = w + gather("Jet", jets.content[bjet_pos])
+    reco_data["W_Pt"] = w.pt
+    reco_data["W_M"] = w.mass
+    reco_data["Top_Pt"] = top.pt
+    reco_data["Top_M"] = top.mass
+
+    # the most forward of the remaining jets
+    all_jets = gather("Jet", jets.content, jets.parents)
+    abs_eta = np.abs(all_jets.eta)
+    abs_eta[bjet_pos] = -1.
+    fwd_jet = all_jets[jets.argsort(abs_eta, descending=True)[jets.starts]]
+    reco_data["FwdJet_Eta"] = fwd_jet.eta
+
+    # angle between the muon and the forward jet in the top rest frame
+    beta = -top.boost_vector
+    reco_data["CosThetaStar"] = mu.boost(beta).cos_angle(fwd_jet.boost(beta))
+
+    if callable(callback) and n:
+        callback(n - 1)
+
+    return reco_data
+
+
+def select_and_reconstruct_singletop(events, engine="columnar", weight="EventWeight",
+        progress=None):
+    """
+    Applies the selection and reconstruction to *events* using the *engine* implementation, either
+    ``"event"`` or ``"columnar"``, and returns the indexes of selected events, the reconstructed
+    variables and a :py:class:`analysis.framework.cutflow.Cutflow` weighted by the *weight* column.
+    Only the columns needed by the reconstruction are gathered for selected events. *progress* is
+    invoked with the processed fraction, with the selection covering the first half.
+    """
+    def make_callback(offset, n):
+        if callable(progress):
+            return lambda i: progress(offset + 0.5 * (i + 1) / n)
+
+    from analysis.framework.selection import select_singletop, select_singletop_columnar
+    from analysis.framework.cutflow import Cutflow
+
+    # selection
+    select = {"event": select_singletop, "columnar": select_singletop_columnar}[engine]
+    cutflow = Cutflow(weights=events[weight])
+    indexes, selected_objects = select(events, callback=make_callback(0., len(events)),
+        cutflow=cutflow)
+    # drop the reference to the weights column which is no longer needed, e.g. when the cutflow is
+    # sent between processes
+    cutflow.weights = None
+
+    # reconstruction
+    reconstruct = {"event": reconstruct_singletop,
+        "columnar": reconstruct_singletop_columnar}[engine]
+    selected = events.select(reco_input_columns)[indexes]
+    reco_data = reconstruct(selected, selected_objects, callback=make_callback(0.5, len(selected)))
+
+    return indexes, reco_data, cutflow
+
+
+def solve_neutrino_pz(l_e, l_px, l_py, l_pz, nu_px, nu_py, mass=w_mass):
+    """
+    Solves the longitudinal neutrino momentum from the W mass constraint on the lepton four-vector
+    (*l_e*, *l_px*, *l_py*, *l_pz*) and the missing transverse momentum (*nu_px*, *nu_py*). Of the
+    two solutions, the one with the smaller absolute value is chosen. Complex solutions are
+    replaced by their real part. Works on both scalars and arrays.
+    """
+    import numpy as np
+
+    a = 0.5 * mass**2. + l_px * nu_px + l_py * nu_py
+    d = l_e**2. - l_pz**2.
+    disc = (a * l_pz)**2. - d * (l_e**2. * (nu_px**2. + nu_py**2.) - a**2.)
+    sqrt_disc = np.sqrt(np.maximum(disc, 0.))
+
+    pz1 = (a * l_pz + sqrt_disc) / d
+    pz2 = (a * l_pz - sqrt_disc) / d
+
+    return np.where(np.abs(pz1) < np.abs(pz2), pz1, pz2)
@@ -0,0 +1,73 @@
+# coding: utf-8
+
+"""
+Cached lookup of order objects. The analysis definition is imported lazily upon the first lookup,
+and all subsequent lookups of analyses, configs, shifts, datasets and dataset infos are memoized
+for the lifetime of the process.
+"""
+
+
+__all__ = [
+    "get_analysis_inst", "get_config_inst", "get_shift_inst", "get_dataset_inst",
+    "get_dataset_info_inst", "get_source_dataset", "clear_cache",
+]
+
+
+import importlib
+
+import order as od
+
+from analysis.framework.util import memoize
+
+
+@memoize
+def get_analysis_inst(analysis):
+    # the analysis is defined in a module of the same name in analysis.config
+    importlib.import_module("analysis.config." + analysis)
+    return od.Analysis.get_instance(analysis)
+
+
+@memoize
+def get_config_inst(analysis, config):
+    return get_analysis_inst(analysis).get_config(config)
+
+
+@memoize
+def get_shift_inst(analysis, config, shift):
+    return get_config_inst(analysis, config).get_shift(shift)
+
+
+@memoize
+def get_dataset_inst(analysis, config, dataset):
+    return get_config_inst(analysis, config).get_dataset(dataset)
+
+
+@memoize
+def get_dataset_info_inst(analysis, config, dataset, shift):
+    # fall back to the nominal info when there is none for the shift
+    dataset_inst = get_dataset_inst(analysis, config, dataset)
+    return dataset_inst.get_info(shift if shift in dataset_inst.info else "nominal")
+
+
+@memoize
+def get_source_dataset(analysis, config, dataset, shift):
+    # name of the first dataset of the config whose source file for the shift is identical to the
+    # one of dataset, compared by the expected checksum in the "checksums" auxiliary data of the
+    # config if given, and by the url otherwise
+    config_inst = get_config_inst(analysis, config)
+    checksums = config_inst.get_aux("checksums", None) or {}
+
+    def source(name):
+        url = get_dataset_info_inst(analysis, config, name, shift).keys[0]
+        return checksums.get(url, url)
+
+    key = source(dataset)
+    for dataset_inst in config_inst.datasets:
+        if source(dataset_inst.name) == key:
+            return dataset_inst.name
+
+
+def clear_cache():
+    for func in [get_analysis_inst, get_config_inst, get_shift_inst, get_dataset_inst,
+            get_dataset_info_inst, get_source_dataset]:
+        func.cache.clear()
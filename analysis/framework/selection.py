@@ -5,23 +5,55 @@ Event selection.
 """
 
 
-__all__ = ["select_singletop"]
+__all__ = [
+    "select_singletop", "select_singletop_columnar", "singletop_zone_mask", "zone_columns",
+    "selection_input_columns", "SelectedObjects",
+]
 
 
 from analysis.framework.opendata import load_met, load_electron, load_muon, load_jet
+from analysis.framework.columnar import get_jagged, get_scalar
+from analysis.framework.cutflow import Cutflow
+from analysis.framework.progress import callback_step
 
 
-def select_singletop(events, callback=None):
+# scalar columns whose statistics per zone of events are stored by ConvertData to skip zones that
+# cannot pass the selection, see singletop_zone_mask
+zone_columns = ["triggerIsoMu24", "NJet", "NMuon", "MET_px", "MET_py"]
+
+# event columns read by the selection, both event by event and columnar, including the particle
+# attributes loaded for the selected objects
+selection_input_columns = [
+    "triggerIsoMu24", "MET_px", "MET_py", "NElectron", "Electron_E", "Electron_Px", "Electron_Py",
+    "Electron_Pz", "Electron_Charge", "Electron_Iso", "NMuon", "Muon_E", "Muon_Px", "Muon_Py",
+    "Muon_Pz", "Muon_Charge", "Muon_Iso", "NJet", "Jet_E", "Jet_Px", "Jet_Py", "Jet_Pz",
+    "Jet_btag", "Jet_ID",
+]
+
+
+def select_singletop(events, callback=None, cutflow=None):
     indexes = []
     objects = []
 
+    if cutflow is not None:
+        cutflow.start()
+        cutflow.add("all", n=len(events), sumw=_sum_weights(cutflow.weights))
+
+    # invoke the callback only every step events to keep it out of the hot loop
+    step = callback_step(len(events)) if callable(callback) else len(events) + 1
     for i, event in enumerate(events):
         objs = select_event_singletop(event)
         if objs:
             indexes.append(i)
             objects.append(objs)
-        if callable(callback):
+        if (i + 1) % step == 0:
             callback(i)
+    if callable(callback) and len(events) % step:
+        callback(len(events) - 1)
+
+    # the event-by-event selection only records the overall outcome
+    if cutflow is not None:
+        cutflow.add("selected", n=len(indexes), sumw=_sum_weights(cutflow.weights, indexes))
 
     return indexes, objects
 
@@ -73,8 +105,185 @@ def select_event_singletop(event):
     jets.sort(key=lambda jet: -jet.Pt())
 
     # btag selection (TCHP medium)
-    btagged_jets = filter(lambda jet: jet.btag > 1.93, jets)
+    btagged_jets = [jet for jet in jets if jet.btag > 1.93]
     if len(btagged_jets) < 1:
         return False
 
     return (jets, btagged_jets, mu, met)
+
+
+def select_singletop_columnar(events, callback=None, cutflow=None):
+    """
+    Columnar equivalent of :py:func:`select_singletop` that applies all cuts as array operations
+    on the jagged per-object columns of *events*. It returns the same *indexes* and a
+    :py:class:`SelectedObjects` instance that builds the selected objects of an event on demand.
+    When a :py:class:`analysis.framework.cutflow.Cutflow` *cutflow* is given, counts and times of
+    all cuts are added to it.
+    """
+    import numpy as np
+
+    if cutflow is None:
+        cutflow = Cutflow()
+    cutflow.start()
+    cutflow.add("all", np.ones(len(events), dtype=bool))
+
+    # trigger selection
+    mask = get_scalar(events, "triggerIsoMu24").astype(bool)
+    cutflow.add("trigger", mask)
+
+    # MET selection
+    met_pt = np.hypot(get_scalar(events, "MET_px", np.float64),
+        get_scalar(events, "MET_py", np.float64))
+    mask &= met_pt > 25
+    cutflow.add("met", mask)
+
+    # electron selection, veto all electrons as we only focus on muons
+    n_eles, n_veto_eles = _select_leptons(events, "Electron")[1:]
+    mask &= n_eles + n_veto_eles == 0
+    cutflow.add("electron_veto", mask)
+
+    # muon selection, exactly one muon and no veto muons
+    mu_sel, n_mus, n_veto_mus = _select_leptons(events, "Muon")
+    mask &= (n_mus == 1) & (n_veto_mus == 0)
+    cutflow.add("muon", mask)
+
+    # jet selection
+    jet_px = get_jagged(events, "Jet_Px")
+    jet_pt, jet_eta = _pt_eta(jet_px, get_jagged(events, "Jet_Py"), get_jagged(events, "Jet_Pz"))
+    jet_id = get_jagged(events, "Jet_ID").content.astype(bool)
+    jet_sel = jet_id & (jet_pt > 25) & (np.abs(jet_eta) < 4.5)
+    mask &= jet_px.count_nonzero(jet_sel) >= 2
+    cutflow.add("jets", mask)
+
+    # btag selection (TCHP medium)
+    btag_sel = jet_sel & (get_jagged(events, "Jet_btag").content > 1.93)
+    mask &= jet_px.count_nonzero(btag_sel) >= 1
+    cutflow.add("btag", mask)
+
+    indexes = np.where(mask)[0]
+
+    # sort selected jets by pt, stable to preserve the order of equal pts
+    jet_idx = jet_px.with_content(jet_px.local_index)[indexes]
+    jet_ord = jet_px.with_content(np.arange(len(jet_pt)))[indexes].content
+    order = jet_idx.argsort(jet_pt[jet_ord], descending=True)
+    jet_idx.content, jet_ord = jet_idx.content[order], jet_ord[order]
+    jet_idx = jet_idx.mask(jet_sel[jet_ord])
+    jet_ord = jet_ord[jet_sel[jet_ord]]
+
+    # positions of btagged jets in the sorted jet collections
+    btag_pos = jet_idx.with_content(jet_idx.local_index).mask(btag_sel[jet_ord])
+
+    # index of the single muon per selected event
+    mu_idx = np.zeros(len(indexes), dtype=np.int64)
+    if len(indexes):
+        mu_local = mu_sel.with_content(mu_sel.local_index)
+        mu_idx = mu_local.content[mu_sel.content][np.searchsorted(mu_sel.parents[mu_sel.content],
+            indexes)]
+
+    if callable(callback) and len(events):
+        callback(len(events) - 1)
+
+    return indexes, SelectedObjects(events, indexes, jet_idx, btag_pos, mu_idx)
+
+
+def singletop_zone_mask(zones):
+    """
+    Returns a boolean array that is *True* for all zones of an event store zone map *zones* (see
+    :py:attr:`analysis.framework.store.EventStore.zones`) that might contain events passing the
+    selection. Zones are rejected when their statistics of :py:attr:`zone_columns` violate a
+    necessary condition of the early cuts, i.e., when no event fired the trigger, when the MET
+    cannot exceed 25 GeV, or when there is no event with at least one muon or two jets. Conditions
+    of columns missing in the zone map are not applied.
+    """
+    import numpy as np
+
+    columns = zones["columns"]
+    mask = np.ones(len(zones["n"]), dtype=bool)
+
+    def stat(name, key):
+        return np.asarray(columns[name][key], dtype=np.float64)
+
+    if "triggerIsoMu24" in columns:
+        mask &= stat("triggerIsoMu24", "max") > 0
+    if "NMuon" in columns:
+        mask &= stat("NMuon", "max") >= 1
+    if "NJet" in columns:
+        mask &= stat("NJet", "max") >= 2
+    if "MET_px" in columns and "MET_py" in columns:
+        # upper bound of the MET per zone, with a small margin against rounding
+        max_px = np.maximum(np.abs(stat("MET_px", "min")), np.abs(stat("MET_px", "max")))
+        max_py = np.maximum(np.abs(stat("MET_py", "min")), np.abs(stat("MET_py", "max")))
+        mask &= np.hypot(max_px, max_py) * (1 + 1e-6) > 25
+
+    return mask
+
+
+def _pt_eta(px, py, pz):
+    import numpy as np
+
+    pt = np.hypot(px.content.astype(np.float64), py.content.astype(np.float64))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eta = np.arcsinh(pz.content / pt)
+
+    return pt, eta
+
+
+def _select_leptons(events, name):
+    import numpy as np
+
+    px = get_jagged(events, name + "_Px")
+    pt, eta = _pt_eta(px, get_jagged(events, name + "_Py"), get_jagged(events, name + "_Pz"))
+    iso = get_jagged(events, name + "_Iso").content
+    abs_eta = np.abs(eta)
+
+    sel = (pt > 20) & (abs_eta < 2.1) & (iso < 0.12)
+    veto_sel = ~sel & (pt > 10) & (abs_eta < 2.4) & (iso < 0.24)
+
+    return px.with_content(sel), px.count_nonzero(sel), px.count_nonzero(veto_sel)
+
+
+def _sum_weights(weights, indexes=None):
+    import numpy as np
+
+    if weights is None:
+        return None
+    weights = np.asarray(weights, dtype=np.float64)
+
+    return float(weights.sum() if indexes is None else weights[indexes].sum())
+
+
+class SelectedObjects(object):
+    """
+    Container for the objects of events that passed :py:func:`select_singletop_columnar`, stored as
+    object indexes rather than particles. *jets* holds the pt-sorted indexes of selected jets,
+    *btag_positions* the positions of btagged jets within them and *muons* the index of the selected
+    muon, each per selected event. Items are ``(jets, btagged_jets, mu, met)`` tuples that are built
+    lazily from *events*, which allows using the container as a drop-in replacement of the object
+    list returned by :py:func:`select_singletop`.
+    """
+
+    def __init__(self, events, indexes, jets, btag_positions, muons):
+        super(SelectedObjects, self).__init__()
+
+        self.events = events
+        self.indexes = indexes
+        self.jets = jets
+        self.btag_positions = btag_positions
+        self.muons = muons
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __getitem__(self, i):
+        event = self.events[self.indexes[i]]
+
+        jets = [load_jet(event, j) for j in self.jets[i]]
+        btagged_jets = [jets[j] for j in self.btag_positions[i]]
+        mu = load_muon(event, self.muons[i])
+        met = load_met(event)
+
+        return (jets, btagged_jets, mu, met)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
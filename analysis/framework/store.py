@@ -0,0 +1,613 @@
+# coding: utf-8
+
+"""
+Columnar event store. Events are saved as an uncompressed zip archive of numpy arrays that can
+also be opened with ``numpy.load``. Scalar branches are stored as plain columns, variable-length
+branches as one flat values array plus an offsets array, so that loading requires neither pickle
+nor per-event object deserialization. Members:
+
+- ``__meta__.npy``: json-encoded meta data (format version, number of events, column specs)
+- ``<name>.npy``: scalar column
+- ``<name>.values.npy`` and ``<name>.offsets.npy``: variable-length column
+
+As members are not compressed, columns can be memory-mapped directly from the archive so that only
+the pages of columns that are actually accessed are read. Alternatively, columns can be compressed
+with the codecs in :py:mod:`analysis.framework.compression`. Their members then contain the
+concatenated compressed chunks of a fixed number of items as a byte array, and the column spec in
+the meta data holds the codec and the item and byte counts of all chunks, so that ranges of events
+can be read by decompressing only the overlapping chunks.
+
+Stores can optionally contain a *zone map* in their meta data, i.e., the number of events and the
+minimum, maximum and sum of selected scalar columns in consecutive zones of a fixed number of
+events. Zones whose statistics prove that no event can pass a selection can be skipped without
+reading them.
+
+A store can also be a *skim* that has no columns on its own but references events of other stores
+by index. Its meta data contains a list of segments, each with the paths of referenced stores
+relative to the skim and a number of events, and the member ``__index__.npy`` holds the concatenated
+event indexes of all segments. Columns of skims are gathered from the referenced stores when read.
+"""
+
+
+__all__ = [
+    "EventStore", "EventStoreWriter", "dump_events", "dump_skim", "merge_events", "load_events",
+]
+
+
+import os
+import json
+import struct
+import shutil
+import tempfile
+import zipfile
+from collections import OrderedDict
+
+import six
+
+from analysis.framework.columnar import JaggedArray, Events
+from analysis.framework.compression import get_codec, parse_codecs
+
+
+# version of the store format
+format_version = 1
+
+# size of npy headers written by the EventStoreWriter
+_npy_header_size = 128
+
+# default number of items per compressed chunk
+default_chunk_size = 65536
+
+# default number of events per zone of zone maps
+default_zone_size = 1024
+
+
+def _member_names(name, jagged):
+    if jagged:
+        return (name + ".values", name + ".offsets")
+    else:
+        return (name,)
+
+
+def _npy_header(dtype, n):
+    import numpy as np
+
+    # fixed-size header of a one-dimensional array, padded so that data is 64 byte aligned
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(
+        np.lib.format.dtype_to_descr(dtype), n)
+    header = header.ljust(_npy_header_size - 11) + "\n"
+
+    return np.lib.format.magic(1, 0) + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def _write_member(f, member, arr):
+    import numpy as np
+
+    # write a small array into an open zip file
+    buf = six.BytesIO()
+    np.lib.format.write_array(buf, arr, allow_pickle=False)
+    f.writestr(member + ".npy", buf.getvalue())
+
+
+class EventStoreWriter(object):
+    """
+    Incremental writer of an event store at *path*. Events are added via :py:meth:`append` which
+    accepts an :py:class:`Events` instance or a structured array with object-dtype cells for
+    variable-length branches, and column data is directly streamed to temporary files. The archive
+    is created in :py:meth:`close`, so memory usage does not depend on the total number of events.
+    *codec* is a per-column codec specification as understood by
+    :py:func:`analysis.framework.compression.parse_codecs`, and compressed columns are split into
+    chunks of *chunk_size* items. Unavailable codecs fall back to zlib. When *zone_columns* are
+    given, a zone map with statistics of these scalar columns in zones of *zone_size* events is
+    added to the meta data (see :py:attr:`EventStore.zones`). Example:
+
+    .. code-block:: python
+
+       with EventStoreWriter("data.npz", codec="shuffle+zstd") as writer:
+           for chunk in chunks:
+               writer.append(chunk)
+    """
+
+    def __init__(self, path, codec=None, chunk_size=default_chunk_size, zone_columns=None,
+            zone_size=default_zone_size):
+        super(EventStoreWriter, self).__init__()
+
+        self.path = path
+        self.codec = codec
+        self.chunk_size = chunk_size
+        self.zone_columns = list(zone_columns or [])
+        self.zone_size = zone_size
+        self.n_events = 0
+
+        self._tmp_dir = tempfile.mkdtemp()
+        self._specs = OrderedDict()
+        self._files = OrderedDict()
+        self._sizes = {}
+        self._codecs = {}
+        self._get_codec_spec = parse_codecs(codec)
+        self._zones = {"size": zone_size, "n": [], "columns": OrderedDict(
+            (name, {"min": [], "max": [], "sum": []}) for name in self.zone_columns)}
+
+    def _write(self, member, arr):
+        import numpy as np
+
+        if member not in self._files:
+            self._files[member] = open(os.path.join(self._tmp_dir, member + ".npy"), "wb")
+            self._files[member].write(b"\0" * _npy_header_size)
+            self._sizes[member] = (arr.dtype, 0)
+
+        dtype, size = self._sizes[member]
+        self._files[member].write(np.ascontiguousarray(arr, dtype=dtype).tobytes())
+        self._sizes[member] = (dtype, size + len(arr))
+
+    def append(self, events):
+        import numpy as np
+
+        if not isinstance(events, Events):
+            events = Events.from_struct(events)
+
+        for name, col in events.columns.items():
+            jagged = isinstance(col, JaggedArray)
+            if name not in self._specs:
+                if self.n_events:
+                    raise Exception("cannot add new column {} to non-empty event store {}".format(
+                        name, self.path))
+                dtype = (col.content if jagged else col).dtype
+                self._specs[name] = {"name": name, "jagged": jagged, "dtype": dtype.str}
+                codec = get_codec(self._get_codec_spec(name), fallback=True)
+                if not codec.is_none:
+                    self._specs[name]["codec"] = codec.spec
+                    self._specs[name]["chunks"] = {}
+                    for member in _member_names(name, jagged):
+                        self._codecs[member] = (name, codec)
+                # the leading offset
+                if jagged:
+                    self._write(name + ".offsets", np.zeros(1, dtype=np.int64))
+
+            if jagged:
+                values_member, offsets_member = _member_names(name, True)
+                n_values = self._sizes[values_member][1] if values_member in self._sizes else 0
+                self._write(values_member, col.content)
+                self._write(offsets_member, col.offsets[1:] - col.offsets[0] + n_values)
+            else:
+                self._write(name, col)
+
+        if self.zone_columns:
+            self._update_zones(events)
+
+        self.n_events += len(events)
+
+    def _update_zones(self, events):
+        import numpy as np
+
+        # add statistics of events in each zone, the first zone might be partially filled already
+        n = len(events)
+        start = 0
+        while start < n:
+            zone, pos = divmod(self.n_events + start, self.zone_size)
+            stop = min(n, start + self.zone_size - pos)
+            new = zone == len(self._zones["n"])
+            if new:
+                self._zones["n"].append(0)
+            self._zones["n"][zone] += stop - start
+
+            for name, stats in self._zones["columns"].items():
+                col = events[name]
+                if isinstance(col, JaggedArray):
+                    raise Exception("cannot compute zone statistics of jagged column {}".format(
+                        name))
+                values = np.asarray(col[start:stop])
+                if values.dtype == bool:
+                    values = values.astype(np.int64)
+                _min, _max, _sum = values.min().item(), values.max().item(), values.sum().item()
+                if new:
+                    stats["min"].append(_min)
+                    stats["max"].append(_max)
+                    stats["sum"].append(_sum)
+                else:
+                    stats["min"][zone] = min(stats["min"][zone], _min)
+                    stats["max"][zone] = max(stats["max"][zone], _max)
+                    stats["sum"][zone] += _sum
+
+            start = stop
+
+    def _compress(self, member, path, codec):
+        import numpy as np
+
+        # compress the raw data chunk-wise into a byte array
+        dtype, n = self._sizes[member]
+        chunks = []
+        nbytes = 0
+        with open(path, "rb") as src, open(path + ".chunks", "wb") as dst:
+            src.seek(_npy_header_size)
+            dst.write(b"\0" * _npy_header_size)
+            for start in six.moves.range(0, n, self.chunk_size):
+                n_items = min(self.chunk_size, n - start)
+                data = codec.encode(np.frombuffer(src.read(n_items * dtype.itemsize), dtype=dtype))
+                dst.write(data)
+                chunks.append([n_items, len(data)])
+                nbytes += len(data)
+            dst.seek(0)
+            dst.write(_npy_header(np.dtype(np.uint8), nbytes))
+        os.remove(path)
+
+        return path + ".chunks", chunks
+
+    def close(self):
+        import numpy as np
+
+        try:
+            with zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED, allowZip64=True) as f:
+                for member, tmp in self._files.items():
+                    # write the final header
+                    tmp.seek(0)
+                    tmp.write(_npy_header(*self._sizes[member]))
+                    tmp.close()
+                    path = tmp.name
+                    if member in self._codecs:
+                        name, codec = self._codecs[member]
+                        path, self._specs[name]["chunks"][member] = self._compress(member, path,
+                            codec)
+                    f.write(path, member + ".npy")
+                    os.remove(path)
+
+                meta = {"format": format_version, "n_events": self.n_events,
+                    "columns": list(self._specs.values())}
+                if self.zone_columns:
+                    meta["zones"] = self._zones
+                _write_member(f, "__meta__", np.frombuffer(json.dumps(meta).encode("utf-8"),
+                    dtype=np.uint8))
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        for tmp in self._files.values():
+            tmp.close()
+        self._files.clear()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.cleanup()
+
+
+def dump_events(path, events, codec=None, chunk_size=default_chunk_size):
+    """
+    Saves *events*, either an :py:class:`Events` instance or a structured array with object-dtype
+    cells for variable-length branches, as an event store at *path*. See
+    :py:class:`EventStoreWriter` for more info on *codec* and *chunk_size*.
+    """
+    with EventStoreWriter(path, codec=codec, chunk_size=chunk_size) as writer:
+        writer.append(events)
+
+
+def dump_skim(path, segments, location=None):
+    """
+    Saves a skim at *path* that references events of other stores instead of copying them.
+    *segments* is a list of ``(paths, indexes)`` tuples, where *paths* are the stores that are
+    joined as in :py:func:`load_events` and *indexes* are the indexes of the events to select from
+    them. Stores are referenced by their path relative to the directory of the skim, so that both
+    can be moved together. When the skim is written to a temporary *path* first, *location* should
+    be its final path. Example:
+
+    .. code-block:: python
+
+       dump_skim("selected.npz", [(["data.npz", "jer_up.npz"], indexes)])
+    """
+    import numpy as np
+
+    indexes = [np.asarray(idx, dtype=np.int64) for _, idx in segments]
+    base = os.path.dirname(os.path.abspath(location or path))
+    skim = [{"stores": [os.path.relpath(os.path.abspath(p), base) for p in paths],
+        "n_events": len(idx)} for (paths, _), idx in zip(segments, indexes)]
+    meta = {"format": format_version, "n_events": int(sum(len(idx) for idx in indexes)),
+        "columns": [], "skim": skim}
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as f:
+        _write_member(f, "__meta__", np.frombuffer(json.dumps(meta).encode("utf-8"),
+            dtype=np.uint8))
+        _write_member(f, "__index__", np.concatenate(indexes) if indexes else
+            np.empty(0, dtype=np.int64))
+
+
+def merge_events(path, paths, codec=None, chunk_size=default_chunk_size, location=None):
+    """
+    Merges the event stores at *paths* in the given order into a new store at *path* and returns
+    the number of events. When all stores are skims, only their references are merged into a new
+    skim, see :py:func:`dump_skim` for more info on *location*. Otherwise, columns are streamed into
+    a regular store using *codec* and *chunk_size* (see :py:class:`EventStoreWriter`).
+    """
+    stores = [EventStore(p) for p in paths]
+    try:
+        if stores and all(store.skim is not None for store in stores):
+            segments = sum((store.segments for store in stores), [])
+            dump_skim(path, segments, location=location)
+            return sum(len(store) for store in stores)
+
+        with EventStoreWriter(path, codec=codec, chunk_size=chunk_size) as writer:
+            for store in stores:
+                writer.append(store.load())
+        return writer.n_events
+    finally:
+        for store in stores:
+            store.close()
+
+
+class EventStore(object):
+    """
+    Reader of an event store at *path*. Columns are loaded lazily on first access and converted
+    into numpy arrays or :py:class:`JaggedArray`'s. When *mmap* is *True*, arrays are
+    copy-on-write memory maps of the archive members, i.e., data is only read when accessed and
+    in-place changes never reach the file. Compressed columns are decompressed into memory on
+    access, and for skims, columns are gathered from the referenced stores. Ranges of events can be
+    read with :py:meth:`read`.
+    """
+
+    def __init__(self, path, mmap=True):
+        super(EventStore, self).__init__()
+
+        import numpy as np
+
+        self.path = path
+        self.mmap = mmap
+        self._npz = np.load(path, allow_pickle=False)
+
+        # read meta data
+        self.meta = json.loads(self._npz["__meta__"].tobytes().decode("utf-8"))
+        if self.meta.get("format") != format_version:
+            raise Exception("unsupported event store format {} in {}".format(
+                self.meta.get("format"), path))
+
+        self.specs = OrderedDict((spec["name"], spec) for spec in self.meta["columns"])
+        self._member_specs = {}
+        for spec in self.specs.values():
+            for member in _member_names(spec["name"], spec["jagged"]):
+                self._member_specs[member] = spec
+
+        # segments of skims and referenced stores, opened on demand, with paths relative to the
+        # directory of the skim, or absolute paths in skims written by earlier versions
+        self.skim = self.meta.get("skim")
+        if self.skim:
+            base = os.path.dirname(os.path.abspath(path))
+            for segment in self.skim:
+                segment["stores"] = [os.path.normpath(os.path.join(base, p))
+                    for p in segment["stores"]]
+        self._stores = {}
+
+        # optional zone map, a dictionary with the number of events per zone ("size"), the number
+        # of events in each zone ("n"), and per column, lists of minimum, maximum and sum of values
+        # in each zone ("columns" -> name -> "min", "max", "sum")
+        self.zones = self.meta.get("zones")
+
+    def __len__(self):
+        return self.meta["n_events"]
+
+    def __contains__(self, name):
+        return name in self.specs or (bool(self.skim) and any(
+            name in self._store(p) for p in self.skim[0]["stores"]))
+
+    @property
+    def fields(self):
+        fields = list(self.specs.keys())
+        if self.skim:
+            for p in self.skim[0]["stores"]:
+                fields.extend(name for name in self._store(p).fields if name not in fields)
+        return fields
+
+    @property
+    def segments(self):
+        """
+        List of ``(paths, indexes)`` tuples of a skim, see :py:func:`dump_skim`.
+        """
+        index = self._read("__index__")
+        segments = []
+        start = 0
+        for segment in self.skim or []:
+            stop = start + segment["n_events"]
+            segments.append((segment["stores"], index[start:stop]))
+            start = stop
+        return segments
+
+    def zone_ranges(self, mask):
+        """
+        Returns a list of ``(start, stop)`` event ranges that cover consecutive zones for which the
+        boolean *mask* is *True*. Without a zone map, the full range of events is returned.
+        """
+        if not self.zones:
+            return [(0, len(self))]
+
+        ranges = []
+        start = 0
+        for n, keep in zip(self.zones["n"], mask):
+            if keep:
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1] = (ranges[-1][0], start + n)
+                else:
+                    ranges.append((start, start + n))
+            start += n
+
+        return ranges
+
+    def _store(self, path):
+        if path not in self._stores:
+            self._stores[path] = self.__class__(path, mmap=self.mmap)
+        return self._stores[path]
+
+    def _source(self, name, paths):
+        # the last store that contains the column
+        for p in reversed(paths):
+            if name in self._store(p):
+                return self._store(p)
+        raise KeyError("column {} not in event store {}".format(name, self.path))
+
+    def is_jagged(self, name):
+        if name in self.specs or not self.skim:
+            return self.specs[name]["jagged"]
+        return self._source(name, self.skim[0]["stores"]).is_jagged(name)
+
+    def is_compressed(self, name):
+        if name in self.specs or not self.skim:
+            return "codec" in self.specs[name]
+        return self._source(name, self.skim[0]["stores"]).is_compressed(name)
+
+    def __getitem__(self, name):
+        return self.read(name)
+
+    def read(self, name, start=None, stop=None):
+        """
+        Reads the column *name* for events in the range from *start* to *stop*, defaulting to all
+        events. Only the chunks of compressed columns that overlap with the range are decompressed.
+        """
+        import numpy as np
+
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+
+        if name in self.specs:
+            if not self.is_jagged(name):
+                return self._read(name, start, stop)
+
+            values_member, offsets_member = _member_names(name, True)
+            offsets = self._read(offsets_member, start, stop + 1)
+            values = self._read(values_member, offsets[0], offsets[-1])
+            return JaggedArray(values, offsets - offsets[0] if offsets[0] else offsets)
+
+        if not self.skim:
+            raise KeyError("column {} not in event store {}".format(name, self.path))
+
+        # gather the column from the referenced stores per segment, only reading the range of
+        # events spanned by the indexes
+        cols = []
+        offset = 0
+        for paths, index in self.segments:
+            first, offset = offset, offset + len(index)
+            index = index[max(start - first, 0):max(stop - first, 0)]
+            lo, hi = (int(index.min()), int(index.max()) + 1) if len(index) else (0, 0)
+            cols.append(self._source(name, paths).read(name, lo, hi)[index - lo])
+        if len(cols) == 1:
+            return cols[0]
+        elif isinstance(cols[0], JaggedArray):
+            return JaggedArray.concatenate(cols)
+        else:
+            return np.concatenate(cols)
+
+    def _read(self, member, start=None, stop=None):
+        spec = self._member_specs.get(member)
+        if not spec or "codec" not in spec:
+            return self._read_array(member)[start:stop]
+
+        import numpy as np
+
+        # decompress the chunks that overlap with the range
+        data = self._read_array(member)
+        codec = get_codec(spec["codec"])
+        dtype = np.dtype(np.int64 if member.endswith(".offsets") else spec["dtype"])
+        chunks = spec["chunks"][member]
+        n = sum(n_items for n_items, _ in chunks)
+        start, stop, _ = slice(start, stop).indices(n)
+
+        arrays = []
+        first = item = pos = 0
+        for n_items, nbytes in chunks:
+            if item + n_items > start and item < stop:
+                if not arrays:
+                    first = item
+                arrays.append(codec.decode(data[pos:pos + nbytes].tobytes(), dtype, n_items))
+            item += n_items
+            pos += nbytes
+
+        arr = np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+        return arr[start - first:stop - first]
+
+    def _read_array(self, member):
+        import numpy as np
+
+        info = self._npz.zip.getinfo(member + ".npy")
+        if not self.mmap or info.compress_type != zipfile.ZIP_STORED:
+            return self._npz[member]
+
+        with open(self.path, "rb") as f:
+            # skip the local file header whose extra field can differ from the central directory
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            f.seek(name_len + extra_len, os.SEEK_CUR)
+
+            # read the npy header
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else \
+                np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            offset = f.tell()
+
+        if not np.prod(shape, dtype=np.int64):
+            return np.empty(shape, dtype=dtype)
+
+        return np.memmap(self.path, dtype=dtype, mode="c", offset=offset, shape=shape,
+            order="F" if fortran_order else "C")
+
+    def load(self, fields=None, materialize=False, start=None, stop=None):
+        """
+        Loads the columns *fields*, or all columns when *None*, for events in the range from
+        *start* to *stop* and returns them as an :py:class:`Events` instance. Unless *materialize*
+        is *True*, memory-mapped columns are only read on access.
+        """
+        import numpy as np
+
+        fields = self.fields if fields is None else fields
+        n = len(six.moves.range(len(self))[start:stop])
+        events = Events(OrderedDict((name, self.read(name, start, stop)) for name in fields), n=n)
+
+        if materialize:
+            for name, col in events.columns.items():
+                if isinstance(col, JaggedArray):
+                    events.columns[name] = JaggedArray(np.array(col.content), np.array(col.offsets))
+                else:
+                    events.columns[name] = np.array(col)
+
+        return events
+
+    def close(self):
+        self._npz.close()
+        for store in self._stores.values():
+            store.close()
+        self._stores.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_events(path, fields=None, mmap=True, materialize=False, start=None, stop=None):
+    """
+    Loads the columns *fields* of the event store at *path* and returns an :py:class:`Events`
+    instance. *path* can also be a sequence of paths to stores with the same number of events, such
+    as selected events and sidecar stores with reconstructed columns. They are joined without
+    copying, each field is loaded from the last store that contains it. See
+    :py:class:`EventStore` and :py:meth:`EventStore.load` for more info on *mmap*, *materialize*,
+    *start* and *stop*.
+    """
+    if isinstance(path, six.string_types):
+        with EventStore(path, mmap=mmap) as store:
+            return store.load(fields, materialize=materialize, start=start, stop=stop)
+
+    events = None
+    for p in path:
+        with EventStore(p, mmap=mmap) as store:
+            _fields = None if fields is None else [name for name in fields if name in store]
+            _events = store.load(_fields, materialize=materialize, start=start, stop=stop)
+        events = _events if events is None else events.overlay(_events)
+
+    if fields is not None:
+        missing = [name for name in fields if name not in events]
+        if missing:
+            raise KeyError("columns {} not in event stores {}".format(", ".join(missing),
+                ", ".join(path)))
+        events = events.select(fields)
+
+    return events
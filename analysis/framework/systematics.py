@@ -5,27 +5,31 @@ Functions that apply systematic uncertainties.
 """
 
 
-__all__ = ["vary_jer"]
+__all__ = ["vary_jer", "jer_columns"]
 
 
-import random
+from analysis.framework.columnar import get_jagged
+from analysis.framework.util import counter_gauss
 
-from analysis.framework.opendata import load_jet, dump_particle
 
+# columns that are changed by vary_jer
+jer_columns = ["Jet_E", "Jet_Px", "Jet_Py", "Jet_Pz"]
 
-def vary_jer(events, direction):
-    for event in events:
-        vary_event_jer(event, direction)
 
+def vary_jer(events, direction, seed=0, offset=0):
+    """
+    Varies the jet energy resolution in *events*, an :py:class:`Events` instance, by scaling the jet
+    four-vector columns in the given *direction*. Random numbers are derived from *seed*, the event
+    index plus *offset* and the jet index, so that results do not depend on how a file is split.
+    """
+    if direction not in ("up", "down"):
+        return
 
-def vary_event_jer(event, direction):
-    for i in range(event["NJet"]):
-        jet = load_jet(event, i)
+    # shift and smear by 5%
+    jet_e = get_jagged(events, "Jet_E")
+    mean = 1.05 if direction == "up" else 0.95
+    factor = mean + 0.05 * counter_gauss(seed, jet_e.parents + offset, jet_e.local_index)
 
-        # shift and smear by 5%
-        if direction == "up":
-            jet *= random.gauss(1.05, 0.05)
-        elif direction == "down":
-            jet *= random.gauss(0.95, 0.05)
-
-        dump_particle(event, i, jet, "Jet")
+    for name in jer_columns:
+        jets = get_jagged(events, name)
+        events[name] = jets.with_content((jets.content * factor).astype(jets.content.dtype))
@@ -12,17 +12,43 @@ import os
 
 import luigi
 import law
-import order as od
+from law.target.collection import flatten_collections
+
+from analysis.framework.registry import (get_analysis_inst, get_config_inst, get_shift_inst,
+    get_dataset_inst, get_dataset_info_inst, get_source_dataset)
+from analysis.framework.util import balanced_slices
+
+
+# ids of tasks found to be up to date in incremental mode within the current process
+_up_to_date = set()
 
 
 class AnalysisTask(law.SandboxTask):
 
     version = luigi.Parameter(description="task version, required")
+    store_codec = luigi.Parameter(default="none", significant=False, description="codecs of "
+        "written event stores, either one for all columns such as 'shuffle+zstd', or per column "
+        "such as 'Jet_ID=zlib,*=shuffle+lz4', default: none")
+    incremental = luigi.BoolParameter(default=False, significant=False, description="consider "
+        "tasks as complete only when their fingerprint of parameters, input content and code did "
+        "not change since their outputs were written, and when all their requirements are "
+        "complete, default: False")
 
     analysis = "singletop"
 
     local_workflow_require_branches = True
 
+    # names of event columns to read from input event stores, None means all columns
+    input_columns = None
+
+    # dotted names of functions, classes or modules whose source enters the fingerprint in addition
+    # to the task class and the modules it imports, for code that is not imported by the task
+    code_dependencies = []
+
+    # names of significant parameters that do not affect the outputs and are left out of the
+    # fingerprint
+    exclude_params_fingerprint = set()
+
     @classmethod
     def get_task_namespace(cls):
         return cls.analysis
@@ -31,7 +57,7 @@ class AnalysisTask(law.SandboxTask):
         super(AnalysisTask, self).__init__(*args, **kwargs)
 
         # store the analysis instance
-        self.analysis_inst = od.Analysis.get_instance(self.analysis)
+        self.analysis_inst = get_analysis_inst(self.analysis)
 
     @property
     def store_parts(self):
@@ -63,6 +89,94 @@ class AnalysisTask(law.SandboxTask):
     def remote_path(self, *parts):
         return os.path.join(self.remote_store, *[str(part) for part in parts])
 
+    def fingerprint_target(self):
+        # one fingerprint per branch for workflows
+        if isinstance(self, law.BaseWorkflow):
+            return self.local_target("fingerprint_{}.json".format(self.branch))
+        return self.local_target("fingerprint.json")
+
+    def get_fingerprint(self, checksums=None):
+        # checksum of significant parameters and branch data, the content of all input files and
+        # the source of the task class, the analysis modules it imports and its code dependencies,
+        # checksums maps input paths to cached file checksums and is updated
+        from analysis.framework.fingerprint import fingerprint, file_checksum, source_checksum
+        branch_data = self.branch_data if isinstance(self, law.BaseWorkflow) else None
+        inputs = sorted(t.path for t in flatten_collections(self.input())
+            if isinstance(t, law.LocalFileTarget))
+        params = self.to_str_params(only_significant=True)
+        for name in self.exclude_params_fingerprint:
+            params.pop(name, None)
+        return fingerprint(
+            params,
+            branch_data,
+            [(os.path.basename(path), file_checksum(path, cache=checksums)) for path in inputs],
+            source_checksum(self.__class__, *self.code_dependencies),
+        )
+
+    def write_fingerprint(self):
+        # input checksums are stored along with the fingerprint, so that inputs are only hashed
+        # again when they changed
+        target = self.fingerprint_target()
+        checksums = target.load(formatter="json").get("checksums", {}) if target.exists() else {}
+        fingerprint = self.get_fingerprint(checksums=checksums)
+        target.dump({"fingerprint": fingerprint, "checksums": checksums}, indent=4,
+            formatter="json")
+
+    def is_up_to_date(self):
+        # requirements must be complete first so that the content of inputs is final
+        if self.task_id in _up_to_date:
+            return True
+        if not all(req.complete() for req in law.util.flatten(self.requires())):
+            return False
+        target = self.fingerprint_target()
+        if not target.exists():
+            return False
+        data = target.load(formatter="json")
+        if data.get("fingerprint") != self.get_fingerprint(checksums=data.get("checksums", {})):
+            return False
+
+        # complete tasks remain complete within the process as their requirements do not rerun
+        _up_to_date.add(self.task_id)
+        return True
+
+    def complete(self):
+        complete = super(AnalysisTask, self).complete()
+        if complete and self.incremental:
+            complete = self.is_up_to_date()
+        return complete
+
+    def workflow_complete(self):
+        # in incremental mode, workflows are complete when all branches are
+        if not self.incremental:
+            return NotImplemented
+        return all(task.complete() for task in self.get_branch_tasks().values())
+
+    def create_progress_reporter(self, n_total, **kwargs):
+        # throttled progress reporter that publishes the progress, throughput and eta to the
+        # scheduler, all kwargs are forwarded to the reporter
+        from analysis.framework.progress import ProgressReporter
+        return ProgressReporter(n_total, publish_progress=self.publish_progress,
+            publish_message=self.publish_message, **kwargs)
+
+    def load_events(self, target, columns=None, **kwargs):
+        # memory-map the event store of target and load columns, defaulting to input_columns,
+        # a list of targets is joined column-wise, e.g. to add sidecar stores
+        from analysis.framework.store import load_events
+        if columns is None:
+            columns = self.input_columns
+        if isinstance(target, (list, tuple)):
+            path = [t.path for t in target]
+        else:
+            path = target.path
+        return load_events(path, columns, **kwargs)
+
+
+@AnalysisTask.event_handler(luigi.Event.SUCCESS)
+def _write_fingerprint(task):
+    # record fingerprints of all successful tasks, except for workflows which refer to branches
+    if not isinstance(task, law.BaseWorkflow) or task.is_branch():
+        task.write_fingerprint()
+
 
 class ConfigTask(AnalysisTask):
 
@@ -72,7 +186,7 @@ class ConfigTask(AnalysisTask):
         super(ConfigTask, self).__init__(*args, **kwargs)
 
         # store the campaign and config instances
-        self.config_inst = self.analysis_inst.get_config(self.config)
+        self.config_inst = get_config_inst(self.analysis, self.config)
         self.campaign_inst = self.config_inst.campaign
 
     @property
@@ -94,11 +208,13 @@ class ShiftTask(ConfigTask):
 
     @classmethod
     def modify_param_values(cls, params):
+        params = super(ShiftTask, cls).modify_param_values(params)
+
         if params["shift"] == "nominal":
             return params
 
         # shift known to config?
-        config_inst = od.Config(cls.config)
+        config_inst = get_config_inst(cls.analysis, cls.config)
         if params["shift"] not in config_inst.shifts:
             raise Exception("shift {} unknown to config {}".format(params["shift"], config_inst))
 
@@ -112,7 +228,7 @@ class ShiftTask(ConfigTask):
         super(ShiftTask, self).__init__(*args, **kwargs)
 
         # store the shift instance
-        self.shift_inst = self.config_inst.get_shift(self.effective_shift)
+        self.shift_inst = get_shift_inst(self.analysis, self.config, self.effective_shift)
 
     @property
     def store_parts(self):
@@ -123,21 +239,44 @@ class DatasetTask(ShiftTask):
 
     dataset = luigi.Parameter(default="singleTop", description="the dataset name, default: "
         "singleTop")
+    branch_events = luigi.IntParameter(default=5000, description="maximum number of events per "
+        "branch of workflows, bounding their runtime, 0 means no limit, default: 5000")
+    branch_size = luigi.FloatParameter(default=64., description="maximum size in MB of the "
+        "uncompressed events per branch of workflows, bounding their memory usage, 0 means no "
+        "limit, default: 64")
+
+    # task class whose json output contains the actual number of events "n_events" and the average
+    # uncompressed size per event "event_size" in bytes of the dataset, used to partition branches
+    event_stats_task = None
+
+    # branches of workflows are only known once event statistics exist, see event_stats_condition,
+    # so they are started by the workflow rather than required
+    local_workflow_require_branches = False
+
+    # whether outputs only depend on the source file of the dataset, in which case the dataset is
+    # replaced by the first one with an identical source so that they share a single task
+    share_sources = False
 
     @classmethod
     def modify_param_values(cls, params):
-        if params["shift"] == "nominal":
-            return params
+        # bypass ShiftTask as the shift is also looked up in the dataset below
+        params = super(ShiftTask, cls).modify_param_values(params)
 
-        # shift known to config?
-        config_inst = od.Config.get_instance(cls.config)
-        if params["shift"] not in config_inst.shifts:
-            raise Exception("shift {} unknown to config {}".format(params["shift"], config_inst))
+        if params["shift"] != "nominal":
+            # shift known to config?
+            config_inst = get_config_inst(cls.analysis, cls.config)
+            if params["shift"] not in config_inst.shifts:
+                raise Exception("shift {} unknown to config {}".format(params["shift"],
+                    config_inst))
 
-        # check if the shift is known to the task or dataset
-        dataset_inst = od.Dataset.get_instance(params["dataset"])
-        if params["shift"] in cls.shifts or params["shift"] in dataset_inst.info:
-            params["effective_shift"] = params["shift"]
+            # check if the shift is known to the task or dataset
+            dataset_inst = get_dataset_inst(cls.analysis, cls.config, params["dataset"])
+            if params["shift"] in cls.shifts or params["shift"] in dataset_inst.info:
+                params["effective_shift"] = params["shift"]
+
+        if cls.share_sources:
+            params["dataset"] = get_source_dataset(cls.analysis, cls.config, params["dataset"],
+                params["effective_shift"])
 
         return params
 
@@ -145,9 +284,9 @@ class DatasetTask(ShiftTask):
         super(DatasetTask, self).__init__(*args, **kwargs)
 
         # store the dataset instance and the dataset info instance that corresponds to the shift
-        self.dataset_inst = self.config_inst.get_dataset(self.dataset)
-        self.dataset_info_inst = self.dataset_inst.get_info(
-            self.shift_inst.name if self.shift_inst.name in self.dataset_inst.info else "nominal")
+        self.dataset_inst = get_dataset_inst(self.analysis, self.config, self.dataset)
+        self.dataset_info_inst = get_dataset_info_inst(self.analysis, self.config, self.dataset,
+            self.shift_inst.name)
 
         # also, when there is only one linked process in the current dataset, store it
         if len(self.dataset_inst.processes) == 1:
@@ -162,6 +301,26 @@ class DatasetTask(ShiftTask):
         parts = parts[:-1] + (self.dataset, parts[-1])
         return parts
 
-    def create_branch_map(self):
-        # trivial branch map: one branch per file
-        return {i: i for i in range(self.dataset_info_inst.n_files)}
+    def event_stats_target(self):
+        if self.event_stats_task is None:
+            return None
+        return self.event_stats_task.req(self).output()
+
+    def event_stats_condition(self):
+        # event statistics must exist and be up to date to create the branch map of workflows
+        return self.event_stats_task.req(self).complete()
+
+    def create_event_branch_map(self):
+        # balanced branches, each covering an event range (start, stop) of the source file, derived
+        # from the actual number of events and their size
+        stats = self.event_stats_target().load(formatter="json")
+        slices = balanced_slices(stats["n_events"], max_items=self.branch_events,
+            item_size=stats["event_size"], max_size=self.branch_size * 1024**2)
+        return dict(enumerate(slices))
+
+    def branch_target(self, name, ext):
+        # outputs of branches are named by their event range rather than the branch number, so that
+        # a repartition, e.g. after the source file changed, yields new targets instead of reusing
+        # outputs that cover other events
+        start, stop = self.branch_data
+        return self.local_target("{}_{}_{}.{}".format(name, start, stop, ext))
@@ -5,9 +5,15 @@ Helpful utilities.
 """
 
 
-__all__ = ["join_struct_arrays", "round_base", "partial_slices"]
+__all__ = [
+    "join_struct_arrays", "round_base", "partial_slices", "balanced_slices", "counter_uniform",
+    "counter_gauss", "memoize",
+]
 
 
+import math
+import functools
+
 import six
 
 
@@ -64,7 +70,8 @@ def partial_slices(l, fractions, size=1):
     # check fractions
     if isinstance(fractions, six.integer_types):
         fractions = fractions * [1. / fractions]
-    if sum(fractions) > 1:
+    # allow for floating point errors in the sum of equally sized fractions
+    if sum(fractions) > 1 + 1e-9:
         raise ValueError("bad fractions, sum should be less the 1")
     if any(fraction < 0 for fraction in fractions):
         raise ValueError("bad fractions, should all be positive")
@@ -85,3 +92,110 @@ def partial_slices(l, fractions, size=1):
         slices.append((start, end))
 
     return slices
+
+
+def balanced_slices(n, max_items=None, item_size=None, max_size=None):
+    """
+    Splits *n* items into the smallest number of equally sized, contiguous slices so that no slice
+    contains more than *max_items* items, and no more than *max_size* bytes given an average
+    *item_size* in bytes. Limits that are *None* or zero are ignored. The slices are created with
+    :py:func:`partial_slices` and returned as a list of ``(start, stop)`` tuples. *n* must be
+    positive, as there is no meaningful split of zero items. Example:
+
+    .. code-block:: python
+
+       balanced_slices(100, max_items=30)
+       # -> "[(0, 25), (25, 50), (50, 75), (75, 100)]"
+
+       balanced_slices(100, max_items=30, item_size=1000, max_size=20000)
+       # -> "[(0, 20), (20, 40), (40, 60), (60, 80), (80, 100)]"
+    """
+    if n < 1:
+        raise ValueError("bad number of items {}, must be positive".format(n))
+
+    n_slices = 1
+    if max_items:
+        n_slices = max(n_slices, int(math.ceil(float(n) / max_items)))
+    if item_size and max_size:
+        n_slices = max(n_slices, int(math.ceil(n * float(item_size) / max_size)))
+
+    return partial_slices(n, max(min(n_slices, n), 1))
+
+
+def _mix64(x):
+    import numpy as np
+
+    # splitmix64 finalizer, relies on wrap-around of unsigned 64 bit integers
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def counter_uniform(seed, *counters):
+    """
+    Counter-based generator of uniform random numbers in the open interval (0, 1). Each number is
+    obtained by hashing the integer *seed* and the integer *counters* (scalars or arrays that are
+    broadcast) which makes it reproducible independent of the order or chunking of the calls.
+    Example:
+
+    .. code-block:: python
+
+       counter_uniform(1, np.arange(3))
+       # -> "array([0.8662..., 0.1803..., 0.8031...])"
+
+       counter_uniform(1, np.arange(3))[1] == counter_uniform(1, 1)
+       # -> "True"
+    """
+    import numpy as np
+
+    golden = np.uint64(0x9e3779b97f4a7c15)
+    mult = np.uint64(0xff51afd7ed558ccd)
+
+    with np.errstate(over="ignore"):
+        h = _mix64(np.asarray(seed).astype(np.uint64) + golden)
+        for c in counters:
+            h = _mix64(h ^ (np.asarray(c).astype(np.uint64) * mult + golden))
+
+    # use the upper 53 bits for the mantissa and shift away from zero
+    return ((h >> np.uint64(11)).astype(np.float64) + 0.5) * 2.**-53
+
+
+def counter_gauss(seed, *counters):
+    """
+    Counter-based generator of random numbers following a standard normal distribution, see
+    :py:func:`counter_uniform` for more info on *seed* and *counters*.
+    """
+    import numpy as np
+
+    # box-muller transformation, using two independent uniform numbers
+    u1 = counter_uniform(seed, *(counters + (0,)))
+    u2 = counter_uniform(seed, *(counters + (1,)))
+
+    return np.sqrt(-2. * np.log(u1)) * np.cos(2. * np.pi * u2)
+
+
+def memoize(func):
+    """
+    Decorator that caches the return values of *func* per process, keyed by its positional
+    arguments which must be hashable. The cache is accessible as ``func.cache`` and can be reset
+    via ``func.cache.clear()``. Example:
+
+    .. code-block:: python
+
+       @memoize
+       def get_config_inst(analysis, config):
+           ...
+    """
+    cache = {}
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        try:
+            return cache[args]
+        except KeyError:
+            value = cache[args] = func(*args)
+            return value
+
+    wrapper.cache = cache
+
+    return wrapper
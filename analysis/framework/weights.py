@@ -0,0 +1,91 @@
+# coding: utf-8
+
+"""
+Event weight variations for rate-type systematic shifts.
+"""
+
+
+__all__ = ["luminosity", "rate_factors", "weight_variations", "rate_sources"]
+
+
+from collections import OrderedDict
+
+
+def luminosity(config_inst, channel=None):
+    """
+    Returns the integrated luminosity of *config_inst* as a ``scinum.Number`` with uncertainties,
+    which is the single source for normalization and luminosity shifts. When *channel* is given,
+    its luminosity is returned instead, which must refer to the same number.
+    """
+    lumi = config_inst.get_aux("luminosity")
+    if channel is None:
+        return lumi
+
+    channel_inst = config_inst.get_channel(channel)
+    channel_lumi = channel_inst.get_aux("luminosity", lumi)
+    if channel_lumi is not lumi:
+        raise Exception("luminosity {} of channel {} differs from luminosity {} of config "
+            "{}".format(channel_lumi, channel_inst.name, lumi, config_inst.name))
+
+    return lumi
+
+
+def _lumi_number(config_inst, process_inst):
+    return luminosity(config_inst)
+
+
+def _xsec_number(config_inst, process_inst):
+    return process_inst.get_xsec(config_inst.campaign.ecm)
+
+
+# functions per shift source that return the scinum.Number whose uncertainty defines the shift
+rate_sources = OrderedDict([
+    ("lumi", _lumi_number),
+    ("xsec", _xsec_number),
+])
+
+
+def rate_factors(config_inst, process_inst, shifts=None):
+    """
+    Returns an ordered dictionary mapping the names of rate-type *shifts* of *config_inst*, which
+    default to all rate shifts, to the relative factor by which the yield of *process_inst* changes.
+    The factors are derived from uncertainties of the ``scinum.Number`` that corresponds to the
+    shift source in :py:attr:`rate_sources`. An exception is raised for rate shifts whose source is
+    unknown.
+    """
+    import scinum as sn
+
+    if shifts is None:
+        shifts = [shift_inst for shift_inst in config_inst.shifts if shift_inst.is_rate]
+    else:
+        shifts = [config_inst.get_shift(shift) for shift in shifts]
+
+    factors = OrderedDict()
+    for shift_inst in shifts:
+        if shift_inst.source not in rate_sources:
+            raise Exception("cannot determine rate factor of shift {} with unknown source "
+                "{}".format(shift_inst.name, shift_inst.source))
+
+        number = rate_sources[shift_inst.source](config_inst, process_inst)
+        direction = sn.UP if shift_inst.direction == "up" else sn.DOWN
+        factors[shift_inst.name] = number.get(direction) / number.nominal
+
+    return factors
+
+
+def weight_variations(events, config_inst, process_inst, weight="EventWeight", shifts=None):
+    """
+    Returns an ordered dictionary mapping ``"nominal"`` and the names of rate-type *shifts* (see
+    :py:func:`rate_factors`) to per-event weight columns, computed from the *weight* column of
+    *events* and the rate factors of *process_inst*. The result can be passed to
+    :py:func:`analysis.framework.histograms.fill_variations` to fill all variations in one pass.
+    """
+    import numpy as np
+
+    nominal = np.asarray(events[weight], dtype=np.float64)
+
+    weights = OrderedDict([("nominal", nominal)])
+    for name, factor in rate_factors(config_inst, process_inst, shifts=shifts).items():
+        weights[name] = nominal * factor
+
+    return weights
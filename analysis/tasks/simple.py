@@ -1,154 +1,588 @@
 # coding: utf-8
 
 """
-Simple task chain that fetches public data, converts them to structured numpy arrays, applies
+Simple task chain that fetches public data, converts them to columnar numpy arrays, applies
 a simple selection and event reconstruction, and outputs some simple histograms.
 
-Each public data file is treated en bloc by the tasks in this file. For a map-reduce-like task
-chain, see branched.py.
+Public data files are fetched en bloc, while conversion, systematic variations, selection and
+reconstruction are local workflows whose branches process separate event ranges of the source file.
+The ranges are balanced according to the number and size of events found by inspecting the file.
+The selected events of all branches are merged per dataset before histograms are created. Cutflows
+of the selection are merged across branches, datasets and shifts.
 """
 
 
+import os
+import tarfile
+import logging
+import functools
 from collections import OrderedDict
 
 import six
+import luigi
 import law
 law.contrib.load("numpy", "root", "docker")
 
 import analysis.config.singletop  # noqa: F401
+from analysis.framework.systematics import jer_columns
+from analysis.framework.selection import selection_input_columns
+from analysis.framework.reconstruction import reco_input_columns
 from analysis.framework.tasks import ConfigTask, DatasetTask
-from analysis.framework.util import join_struct_arrays
+
+
+logger = logging.getLogger(__name__)
+
+# paths of inspected files for which a warning about outdated event statistics was already issued
+_outdated_warned = set()
+
+
+class FetchAllData(ConfigTask):
+
+    fetch_connections = luigi.IntParameter(default=4, significant=False, description="maximum "
+        "number of concurrent connections per host, default: 4")
+    fetch_range_size = luigi.FloatParameter(default=16., significant=False, description="size in "
+        "MB of byte ranges of files that are downloaded in parallel, default: 16")
+
+    sandbox = law.NO_STR
+    allow_empty_sandbox = True
+
+    def output(self):
+        return self.local_target("files.json")
+
+    @law.decorator.safe_output
+    def run(self):
+        # download all files of all datasets concurrently into the shared download cache, verifying
+        # expected sha256 checksums per url in the "checksums" auxiliary data of the config, if any
+        from analysis.framework.cache import DownloadCache
+        from analysis.framework.fetch import fetch_all
+        urls = [url for dataset_inst in self.config_inst.datasets
+            for url in dataset_inst.get_info("nominal").keys]
+
+        # report throttled progress in MB, the total grows as file sizes become known
+        reporter = self.create_progress_reporter(0, unit="MB")
+
+        def callback(n, total):
+            if total:
+                reporter.n_total = total / 1024.**2
+                reporter.update(n / 1024.**2)
+
+        cache = DownloadCache.from_env()
+        paths = fetch_all(cache, urls, checksums=self.config_inst.get_aux("checksums", None),
+            max_connections=self.fetch_connections,
+            range_size=int(self.fetch_range_size * 1024**2), callback=callback)
+        self.publish_message("fetched {} files".format(len(paths)))
+
+        # store checksums per url so that dependent tasks find files even if urls are re-indexed
+        files = OrderedDict(
+            (url, {"checksum": os.path.basename(path), "size": os.path.getsize(path)})
+            for url, path in paths.items()
+        )
+        self.output().dump(files, indent=4, formatter="json")
 
 
 class FetchData(DatasetTask):
 
     sandbox = law.NO_STR
+
+    # datasets with identical source files share the fetched file
+    share_sources = True
     allow_empty_sandbox = True
 
+    # the partition of workflows into branches does not affect the source file
+    exclude_params_fingerprint = {"branch_events", "branch_size"}
+
+    def requires(self):
+        return FetchAllData.req(self)
+
     def output(self):
         return self.local_target("data.root")
 
     @law.decorator.safe_output
     def run(self):
-        # fetch the input file and save it
+        # place the input file, fetched into the shared download cache by FetchAllData, in the
+        # output, it is downloaded again in case it was evicted from the cache in the meantime
+        from analysis.framework.cache import DownloadCache
+        cache = DownloadCache.from_env()
+        src = self.dataset_info_inst.keys[0]
+        checksum = self.input().load(formatter="json").get(src, {}).get("checksum")
         with self.localize_output("w") as output:
-            src = self.dataset_info_inst.keys[0]
-            six.moves.urllib.request.urlretrieve(src, output.path)
+            cache.copy(src, output.path, checksum=checksum)
+
+
+class InspectData(DatasetTask):
+
+    sandbox = "docker::riga/law_example_singletop"
+
+    # datasets with identical source files share the statistics
+    share_sources = True
+
+    # the partition of workflows into branches does not affect the statistics
+    exclude_params_fingerprint = FetchData.exclude_params_fingerprint
+
+    def requires(self):
+        return FetchData.req(self)
 
+    def output(self):
+        return self.local_target("stats.json")
+
+    def complete(self):
+        # statistics are outdated when the size of the source file changed since it was inspected,
+        # e.g. when it grew, which incremental runs detect through the fingerprint already
+        complete = super(InspectData, self).complete()
+        if not complete or self.incremental or not self.input().exists():
+            return complete
+
+        path = self.input().path
+        file_size = self.output().load(formatter="json")["file_size"]
+        if os.path.getsize(path) == file_size:
+            return True
+
+        if path not in _outdated_warned:
+            logger.warning("{} changed from {} to {} bytes since it was inspected, event "
+                "statistics are updated and workflows repartitioned".format(path, file_size,
+                os.path.getsize(path)))
+            _outdated_warned.add(path)
+        return False
 
-class ConvertData(DatasetTask):
+    @law.decorator.safe_output
+    def run(self):
+        # count the events in the tree of the source file and determine their average uncompressed
+        # size, from which workflows derive the event ranges of their branches
+        with self.input().load(formatter="root") as tfile:
+            trees = sorted(set(key.GetName() for key in tfile.GetListOfKeys()
+                if key.GetClassName() == "TTree"))
+            if len(trees) != 1:
+                raise Exception("expected exactly one tree in {}, found {}".format(
+                    self.input().path, trees))
+            tree = tfile.Get(trees[0])
+            n_events = int(tree.GetEntries())
+            n_bytes = int(tree.GetTotBytes())
+
+        # workflows cannot partition an empty tree into branches
+        if not n_events:
+            raise Exception("tree {} in {} contains no events".format(trees[0], self.input().path))
+
+        stats = OrderedDict([
+            ("tree", trees[0]),
+            ("n_events", n_events),
+            ("event_size", float(n_bytes) / n_events),
+            ("file_size", os.path.getsize(self.input().path)),
+        ])
+        self.output().dump(stats, indent=4, formatter="json")
+        self.publish_message("found {} events with {:.2f} kB per event".format(n_events,
+            stats["event_size"] / 1024.))
+
+
+class ConvertData(DatasetTask, law.LocalWorkflow):
+
+    chunk_size = luigi.IntParameter(default=1000, significant=False, description="number of events "
+        "to read and convert at once, default: 1000")
 
     sandbox = "docker::riga/law_example_singletop"
 
+    # datasets with identical source files share the conversion
+    share_sources = True
+
+    event_stats_task = InspectData
+
+    def workflow_requires(self):
+        reqs = super(ConvertData, self).workflow_requires()
+        reqs["data"] = FetchData.req(self)
+        reqs["stats"] = InspectData.req(self)
+        return reqs
+
+    @law.dynamic_workflow_condition
+    def workflow_condition(self):
+        # branches are created once the source file is inspected, with a placeholder branch before
+        return self.event_stats_condition()
+
+    @workflow_condition.create_branch_map
+    def create_branch_map(self):
+        return self.create_event_branch_map()
+
     def requires(self):
         return FetchData.req(self)
 
+    @workflow_condition.output
     def output(self):
-        return self.local_target("data.npz")
+        return self.branch_target("data", "npz")
 
     @law.decorator.safe_output
     def run(self):
-        # load via the root_numpy formatter which converts root trees into numpy arrays
-        events = self.input().load(formatter="root_numpy")
-        self.publish_message("converted {} events".format(len(events)))
+        from analysis.framework.store import EventStoreWriter
+        from analysis.framework.selection import zone_columns
 
-        # dump the written events
-        self.output().dump(events=events, formatter="numpy")
+        # stream the event range of this branch in chunks into a columnar event store, with a zone
+        # map of columns used by the selection to skip zones of events that cannot pass
+        start, stop = self.branch_data
+        reporter = self.create_progress_reporter(stop - start)
+        with self.localize_output("w") as output:
+            with EventStoreWriter(output.path, codec=self.store_codec,
+                    zone_columns=zone_columns) as writer:
+                for chunk_start in six.moves.range(start, stop, self.chunk_size):
+                    # load via the root_numpy formatter which converts root trees into numpy arrays
+                    chunk_stop = min(chunk_start + self.chunk_size, stop)
+                    events = self.input().load(start=chunk_start, stop=chunk_stop,
+                        formatter="root_numpy")
+                    writer.append(events)
+                    reporter.update(writer.n_events)
 
 
-class VaryJER(DatasetTask):
+class VaryJER(DatasetTask, law.LocalWorkflow):
 
     shifts = {"jer_up", "jer_down"}
 
     sandbox = "docker::riga/law_example_singletop"
 
+    event_stats_task = ConvertData.event_stats_task
+
+    # only the varied columns are read and stored, forming an overlay on top of ConvertData outputs
+    input_columns = jer_columns
+
+    def workflow_requires(self):
+        reqs = super(VaryJER, self).workflow_requires()
+        reqs["data"] = ConvertData.req(self)
+        return reqs
+
+    @law.dynamic_workflow_condition
+    def workflow_condition(self):
+        # branches are created once the source file is inspected, with a placeholder branch before
+        return self.event_stats_condition()
+
+    @workflow_condition.create_branch_map
+    def create_branch_map(self):
+        return self.create_event_branch_map()
+
     def requires(self):
         return ConvertData.req(self)
 
+    @workflow_condition.output
     def output(self):
-        return self.local_target("data.npz")
+        return self.branch_target("data", "npz")
 
     @law.decorator.safe_output
     def run(self):
         # load the events
-        events = self.input().load(allow_pickle=True, formatter="numpy")["events"]
+        from analysis.framework.store import dump_events
+        events = self.load_events(self.input())
 
-        # vary jer in all events
+        # vary jer in all events, seeding random numbers with the dataset id and the global event
+        # index in the source file
         from analysis.framework.systematics import vary_jer
-        vary_jer(events, self.shift_inst.direction)
-
-        # dump events
-        self.output().dump(events=events, formatter="numpy")
+        vary_jer(events, self.shift_inst.direction, seed=self.dataset_inst.id,
+            offset=self.branch_data[0])
 
-
-class SelectAndReconstruct(DatasetTask):
+        # dump the varied columns only
+        with self.localize_output("w") as output:
+            dump_events(output.path, events, codec=self.store_codec)
+
+
+class SelectAndReconstruct(DatasetTask, law.LocalWorkflow):
+
+    engine = luigi.ChoiceParameter(default="columnar", choices=["event", "columnar"],
+        significant=False, description="the selection and reconstruction implementation to use, "
+        "'event' loops over events, 'columnar' processes whole arrays, default: columnar")
+    skim = luigi.ChoiceParameter(default="index", choices=["index", "copy"], significant=False,
+        description="how selected events are stored, 'index' saves only their indexes referring "
+        "to the input stores, 'copy' saves all columns, default: index")
+    event_workers = luigi.IntParameter(default=1, significant=False, description="number of "
+        "processes that select and reconstruct chunks of events in parallel, 0 means all available "
+        "cores, uncompressed input columns are shared between processes while compressed ones are "
+        "decompressed by each process, default: 1")
+    prune_zones = luigi.BoolParameter(default=True, significant=False,
+        parsing=luigi.BoolParameter.EXPLICIT_PARSING, description="skip zones of events that "
+        "cannot pass the selection according to the zone map of the input store, adding a 'zones' "
+        "step to the cutflow, default: True")
 
     shifts = VaryJER.shifts
 
     sandbox = "docker::riga/law_example_singletop"
 
+    event_stats_task = ConvertData.event_stats_task
+
+    # columns read by the selection, the reconstruction and the cutflow, shifts only provide the
+    # varied jet columns that are layered on top
+    input_columns = list(OrderedDict.fromkeys(
+        selection_input_columns + reco_input_columns + ["EventWeight"]))
+
+    def workflow_requires(self):
+        reqs = super(SelectAndReconstruct, self).workflow_requires()
+        reqs["data"] = ConvertData.req(self)
+        if not self.shift_inst.is_nominal:
+            reqs["shift"] = VaryJER.req(self)
+        return reqs
+
+    @law.dynamic_workflow_condition
+    def workflow_condition(self):
+        # branches are created once the source file is inspected, with a placeholder branch before
+        return self.event_stats_condition()
+
+    @workflow_condition.create_branch_map
+    def create_branch_map(self):
+        return self.create_event_branch_map()
+
     def requires(self):
-        return (ConvertData if self.shift_inst.is_nominal else VaryJER).req(self)
+        reqs = {"data": ConvertData.req(self)}
+        if not self.shift_inst.is_nominal:
+            reqs["shift"] = VaryJER.req(self)
+        return reqs
 
+    @workflow_condition.output
     def output(self):
-        return self.local_target("data.npz")
+        return {
+            "events": self.branch_target("data", "npz"),
+            "reco": self.branch_target("reco", "npz"),
+            "cutflow": self.branch_target("cutflow", "json"),
+        }
 
     @law.decorator.safe_output
     def run(self):
-        # load the events
-        events = self.input().load(allow_pickle=True, formatter="numpy")["events"]
-
-        # selection
-        from analysis.framework.selection import select_singletop
-        callback = self.create_progress_callback(len(events), (0, 50))
-        indexes, selected_objects = select_singletop(events, callback=callback)
-        self.publish_message("selected {} out of {} events".format(len(indexes), len(events)))
-        events = events[indexes]
-
-        # reconstruction
-        from analysis.framework.reconstruction import reconstruct_singletop
-        callback = self.create_progress_callback(len(events), (50, 100))
-        reco_data = reconstruct_singletop(events, selected_objects, callback=callback)
+        import numpy as np
+        from analysis.framework.parallel import map_event_chunks, split_ranges, cpu_count
+        from analysis.framework.reconstruction import reco_names
+        from analysis.framework.cutflow import Cutflow
+
+        # input stores, varied columns of shifts are layered on top of the nominal ones
+        from analysis.framework.store import EventStore, dump_events, dump_skim
+        inputs = [self.input()["data"]]
+        if "shift" in self.input():
+            inputs.append(self.input()["shift"])
+        paths = [inp.path for inp in inputs]
+
+        # skip zones of events that cannot pass the selection according to the zone map of the
+        # nominal store, which also applies to shifts as they do not change the zone columns, and
+        # only read the meta data for that
+        with EventStore(paths[0]) as store:
+            n_events = len(store)
+            ranges = [(0, n_events)]
+            if self.prune_zones and store.zones:
+                from analysis.framework.selection import singletop_zone_mask
+                ranges = store.zone_ranges(singletop_zone_mask(store.zones))
+        n_candidates = sum(stop - start for start, stop in ranges)
+        if self.prune_zones:
+            self.publish_message("{} out of {} events in candidate zones".format(n_candidates,
+                n_events))
+
+        # selection and reconstruction, recording the cutflow
+        from analysis.framework.reconstruction import select_and_reconstruct_singletop
+        n_workers = self.event_workers or cpu_count()
+        reporter = self.create_progress_reporter(n_candidates)
+        if n_workers == 1 and ranges == [(0, n_events)]:
+            events = self.load_events(inputs)
+            indexes, reco_data, cutflow = select_and_reconstruct_singletop(events, self.engine,
+                progress=reporter.update_fraction)
+        else:
+            # process chunks of candidate events, in a pool of workers that memory-map the input
+            # columns of the stores when requested
+            n_chunks = 4 * n_workers if n_workers > 1 else 1
+            chunks = split_ranges(ranges, n_chunks)
+            self.publish_message("processing {} chunks with {} workers".format(len(chunks),
+                n_workers))
+            results = map_event_chunks(
+                functools.partial(select_and_reconstruct_singletop, engine=self.engine),
+                paths, n_events, n_workers=n_workers, chunks=chunks, fields=self.input_columns,
+                callback=reporter.update)
+
+            # merge results in event order
+            indexes = np.concatenate([start + np.asarray(result[0], dtype=np.int64)
+                for start, result in results] or [np.empty(0, dtype=np.int64)])
+            empty_reco = np.empty(0, dtype=[(name, "<f4") for name in reco_names])
+            reco_data = np.concatenate([result[1] for _, result in results] or [empty_reco])
+            cutflow = Cutflow.merge(result[2] for _, result in results)
+
+        # account for all events and those in candidate zones in the cutflow, reading only weights
+        if self.prune_zones:
+            weights = np.asarray(self.load_events(inputs[0], ["EventWeight"])["EventWeight"],
+                dtype=np.float64)
+            cutflow.steps.pop("all", None)
+            _cutflow = Cutflow()
+            _cutflow.add("all", n=n_events, sumw=float(weights.sum()))
+            _cutflow.add("zones", n=n_candidates,
+                sumw=float(sum(weights[start:stop].sum() for start, stop in ranges)))
+            cutflow = Cutflow.merge([_cutflow, cutflow])
+
+        self.publish_message("selected {} out of {} events".format(len(indexes), n_events))
+        self.publish_message("cutflow:\n" + cutflow.table())
         self.publish_message("reconstructed {} variables".format(len(reco_data.dtype.names)))
-        events = join_struct_arrays(events, reco_data)
 
-        # dump events
-        self.output().dump(events=events, formatter="numpy")
+        # dump selected events, reconstructed variables as a sidecar store, and the cutflow
+        with self.localize_output("w") as outputs:
+            if self.skim == "index":
+                dump_skim(outputs["events"].path, [(paths, indexes)],
+                    location=self.output()["events"].path)
+            else:
+                # copies contain all columns, not only those read above
+                from analysis.framework.store import load_events
+                dump_events(outputs["events"].path, load_events(paths)[indexes],
+                    codec=self.store_codec)
+            dump_events(outputs["reco"].path, reco_data, codec=self.store_codec)
+            outputs["cutflow"].dump(cutflow.to_dict(), indent=4, formatter="json")
 
 
-class CreateHistograms(ConfigTask):
+class MergeSelectedEvents(DatasetTask):
 
     shifts = SelectAndReconstruct.shifts
 
     sandbox = "docker::riga/law_example_singletop"
 
+    def requires(self):
+        return SelectAndReconstruct.req(self)
+
+    def output(self):
+        return {
+            "events": self.local_target("data.npz"),
+            "reco": self.local_target("reco.npz"),
+        }
+
+    @law.decorator.safe_output
+    def run(self):
+        # merge the selected events and reconstructed variables of all branches in order into
+        # separate stores, index skims are merged by reference
+        from analysis.framework.store import merge_events
+        inputs = self.input()["collection"].targets
+        with self.localize_output("w") as outputs:
+            for key in ["events", "reco"]:
+                n_events = merge_events(outputs[key].path,
+                    [inputs[b][key].path for b in sorted(inputs)], codec=self.store_codec,
+                    location=self.output()[key].path)
+        self.publish_message("merged {} events from {} branches".format(n_events, len(inputs)))
+
+
+class FillHistograms(DatasetTask):
+
+    shifts = MergeSelectedEvents.shifts
+
+    sandbox = "docker::riga/law_example_singletop"
+
+    @property
+    def input_columns(self):
+        columns = ["EventWeight"]
+        for variable in self.config_inst.variables:
+            if variable.expression not in columns:
+                columns.append(variable.expression)
+        return columns
+
+    def requires(self):
+        return MergeSelectedEvents.req(self)
+
+    def output(self):
+        return self.local_target("hists.npz")
+
+    @law.decorator.safe_output
+    def run(self):
+        # load the events, joined with the reconstructed variables
+        events = self.load_events([self.input()["events"], self.input()["reco"]])
+
+        # build weight columns for the nominal case and all rate shifts of the first linked process
+        from analysis.framework.weights import weight_variations
+        process_inst = list(self.dataset_inst.processes.values())[0]
+        weights = weight_variations(events, self.config_inst, process_inst)
+
+        # fill histograms of all variables and weight variations in a single pass
+        from analysis.framework.histograms import fill_variations
+        hists = fill_variations(events, self.config_inst.variables, weights)
+        self.publish_message("filled histograms for {} variables and {} weight variations".format(
+            len(hists), len(weights)))
+
+        # store only bin contents, plus the sum of event weights, using plain keys for the nominal
+        # case and keys containing the variation name otherwise
+        data = {}
+        for variation, _weights in weights.items():
+            key = "" if variation == "nominal" else "." + variation
+            data["sum_weights" + key] = _weights.sum()
+            for name, variations in hists.items():
+                sumw, sumw2 = variations[variation]
+                data[name + key + ".sumw"] = sumw
+                data[name + key + ".sumw2"] = sumw2
+        self.output().dump(formatter="numpy", **data)
+
+
+class CreateHistograms(ConfigTask):
+
+    variation = luigi.Parameter(default="nominal", description="name of the weight variation to "
+        "plot, i.e., 'nominal' or a rate-type shift, default: nominal")
+    plot_workers = luigi.IntParameter(default=1, significant=False, description="number of "
+        "processes to render plots in parallel, default: 1")
+
+    shifts = FillHistograms.shifts
+
+    sandbox = "docker::riga/law_example_singletop"
+
     def requires(self):
         reqs = OrderedDict()
         for dataset in self.config_inst.datasets:
-            reqs[dataset] = SelectAndReconstruct.req(self, dataset=dataset.name)
+            reqs[dataset] = FillHistograms.req(self, dataset=dataset.name)
         return reqs
 
+    def __init__(self, *args, **kwargs):
+        super(CreateHistograms, self).__init__(*args, **kwargs)
+
+        if self.variation != "nominal":
+            shift_inst = self.config_inst.get_shift(self.variation)
+            if not shift_inst.is_rate:
+                raise Exception("variation {} is not a rate-type shift".format(self.variation))
+
     def output(self):
-        return self.local_target("hists.tgz")
+        postfix = "" if self.variation == "nominal" else "_" + self.variation
+        return self.local_target("hists{}.tgz".format(postfix))
 
     @law.decorator.safe_output
     def run(self):
-        # load input arrays per dataset, map them to the first linked process
-        events = OrderedDict()
+        # load histograms of the variation per dataset, map them to the first linked process
+        from analysis.framework.histograms import select_variation
+        hists = OrderedDict()
         for dataset, inp in self.input().items():
             process = list(dataset.processes.values())[0]
-            events[process] = inp.load(allow_pickle=True, formatter="numpy")["events"]
-            self.publish_message("loaded events for dataset {}".format(dataset.name))
+            hists[process] = select_variation(dict(inp.load(formatter="numpy")), self.variation)
+            self.publish_message("loaded histograms for dataset {}".format(dataset.name))
 
         # create a temporary directory in which the histograms are saved
         tmp_dir = law.LocalDirectoryTarget(is_tmp=True)
         tmp_dir.touch()
 
-        # create plots
-        from analysis.framework.plotting import stack_plot
-        for variable in self.config_inst.variables:
-            stack_plot(events, variable, tmp_dir.child(variable.name + ".pdf", "f").path)
-            self.publish_message("written histogram for variable {}".format(variable.name))
+        # create plots and add them to the output archive as soon as they are written
+        from analysis.framework.plotting import stack_plots
+        variables = list(self.config_inst.variables)
+        paths = [tmp_dir.child(variable.name + ".pdf", "f").path for variable in variables]
+        with self.localize_output("w") as output:
+            with tarfile.open(output.path, "w:gz") as tar:
+                for variable, path in stack_plots(hists, variables, paths, self.plot_workers):
+                    tar.add(path, arcname=os.path.basename(path))
+                    self.publish_message("written histogram for variable {}".format(
+                        variable.name))
+
 
-        # save the output directory as an archive
-        self.output().dump(tmp_dir, formatter="tar")
+class MergeCutflows(ConfigTask):
+
+    sandbox = law.NO_STR
+    allow_empty_sandbox = True
+
+    def requires(self):
+        # cutflows of all datasets for the nominal case and all shifts
+        reqs = OrderedDict()
+        for shift in ["nominal"] + sorted(SelectAndReconstruct.shifts):
+            reqs[shift] = OrderedDict(
+                (dataset.name, SelectAndReconstruct.req(self, dataset=dataset.name, shift=shift))
+                for dataset in self.config_inst.datasets
+            )
+        return reqs
+
+    def output(self):
+        return self.local_target("cutflow.json")
+
+    @law.decorator.safe_output
+    def run(self):
+        # merge the cutflows of all branches per shift and dataset
+        from analysis.framework.cutflow import Cutflow
+        data = OrderedDict()
+        for shift, inps in self.input().items():
+            data[shift] = OrderedDict()
+            for dataset, inp in inps.items():
+                targets = inp["collection"].targets
+                cutflow = Cutflow.merge(targets[b]["cutflow"].load(formatter="json")
+                    for b in sorted(targets))
+                data[shift][dataset] = cutflow.to_dict()
+                self.publish_message("cutflow of dataset {}, shift {}:\n{}".format(dataset,
+                    shift, cutflow.table()))
+
+        self.output().dump(data, indent=4, formatter="json")
@@ -18,6 +18,8 @@ action() {
     export ANALYSIS_BASE="$this_dir"
     export ANALYSIS_STORE="$ANALYSIS_BASE/tmp/data"
     export ANALYSIS_SOFTWARE="$ANALYSIS_BASE/tmp/software"
+    export ANALYSIS_CACHE="$ANALYSIS_BASE/tmp/cache"
+    export ANALYSIS_CACHE_MAX_SIZE="${ANALYSIS_CACHE_MAX_SIZE:-10000}"
 
     export PATH="$ANALYSIS_SOFTWARE/bin:$PATH"
     export PYTHONPATH="$ANALYSIS_BASE:$ANALYSIS_SOFTWARE/lib/python${vpython}/site-packages:$PYTHONPATH"
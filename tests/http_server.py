@@ -0,0 +1,125 @@
+# coding: utf-8
+
+"""
+Local HTTP/1.1 file server with range support and injectable failures for download tests.
+"""
+
+
+__all__ = ["FileServer"]
+
+
+import re
+import threading
+from collections import defaultdict
+
+from six.moves import BaseHTTPServer, socketserver
+
+
+_range_cre = re.compile(r"^bytes=(\d+)-(\d*)$")
+
+
+class FileServer(object):
+    """
+    Serves the byte strings in *files*, a dictionary mapping paths to content, on a free port of
+    localhost in a background thread. Range requests are answered with 206 responses unless
+    *ranges* is *False*, and ranges starting beyond the end of a file with 416. Requests are
+    recorded per path in :py:attr:`requests` as ``(method, range header)`` tuples. Failures are
+    injected per path via :py:attr:`failures`, a list of status codes, where 0 closes the
+    connection without a response and -1 closes it after sending half of the response body.
+    Example:
+
+    .. code-block:: python
+
+       with FileServer({"/a.root": b"..."}) as server:
+           urlopen(server.url("/a.root"))
+    """
+
+    def __init__(self, files, ranges=True):
+        super(FileServer, self).__init__()
+
+        self.files = files
+        self.ranges = ranges
+        self.requests = defaultdict(list)
+        self.failures = defaultdict(list)
+        self.connections = 0
+
+        server = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+                server.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests[self.path].append(("GET", self.headers.get("Range")))
+
+                failure = None
+                if server.failures[self.path]:
+                    failure = server.failures[self.path].pop(0)
+                    if not failure:
+                        self.close_connection = True
+                        return
+                    if failure > 0:
+                        return self._respond(failure, b"")
+
+                if self.path not in server.files:
+                    return self._respond(404, b"not found")
+
+                data = server.files[self.path]
+                m = _range_cre.match(self.headers.get("Range") or "")
+                if not server.ranges or not m:
+                    return self._respond(200, data, truncate=failure)
+
+                start = int(m.group(1))
+                stop = min(int(m.group(2)) + 1 if m.group(2) else len(data), len(data))
+                if start >= len(data):
+                    return self._respond(416, b"",
+                        {"Content-Range": "bytes */{}".format(len(data))})
+                return self._respond(206, data[start:stop], {"Content-Range":
+                    "bytes {}-{}/{}".format(start, stop - 1, len(data))}, truncate=failure)
+
+            def _respond(self, status, body, headers=None, truncate=False):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if truncate:
+                    self.wfile.write(body[:len(body) // 2])
+                    self.close_connection = True
+                else:
+                    self.wfile.write(body)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def url(self, path):
+        return "http://127.0.0.1:{}{}".format(self.port, path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
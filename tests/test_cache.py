@@ -0,0 +1,125 @@
+# coding: utf-8
+
+
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+from analysis.framework.cache import DownloadCache, file_sha256
+from tests.http_server import FileServer
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class DownloadCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.data = os.urandom(3 * DownloadCache.chunk_size + 123)
+        self.server = FileServer({"/a.root": self.data, "/b.root": b"b" * 1000,
+            "/c.root": b"c" * 1000})
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
+    def test_fetch_once(self):
+        cache = DownloadCache(self.tmp)
+        url = self.server.url("/a.root")
+
+        path = cache.fetch(url, checksum=sha256(self.data))
+        self.assertEqual(path, cache.object_path(sha256(self.data)))
+        self.assertEqual(file_sha256(path), sha256(self.data))
+        self.assertEqual(cache.lookup(url), path)
+
+        # the second fetch is served from the cache
+        self.assertEqual(cache.fetch(url), path)
+        self.assertEqual(len(self.server.requests["/a.root"]), 1)
+
+    def test_checksum_mismatch(self):
+        cache = DownloadCache(self.tmp)
+        url = self.server.url("/a.root")
+
+        with self.assertRaises(IOError):
+            cache.fetch(url, checksum=sha256(b"other"))
+        self.assertIsNone(cache.lookup(url))
+        self.assertFalse(os.path.exists(cache.partial_path(url)))
+
+    def test_resume(self):
+        cache = DownloadCache(self.tmp)
+        url = self.server.url("/a.root")
+        with open(cache.partial_path(url), "wb") as f:
+            f.write(self.data[:1000])
+
+        path = cache.fetch(url, checksum=sha256(self.data))
+        self.assertEqual(file_sha256(path), sha256(self.data))
+        self.assertEqual(self.server.requests["/a.root"], [("GET", "bytes=1000-")])
+
+    def test_resume_complete_partial(self):
+        # the partial file is complete when a process was killed before storing it, and the server
+        # answers the range request with 416
+        cache = DownloadCache(self.tmp)
+        url = self.server.url("/a.root")
+        with open(cache.partial_path(url), "wb") as f:
+            f.write(self.data)
+
+        path = cache.fetch(url, checksum=sha256(self.data))
+        self.assertEqual(file_sha256(path), sha256(self.data))
+        self.assertFalse(os.path.exists(cache.partial_path(url)))
+
+    def test_resume_invalid_partial(self):
+        # partial files larger than the source are dropped and fetched again
+        cache = DownloadCache(self.tmp)
+        url = self.server.url("/b.root")
+        with open(cache.partial_path(url), "wb") as f:
+            f.write(b"x" * 2000)
+
+        path = cache.fetch(url)
+        self.assertEqual(file_sha256(path), sha256(b"b" * 1000))
+        self.assertEqual(self.server.requests["/b.root"], [("GET", "bytes=2000-"), ("GET", None)])
+
+    def test_evict_least_recently_used(self):
+        cache = DownloadCache(self.tmp, max_size=2500)
+        path_b = cache.fetch(self.server.url("/b.root"))
+        path_c = cache.fetch(self.server.url("/c.root"))
+        os.utime(path_b, (1000, 1000))
+        os.utime(path_c, (2000, 2000))
+
+        # fetching a over the limit removes b and then c, oldest first, but never a itself
+        cache.max_size = len(self.data) + 1500
+        path_a = cache.fetch(self.server.url("/a.root"))
+        self.assertTrue(os.path.exists(path_a))
+        self.assertFalse(os.path.exists(path_b))
+        self.assertTrue(os.path.exists(path_c))
+        self.assertIsNone(cache.lookup(self.server.url("/b.root")))
+
+        # fetching b again marks it as recently used, so c is removed
+        cache.max_size = len(self.data) + 1000
+        path_b = cache.fetch(self.server.url("/b.root"))
+        self.assertTrue(os.path.exists(path_a))
+        self.assertTrue(os.path.exists(path_b))
+        self.assertFalse(os.path.exists(path_c))
+
+    def test_copy(self):
+        cache = DownloadCache(self.tmp)
+        dst = os.path.join(self.tmp, "out.root")
+        cache.copy(self.server.url("/b.root"), dst)
+        with open(dst, "rb") as f:
+            self.assertEqual(f.read(), b"b" * 1000)
+
+        # the copy is independent of the cached file
+        path = cache.lookup(self.server.url("/b.root"))
+        self.assertNotEqual(os.stat(dst).st_ino, os.stat(path).st_ino)
+        mtime = os.stat(dst).st_mtime
+        os.utime(path, (mtime + 100, mtime + 100))
+        self.assertEqual(os.stat(dst).st_mtime, mtime)
+
+        # copying again replaces the file
+        cache.copy(self.server.url("/b.root"), dst)
+        with open(dst, "rb") as f:
+            self.assertEqual(f.read(), b"b" * 1000)
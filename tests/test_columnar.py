@@ -0,0 +1,112 @@
+# coding: utf-8
+
+
+import unittest
+
+import numpy as np
+
+from analysis.framework.columnar import JaggedArray, Events, get_jagged, get_scalar
+
+
+def to_lists(arr):
+    return [arr[i].tolist() for i in range(len(arr))]
+
+
+class JaggedArrayTest(unittest.TestCase):
+
+    def setUp(self):
+        # leading, inner and trailing empty rows
+        self.arr = JaggedArray.from_counts(np.arange(6, dtype=np.float32), [0, 2, 0, 3, 1, 0])
+
+    def test_structure(self):
+        arr = self.arr
+        self.assertEqual(len(arr), 6)
+        self.assertEqual(arr.offsets.tolist(), [0, 0, 2, 2, 5, 6, 6])
+        self.assertEqual(arr.counts.tolist(), [0, 2, 0, 3, 1, 0])
+        self.assertEqual(arr.parents.tolist(), [1, 1, 3, 3, 3, 4])
+        self.assertEqual(arr.local_index.tolist(), [0, 1, 0, 1, 2, 0])
+        self.assertEqual(to_lists(arr), [[], [0, 1], [], [2, 3, 4], [5], []])
+
+    def test_getitem(self):
+        arr = self.arr
+        self.assertEqual(arr[0].tolist(), [])
+        self.assertEqual(arr[3].tolist(), [2, 3, 4])
+
+        # slices shift offsets, also when they are empty or reversed
+        self.assertEqual(to_lists(arr[2:5]), [[], [2, 3, 4], [5]])
+        self.assertEqual(arr[2:5].offsets.tolist(), [0, 0, 3, 4])
+        self.assertEqual(len(arr[4:2]), 0)
+        self.assertEqual(len(arr[6:]), 0)
+
+        # masks and index arrays
+        self.assertEqual(to_lists(arr[arr.counts > 0]), [[0, 1], [2, 3, 4], [5]])
+        self.assertEqual(to_lists(arr[np.array([5, 3, 0, 3])]), [[], [2, 3, 4], [], [2, 3, 4]])
+        self.assertEqual(to_lists(arr[np.zeros(6, dtype=bool)]), [])
+        self.assertEqual(arr[::2].content.dtype, np.float32)
+
+    def test_mask_and_sort(self):
+        arr = self.arr
+        masked = arr.mask(arr.content % 2 == 0)
+        self.assertEqual(to_lists(masked), [[], [0], [], [2, 4], [], []])
+        self.assertEqual(arr.count_nonzero(arr.content > 10).tolist(), [0] * 6)
+
+        order = arr.argsort(arr.content, descending=True)
+        self.assertEqual(to_lists(arr.with_content(arr.content[order])),
+            [[], [1, 0], [], [4, 3, 2], [5], []])
+
+    def test_objects(self):
+        objects = self.arr.to_objects()
+        self.assertEqual(len(objects), 6)
+        arr = JaggedArray.from_objects(objects)
+        self.assertEqual(to_lists(arr), to_lists(self.arr))
+
+        # only empty rows
+        arr = JaggedArray.from_objects([np.array([]), np.array([])], dtype=np.float32)
+        self.assertEqual(arr.counts.tolist(), [0, 0])
+        self.assertEqual(arr.content.dtype, np.float32)
+        self.assertEqual(len(JaggedArray.from_objects([])), 0)
+
+    def test_concatenate(self):
+        empty = self.arr[0:0]
+        arr = JaggedArray.concatenate([self.arr, empty, self.arr[3:4]])
+        self.assertEqual(to_lists(arr), to_lists(self.arr) + [[2, 3, 4]])
+
+
+class EventsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.events = Events([
+            ("x", np.arange(4, dtype=np.int32)),
+            ("j", JaggedArray.from_counts(np.arange(3, dtype=np.float64), [1, 0, 0, 2])),
+        ])
+
+    def test_select(self):
+        events = self.events
+        self.assertEqual(len(events), 4)
+        self.assertEqual(events.fields, ["x", "j"])
+
+        sel = events[np.array([False, True, True, False])]
+        self.assertEqual(len(sel), 2)
+        self.assertEqual(to_lists(sel["j"]), [[], []])
+        self.assertEqual(len(events[2:2]), 0)
+        self.assertEqual(events[-1]["j"].tolist(), [1, 2])
+
+    def test_struct(self):
+        struct = self.events.to_struct()
+        events = Events.from_struct(struct)
+        self.assertEqual(events["x"].tolist(), [0, 1, 2, 3])
+        self.assertEqual(to_lists(events["j"]), [[0], [], [], [1, 2]])
+        self.assertEqual(to_lists(get_jagged(struct, "j")), to_lists(events["j"]))
+        self.assertEqual(get_scalar(struct, "x", np.float32).dtype, np.float32)
+
+    def test_concatenate_and_overlay(self):
+        events = Events.concatenate([self.events, self.events[0:0], self.events[3:]])
+        self.assertEqual(len(events), 5)
+        self.assertEqual(to_lists(events["j"]), [[0], [], [], [1, 2], [1, 2]])
+
+        other = Events([("x", np.zeros(4))])
+        self.assertEqual(self.events.overlay(other)["x"].tolist(), [0] * 4)
+        with self.assertRaises(ValueError):
+            self.events.overlay(other[:2])
+        with self.assertRaises(ValueError):
+            self.events["y"] = np.zeros(3)
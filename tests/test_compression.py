@@ -0,0 +1,67 @@
+# coding: utf-8
+
+
+import unittest
+
+import numpy as np
+
+from analysis.framework.compression import (ZlibCodec, codecs, get_codec, parse_codecs,
+    _fallback_warned)
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        arrays = [
+            np.arange(1000, dtype=np.float32) * 0.5,
+            np.array([1, -5, 7], dtype=np.int64),
+            np.array([True, False, True]),
+            np.empty(0, dtype=np.float64),
+        ]
+        for name, cls in codecs.items():
+            if not cls.available():
+                continue
+            for spec in [name, "shuffle+" + name]:
+                codec = get_codec(spec)
+                for arr in arrays:
+                    data = codec.encode(arr)
+                    np.testing.assert_array_equal(codec.decode(data, arr.dtype, len(arr)), arr)
+
+    def test_spec(self):
+        self.assertEqual(get_codec("zlib").spec, "zlib")
+        self.assertEqual(get_codec("shuffle+zlib:9").spec, "shuffle+zlib:9")
+        self.assertEqual(get_codec("zlib:6").spec, "zlib")
+        self.assertTrue(get_codec(None).is_none)
+        self.assertFalse(get_codec("shuffle+none").is_none)
+
+        with self.assertRaises(ValueError):
+            get_codec("foo")
+        with self.assertRaises(ValueError):
+            get_codec("bitshuffle+zlib")
+
+    def test_fallback(self):
+        class UnavailableCodec(ZlibCodec):
+            name = "unavailable"
+
+            @classmethod
+            def available(cls):
+                return False
+
+        codecs[UnavailableCodec.name] = UnavailableCodec
+        try:
+            with self.assertRaises(Exception):
+                get_codec("shuffle+unavailable")
+            with self.assertLogs("analysis.framework.compression", "WARNING"):
+                codec = get_codec("shuffle+unavailable", fallback=True)
+            self.assertEqual(codec.spec, "shuffle+zlib")
+        finally:
+            del codecs[UnavailableCodec.name]
+            _fallback_warned.discard(UnavailableCodec.name)
+
+    def test_parse(self):
+        get_spec = parse_codecs("Jet_ID=zlib, Jet_*=shuffle+zlib")
+        self.assertEqual(get_spec("Jet_ID"), "zlib")
+        self.assertEqual(get_spec("Jet_Px"), "shuffle+zlib")
+        self.assertEqual(get_spec("NJet"), "none")
+        self.assertEqual(parse_codecs("lz4")("NJet"), "lz4")
+        self.assertEqual(parse_codecs(None)("NJet"), "none")
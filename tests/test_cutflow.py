@@ -0,0 +1,64 @@
+# coding: utf-8
+
+
+import json
+import unittest
+
+import numpy as np
+
+from analysis.framework.cutflow import Cutflow
+
+
+class CutflowTest(unittest.TestCase):
+
+    def make_cutflow(self, x, weights=None):
+        cutflow = Cutflow(weights=weights)
+        cutflow.start()
+        mask = np.ones(len(x), dtype=bool)
+        cutflow.add("all", mask)
+        mask &= x > 1
+        cutflow.add("x1", mask)
+        mask &= x > 2
+        cutflow.add("x2", mask)
+        return cutflow
+
+    def test_add(self):
+        x = np.array([0, 1, 2, 3, 4])
+        cutflow = self.make_cutflow(x, weights=np.array([1., 2., 3., 4., 5.]))
+        self.assertEqual(list(cutflow), ["all", "x1", "x2"])
+        self.assertEqual([cutflow[name]["n"] for name in cutflow], [5, 3, 2])
+        self.assertEqual([cutflow[name]["sumw"] for name in cutflow], [15., 12., 9.])
+        self.assertTrue(all(cutflow[name]["time"] >= 0 for name in cutflow))
+
+        # unweighted cutflows count events, counts can be given explicitly
+        cutflow = self.make_cutflow(x)
+        self.assertEqual(cutflow["x2"]["sumw"], 2.)
+        cutflow.add("x2", n=1, sumw=0.5)
+        self.assertEqual((cutflow["x2"]["n"], cutflow["x2"]["sumw"]), (3, 2.5))
+        with self.assertRaises(ValueError):
+            cutflow.add("x3")
+
+    def test_empty(self):
+        # cutflows of zero events
+        cutflow = self.make_cutflow(np.empty(0), weights=np.empty(0))
+        self.assertEqual([cutflow[name]["n"] for name in cutflow], [0, 0, 0])
+        self.assertEqual([cutflow[name]["sumw"] for name in cutflow], [0., 0., 0.])
+        self.assertIn("1.0000", cutflow.table())
+
+    def test_merge(self):
+        x = np.array([0, 1, 2, 3, 4])
+        a = self.make_cutflow(x[:2], weights=np.ones(2))
+        b = self.make_cutflow(x[2:], weights=np.ones(3))
+        c = Cutflow()
+        c.add("zones", n=7)
+
+        # merged from instances and serialized dictionaries, in order of first occurrence
+        merged = Cutflow.merge([a, json.loads(json.dumps(b.to_dict())), c])
+        self.assertEqual(list(merged), ["all", "x1", "x2", "zones"])
+        self.assertEqual([merged[name]["n"] for name in merged], [5, 3, 2, 7])
+        self.assertEqual(merged["x1"]["sumw"], 3.)
+        self.assertEqual(len(Cutflow.merge([])), 0)
+
+        table = merged.table().splitlines()
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table[2].split()[:4], ["x1", "3", "3.000", "0.6000"])
@@ -0,0 +1,202 @@
+# coding: utf-8
+
+
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+import time
+import threading
+import unittest
+
+from analysis.framework.cache import DownloadCache, file_sha256
+from analysis.framework.fetch import HTTPClientError, fetch_all_blocking
+from tests.http_server import FileServer
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@unittest.skipIf(sys.version_info[0] < 3, "requires python 3")
+class FetchAllTest(unittest.TestCase):
+
+    range_size = 64 * 1024
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = DownloadCache(self.tmp)
+        # five full ranges and a remainder
+        self.data = os.urandom(5 * self.range_size + 1000)
+        self.files = {"/a.root": self.data, "/b.root": b"b" * 1000}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def fetch_all(self, server, paths, **kwargs):
+        from analysis.framework.fetch import fetch_all
+
+        self.progress = []
+        kwargs.setdefault("range_size", self.range_size)
+        kwargs.setdefault("callback", lambda n, total: self.progress.append((n, total)))
+        return fetch_all(self.cache, [server.url(p) for p in paths], **kwargs)
+
+    def assertNoPartialFiles(self):
+        self.assertEqual(os.listdir(os.path.join(self.tmp, "partial")), [])
+
+    def test_ranges(self):
+        with FileServer(self.files) as server:
+            paths = self.fetch_all(server, ["/a.root", "/b.root", "/a.root"],
+                checksums={server.url("/a.root"): sha256(self.data)})
+
+        self.assertEqual(list(paths), [server.url("/a.root"), server.url("/b.root")])
+        self.assertEqual(file_sha256(paths[server.url("/a.root")]), sha256(self.data))
+        self.assertEqual(file_sha256(paths[server.url("/b.root")]), sha256(b"b" * 1000))
+
+        # one request per range, covering the file
+        ranges = sorted(r for _, r in server.requests["/a.root"])
+        expected = sorted("bytes={}-{}".format(start,
+            min(start + self.range_size, len(self.data)) - 1)
+            for start in range(0, len(self.data), self.range_size))
+        self.assertEqual(ranges, expected)
+
+        # connections are reused, at most 4 per host
+        self.assertLessEqual(server.connections, 4)
+
+        # progress ends at the total size of both files
+        total = len(self.data) + 1000
+        self.assertEqual(self.progress[-1], (total, total))
+        self.assertNoPartialFiles()
+
+    def test_no_ranges(self):
+        with FileServer(self.files, ranges=False) as server:
+            paths = self.fetch_all(server, ["/a.root"])
+
+        self.assertEqual(file_sha256(paths[server.url("/a.root")]), sha256(self.data))
+        self.assertEqual(len(server.requests["/a.root"]), 1)
+        self.assertEqual(self.progress[-1], (len(self.data), len(self.data)))
+
+    def test_retry(self):
+        with FileServer(self.files) as server:
+            # closed connection, server error and a truncated body
+            server.failures["/a.root"] = [0, 503, -1]
+            paths = self.fetch_all(server, ["/a.root"], max_connections=1)
+
+        self.assertEqual(file_sha256(paths[server.url("/a.root")]), sha256(self.data))
+        self.assertEqual(len(server.requests["/a.root"]), 6 + 3)
+
+        # bytes of the truncated attempt are not counted twice
+        self.assertEqual(self.progress[-1], (len(self.data), len(self.data)))
+        self.assertTrue(all(n <= total for n, total in self.progress))
+        self.assertNoPartialFiles()
+
+    def test_retries_exhausted(self):
+        with FileServer(self.files) as server:
+            server.failures["/a.root"] = [503] * 10
+            with self.assertRaises(IOError):
+                self.fetch_all(server, ["/a.root"], retries=2)
+
+        self.assertEqual(len(server.requests["/a.root"]), 3)
+        self.assertIsNone(self.cache.lookup(server.url("/a.root")))
+        self.assertNoPartialFiles()
+
+    def test_not_found(self):
+        with FileServer(self.files) as server:
+            with self.assertRaises(HTTPClientError):
+                self.fetch_all(server, ["/b.root", "/missing.root"])
+
+        # not retried
+        self.assertEqual(len(server.requests["/missing.root"]), 1)
+        self.assertNoPartialFiles()
+
+    def test_checksum_mismatch(self):
+        with FileServer(self.files) as server:
+            with self.assertRaises(IOError):
+                self.fetch_all(server, ["/a.root"],
+                    checksums={server.url("/a.root"): sha256(b"other")})
+
+        self.assertIsNone(self.cache.lookup(server.url("/a.root")))
+        self.assertNoPartialFiles()
+
+    def test_lock(self):
+        # fetches wait for the lock of the url held by e.g. another process, and reuse its download
+        with FileServer(self.files) as server:
+            url = server.url("/a.root")
+            results = []
+            with self.cache.lock(url):
+                thread = threading.Thread(target=lambda: results.append(self.fetch_all(server,
+                    ["/a.root"])))
+                thread.start()
+                time.sleep(0.5)
+                self.assertEqual(len(server.requests["/a.root"]), 0)
+
+                src = os.path.join(self.tmp, "a.root")
+                with open(src, "wb") as f:
+                    f.write(self.data)
+                path = self.cache.store(url, src, sha256(self.data))
+            thread.join()
+
+        self.assertEqual(results[0][url], path)
+        self.assertEqual(len(server.requests["/a.root"]), 0)
+
+    def test_lock_released_on_cancel(self):
+        # a fetch cancelled while waiting for the lock of its url releases it once acquired
+        with FileServer(self.files) as server:
+            url = server.url("/a.root")
+            errors = []
+
+            def run():
+                try:
+                    self.fetch_all(server, ["/a.root", "/missing.root"])
+                except HTTPClientError as e:
+                    errors.append(e)
+
+            with self.cache.lock(url):
+                thread = threading.Thread(target=run)
+                thread.start()
+                thread.join(10)
+                self.assertFalse(thread.is_alive())
+                self.assertEqual(len(errors), 1)
+
+            # the lock is free again, so the url can be fetched
+            results = []
+            thread = threading.Thread(target=lambda: results.append(self.fetch_all(server,
+                ["/a.root"])))
+            thread.start()
+            thread.join(10)
+            self.assertFalse(thread.is_alive())
+
+        self.assertEqual(file_sha256(results[0][url]), sha256(self.data))
+
+
+class FetchAllBlockingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = DownloadCache(self.tmp)
+        self.files = {"/a.root": os.urandom(3 * DownloadCache.chunk_size + 10),
+            "/b.root": b"b" * 1000}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_fetch(self):
+        progress = []
+        with FileServer(self.files) as server:
+            urls = [server.url(p) for p in ["/a.root", "/b.root", "/a.root"]]
+            paths = fetch_all_blocking(self.cache, urls,
+                callback=lambda n, total: progress.append((n, total)))
+
+        self.assertEqual(list(paths), urls[:2])
+        for path, data in zip(paths.values(), [self.files["/a.root"], b"b" * 1000]):
+            self.assertEqual(file_sha256(path), sha256(data))
+        total = len(self.files["/a.root"]) + 1000
+        self.assertEqual(progress[-1], (total, total))
+        self.assertTrue(all(n <= t for n, t in progress))
+
+    def test_not_found(self):
+        with FileServer(self.files) as server:
+            with self.assertRaises(HTTPClientError):
+                fetch_all_blocking(self.cache, [server.url("/missing.root")])
+            self.assertEqual(len(server.requests["/missing.root"]), 1)
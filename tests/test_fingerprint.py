@@ -0,0 +1,105 @@
+# coding: utf-8
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import importlib
+
+from analysis.framework.fingerprint import file_checksum, source_checksum, source_dependencies
+
+
+class SourceChecksumTest(unittest.TestCase):
+
+    def setUp(self):
+        # temporary package whose function imports a module that imports another one in turn
+        self.tmp = tempfile.mkdtemp()
+        self.package = "fingerprint_test_pkg"
+        self.files = {
+            "__init__.py": "",
+            "a.py": "def f():\n    from {0}.b import g\n    return g()\n",
+            "b.py": "from {0} import c\n\n\ndef g():\n    return c.value\n",
+            "c.py": "value = 1\n",
+            "d.py": "value = 2\n",
+        }
+        os.mkdir(os.path.join(self.tmp, self.package))
+        for name in self.files:
+            self.write(name, self.files[name])
+        sys.path.insert(0, self.tmp)
+
+    def tearDown(self):
+        sys.path.remove(self.tmp)
+        for name in list(sys.modules):
+            if name.split(".")[0] == self.package:
+                del sys.modules[name]
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, content):
+        with open(os.path.join(self.tmp, self.package, name), "w") as f:
+            f.write(content.format(self.package))
+
+    def test_follow_imports(self):
+        f = importlib.import_module(self.package + ".a").f
+        self.assertEqual(source_dependencies(f), [self.package + "." + name for name in "bc"])
+
+        checksum = source_checksum(f)
+        self.assertEqual(source_checksum(self.package + ".a.f"), checksum)
+
+        # changes of indirectly imported modules change the checksum, others do not
+        self.write("d.py", "value = 20\n")
+        self.assertEqual(source_checksum(f), checksum)
+        self.write("c.py", "value = 10\n")
+        self.assertNotEqual(source_checksum(f), checksum)
+
+    def test_constants(self):
+        self.assertNotEqual(source_checksum([1, 2]), source_checksum([1, 3]))
+
+    def test_task_dependencies(self):
+        import analysis.tasks.simple as tasks
+
+        expected = {
+            tasks.ConvertData: ["store", "columnar", "compression", "selection"],
+            tasks.VaryJER: ["systematics", "columnar", "util", "store"],
+            tasks.SelectAndReconstruct: ["selection", "reconstruction", "lorentz", "opendata",
+                "columnar", "cutflow", "parallel", "store"],
+            tasks.MergeSelectedEvents: ["store", "columnar", "compression"],
+            tasks.FillHistograms: ["histograms", "weights", "store", "columnar"],
+            tasks.CreateHistograms: ["plotting", "histograms"],
+            tasks.MergeCutflows: ["cutflow"],
+        }
+        for task_cls, modules in expected.items():
+            deps = source_dependencies(task_cls)
+            for module in modules:
+                self.assertIn("analysis.framework." + module, deps)
+            self.assertIn("analysis.config.singletop", deps)
+
+
+class FileChecksumTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "data.npz")
+        with open(self.path, "w") as f:
+            f.write("abc")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_cache(self):
+        cache = {}
+        checksum = file_checksum(self.path, cache=cache)
+        self.assertEqual(list(cache), [self.path])
+        self.assertEqual(cache[self.path]["sha256"], checksum)
+
+        # no files are written next to the input
+        self.assertEqual(os.listdir(self.tmp), ["data.npz"])
+
+        # cached checksums are used as long as the file did not change
+        cache[self.path]["sha256"] = "cached"
+        self.assertEqual(file_checksum(self.path, cache=cache), "cached")
+        with open(self.path, "w") as f:
+            f.write("abcd")
+        self.assertNotEqual(file_checksum(self.path, cache=cache), "cached")
+        self.assertNotEqual(file_checksum(self.path), checksum)
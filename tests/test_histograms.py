@@ -0,0 +1,91 @@
+# coding: utf-8
+
+
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+import order as od
+
+from analysis.framework.columnar import Events
+from analysis.framework.histograms import (bin_indexes, fill_hist, fill_variables,
+    fill_variations, select_variation)
+
+
+class FillHistTest(unittest.TestCase):
+
+    def test_edges(self):
+        # values at edges fall into the upper bin, the last bin includes its upper edge
+        values = np.array([-1., 0., 0.5, 1., 2.9999, 3., 3.1, np.nan])
+        valid, idx = bin_indexes(values, [0., 1., 2., 3.])
+        self.assertEqual(valid.tolist(), [False, True, True, True, True, True, False, False])
+        self.assertEqual(idx.tolist(), [0, 0, 1, 2, 2])
+
+        # non-equidistant bins agree with numpy
+        rng = np.random.RandomState(1)
+        values = rng.uniform(-1., 12., 10000)
+        edges = [0., 0.1, 1., 2.5, 2.6, 10.]
+        weights = rng.uniform(size=len(values))
+        sumw, sumw2 = fill_hist(values, edges, weights)
+        np.testing.assert_allclose(sumw, np.histogram(values, edges, weights=weights)[0])
+        np.testing.assert_allclose(sumw2, np.histogram(values, edges, weights=weights**2)[0])
+
+    def test_unweighted_and_empty(self):
+        sumw, sumw2 = fill_hist(np.array([0.5, 1.5, 1.7]), [0., 1., 2.])
+        self.assertEqual(sumw.tolist(), [1., 2.])
+        self.assertEqual(sumw2.tolist(), [1., 2.])
+
+        sumw, sumw2 = fill_hist(np.empty(0), [0., 1., 2.], np.empty(0))
+        self.assertEqual(sumw.tolist(), [0., 0.])
+        self.assertEqual(sumw2.tolist(), [0., 0.])
+
+    def test_merge(self):
+        # histograms of chunks, including empty ones, add up to the histogram of all values
+        rng = np.random.RandomState(2)
+        values = rng.exponential(3., 1000)
+        weights = rng.normal(1., 0.2, 1000)
+        edges = np.linspace(0., 10., 11)
+        sumw, sumw2 = fill_hist(values, edges, weights)
+
+        chunks = [(0, 0), (0, 300), (300, 300), (300, 1000)]
+        hists = [fill_hist(values[a:b], edges, weights[a:b]) for a, b in chunks]
+        np.testing.assert_allclose(sum(h[0] for h in hists), sumw)
+        np.testing.assert_allclose(sum(h[1] for h in hists), sumw2)
+
+
+class FillVariablesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.events = Events([
+            ("x", np.array([0.5, 1.5, 1.7, 5.])),
+            ("w", np.array([1., 2., 3., 4.])),
+        ])
+        with od.uniqueness_context("histograms_test"):
+            cls.variables = [
+                od.Variable("x", expression="x", binning=(2, 0., 2.)),
+                od.Variable("x_raw", expression="x", binning=(2, 0., 2.), aux={"weight": False}),
+            ]
+
+    def test_variations(self):
+        hists = fill_variables(self.events, self.variables, weight="w")
+        self.assertEqual(hists["x"][0].tolist(), [1., 5.])
+        self.assertEqual(hists["x"][1].tolist(), [1., 13.])
+        self.assertEqual(hists["x_raw"][0].tolist(), [1., 2.])
+
+        weights = OrderedDict([("nominal", self.events["w"]), ("up", 2 * self.events["w"])])
+        variations = fill_variations(self.events, self.variables, weights)
+        self.assertEqual(list(variations["x"]), ["nominal", "up"])
+        self.assertEqual(variations["x"]["nominal"][0].tolist(), hists["x"][0].tolist())
+        self.assertEqual(variations["x"]["up"][0].tolist(), [2., 10.])
+        self.assertEqual(variations["x"]["up"][1].tolist(), [4., 52.])
+        self.assertEqual(variations["x_raw"]["up"][0].tolist(), [1., 2.])
+
+    def test_select_variation(self):
+        hists = {"x.sumw": 1, "x.sumw2": 2, "x.up.sumw": 3, "sum_weights": 4,
+            "sum_weights.up": 5}
+        self.assertEqual(select_variation(hists, "nominal"), hists)
+        self.assertEqual(select_variation(hists, "up"), {"x.sumw": 3, "x.sumw2": 2,
+            "sum_weights": 5})
+        with self.assertRaises(KeyError):
+            select_variation(hists, "down")
@@ -0,0 +1,84 @@
+# coding: utf-8
+
+
+import math
+import unittest
+
+import numpy as np
+
+from analysis.framework.lorentz import LorentzVectorArray, LorentzVector
+
+
+class LorentzVectorTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        p = rng.normal(0., 20., (3, 50))
+        e = np.sqrt((p**2.).sum(axis=0) + rng.uniform(0., 100., 50)**2.)
+        self.vecs = LorentzVectorArray(np.vstack([e, p]))
+
+    def test_kinematics(self):
+        # vectorized quantities agree with those of single vectors
+        vecs = self.vecs
+        for attr, method in [("pt", "Pt"), ("p", "P"), ("eta", "Eta"), ("phi", "Phi"),
+                ("mass", "M")]:
+            values = getattr(vecs, attr)
+            for i in range(len(vecs)):
+                self.assertAlmostEqual(values[i], getattr(vecs[i], method)(), places=6)
+
+        v = LorentzVector.from_components(5., 3., 0., 4.)
+        self.assertAlmostEqual(v.M(), 0.)
+        self.assertAlmostEqual(v.Pt(), 3.)
+        self.assertAlmostEqual(v.Eta(), math.asinh(4. / 3.))
+
+        # space-like vectors have negative masses, vectors along the beam axis infinite rapidities
+        self.assertAlmostEqual(LorentzVector.from_components(3., 0., 0., 5.).M(), -4.)
+        self.assertEqual(LorentzVector.from_components(3., 0., 0., 1.).Eta(), 1e10)
+        self.assertEqual(LorentzVectorArray.from_components([3.], [0.], [0.], [1.]).eta[0], np.inf)
+
+    def test_arithmetic(self):
+        vecs = self.vecs
+        total = vecs.sum()
+        np.testing.assert_allclose(total.components, vecs.data.sum(axis=1))
+        np.testing.assert_allclose((vecs + vecs[0]).data, vecs.data + vecs.data[:, :1])
+        np.testing.assert_allclose((2 * vecs - vecs).data, vecs.data)
+        self.assertAlmostEqual((vecs[0] + vecs[1] - vecs[1]).E(), vecs[0].E())
+        self.assertEqual(len(vecs[vecs.pt > 10.]), np.count_nonzero(vecs.pt > 10.))
+
+        # in-place changes of single vectors write through to the array
+        e = vecs[3].E()
+        v = vecs[3]
+        v *= 2.
+        self.assertAlmostEqual(vecs.e[3], 2. * e)
+        v.SetE(1.)
+        self.assertEqual(vecs.e[3], 1.)
+
+    def test_boost(self):
+        # boosting into the rest frame of the sum leaves no momentum and preserves masses
+        vecs = self.vecs
+        total = vecs.sum()
+        boosted = vecs.boost(-total.BoostVector())
+        np.testing.assert_allclose(boosted.data[1:].sum(axis=1), 0., atol=1e-8)
+        np.testing.assert_allclose(boosted.mass, vecs.mass, rtol=1e-6)
+
+        v = LorentzVector.from_components(*vecs.data[:, 0])
+        v.Boost(*(-total.BoostVector()))
+        np.testing.assert_allclose(v.components, boosted.data[:, 0])
+        np.testing.assert_allclose(vecs.boost(np.zeros(3)).data, vecs.data)
+
+        # per-vector boosts
+        np.testing.assert_allclose(vecs.boost(-vecs.boost_vector).data[1:], 0., atol=1e-8)
+
+    def test_angle(self):
+        a = LorentzVectorArray.from_components([1., 1.], [1., 1.], [0., 0.], [0., 0.])
+        b = LorentzVectorArray.from_components([1., 1.], [0., -1.], [1., 0.], [0., 0.])
+        np.testing.assert_allclose(a.cos_angle(b), [0., -1.], atol=1e-12)
+        self.assertAlmostEqual(a[0].Angle(b[0].Vect()), math.pi / 2.)
+        self.assertAlmostEqual(a[1].Angle(b[1].Vect()), math.pi)
+
+    def test_attrs(self):
+        v = LorentzVector.from_components(1., 0., 0., 0.)
+        v.attrs["iso"] = 0.1
+        self.assertEqual(v.iso, 0.1)
+        with self.assertRaises(AttributeError):
+            v.charge
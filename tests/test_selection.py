@@ -0,0 +1,106 @@
+# coding: utf-8
+
+
+import os
+import shutil
+import tempfile
+import functools
+import unittest
+
+import numpy as np
+
+from analysis.benchmarks.synthetic import generate_events
+from analysis.framework.reconstruction import select_and_reconstruct_singletop
+from analysis.framework.selection import zone_columns, singletop_zone_mask
+from analysis.framework.store import EventStore, EventStoreWriter, load_events
+from analysis.framework.parallel import map_event_chunks, split_ranges
+
+
+class SelectAndReconstructTest(unittest.TestCase):
+
+    def test_engines_agree(self):
+        events = generate_events(2000, seed=1)
+
+        indexes, reco, cutflow = select_and_reconstruct_singletop(events, engine="event")
+        indexes_col, reco_col, cutflow_col = select_and_reconstruct_singletop(events,
+            engine="columnar")
+
+        self.assertGreater(len(indexes), 0)
+        np.testing.assert_array_equal(indexes, indexes_col)
+        for name in reco.dtype.names:
+            np.testing.assert_allclose(reco[name], reco_col[name], rtol=1e-4, atol=1e-4)
+        # the event engine only records all and selected events
+        steps = list(cutflow.steps.values())
+        steps_col = list(cutflow_col.steps.values())
+        self.assertEqual(steps[0]["n"], steps_col[0]["n"])
+        self.assertEqual(steps[-1]["n"], steps_col[-1]["n"])
+
+    def test_input_columns(self):
+        # the columns read by SelectAndReconstruct suffice for both engines, also when processing
+        # only candidate zones in chunks
+        from analysis.tasks.simple import SelectAndReconstruct
+
+        tmp = tempfile.mkdtemp()
+        try:
+            # sort events by trigger so that leading zones cannot pass the selection
+            events = generate_events(2000, seed=2)
+            events = events[np.argsort(events["triggerIsoMu24"], kind="stable")]
+            path = os.path.join(tmp, "data.npz")
+            with EventStoreWriter(path, zone_columns=zone_columns, zone_size=100) as writer:
+                writer.append(events)
+
+            columns = SelectAndReconstruct.input_columns
+            for engine in ["event", "columnar"]:
+                indexes, reco = select_and_reconstruct_singletop(load_events(path), engine)[:2]
+                _indexes, _reco = select_and_reconstruct_singletop(load_events(path, columns),
+                    engine)[:2]
+                np.testing.assert_array_equal(indexes, _indexes)
+                np.testing.assert_array_equal(reco, _reco)
+
+            with EventStore(path) as store:
+                ranges = store.zone_ranges(singletop_zone_mask(store.zones))
+                n_events = len(store)
+            self.assertLess(sum(stop - start for start, stop in ranges), n_events)
+            results = map_event_chunks(functools.partial(select_and_reconstruct_singletop,
+                engine="columnar"), [path], n_events, chunks=split_ranges(ranges, 4),
+                fields=columns)
+            np.testing.assert_array_equal(indexes, np.concatenate([start + result[0]
+                for start, result in results]))
+        finally:
+            shutil.rmtree(tmp)
+
+
+def _count(events):
+    return len(events)
+
+
+class MapEventChunksTest(unittest.TestCase):
+
+    def test_compressed_warning(self):
+        # compressed columns cannot be shared through memory maps, which is reported once per store
+        tmp = tempfile.mkdtemp()
+        try:
+            events = generate_events(500, seed=3)
+            path = os.path.join(tmp, "data.npz")
+            path_raw = os.path.join(tmp, "data_raw.npz")
+            with EventStoreWriter(path, codec="Jet_Px=zlib", chunk_size=100) as writer:
+                writer.append(events)
+            with EventStoreWriter(path_raw) as writer:
+                writer.append(events)
+
+            with self.assertLogs("analysis.framework.parallel", "WARNING") as logs:
+                results = map_event_chunks(_count, [path], 500, n_workers=2,
+                    fields=["Jet_Px", "EventWeight"])
+                map_event_chunks(_count, [path], 500, n_workers=2, fields=["Jet_Px"])
+            self.assertEqual(sum(n for _, n in results), 500)
+            self.assertEqual(len(logs.output), 1)
+            self.assertIn("Jet_Px", logs.output[0])
+            self.assertNotIn("EventWeight", logs.output[0])
+
+            # no warning for uncompressed columns or a single worker
+            with self.assertRaises(AssertionError):
+                with self.assertLogs("analysis.framework.parallel", "WARNING"):
+                    map_event_chunks(_count, [path_raw], 500, n_workers=2)
+                    map_event_chunks(_count, [path], 500, n_workers=1)
+        finally:
+            shutil.rmtree(tmp)
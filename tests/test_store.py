@@ -0,0 +1,206 @@
+# coding: utf-8
+
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from analysis.benchmarks.synthetic import generate_events
+from analysis.framework.columnar import Events, JaggedArray
+from analysis.framework.store import (EventStore, EventStoreWriter, dump_events, dump_skim,
+    merge_events, load_events)
+
+
+def read_meta(path):
+    with np.load(path) as npz:
+        return json.loads(npz["__meta__"].tobytes().decode("utf-8"))
+
+
+def make_events(n, seed):
+    # events with a scalar and a jagged column, whose first rows are empty
+    rng = np.random.RandomState(seed)
+    counts = rng.randint(0, 4, n)
+    counts[:3] = 0
+    return Events([
+        ("x", rng.uniform(0., 10., n).astype(np.float32)),
+        ("n", counts.astype(np.int32)),
+        ("j", JaggedArray.from_counts(rng.normal(size=counts.sum()), counts)),
+    ], n=n)
+
+
+def to_lists(arr):
+    return [arr[i].tolist() for i in range(len(arr))]
+
+
+class EventStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "data.npz")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assert_events_equal(self, events, expected):
+        self.assertEqual(len(events), len(expected))
+        self.assertEqual(events["x"].tolist(), expected["x"].tolist())
+        self.assertEqual(events["n"].tolist(), expected["n"].tolist())
+        self.assertEqual(to_lists(events["j"]), to_lists(expected["j"]))
+
+    def test_round_trip(self):
+        # chunks of 7 items do not align with the appended event chunks, which include empty ones
+        chunks = [make_events(10, 1), make_events(0, 2), make_events(13, 3), make_events(0, 4)]
+        events = Events.concatenate(chunks)
+        for codec in [None, "zlib", "shuffle+zlib", "j=shuffle+zlib,*=none"]:
+            with EventStoreWriter(self.path, codec=codec, chunk_size=7) as writer:
+                for chunk in chunks:
+                    writer.append(chunk)
+            self.assertEqual(writer.n_events, 23)
+
+            with EventStore(self.path) as store:
+                self.assertEqual(len(store), 23)
+                self.assertEqual(store.fields, ["x", "n", "j"])
+                self.assertTrue(store.is_jagged("j"))
+                self.assertFalse(store.is_jagged("x"))
+                self.assertEqual(store.is_compressed("j"), codec is not None)
+                self.assert_events_equal(store.load(), events)
+
+                # ranges across chunk boundaries, empty ranges and ranges of empty rows
+                for start, stop in [(0, 3), (5, 16), (6, 7), (22, 23), (8, 8), (20, 40)]:
+                    self.assert_events_equal(store.load(start=start, stop=stop),
+                        events[start:stop])
+
+            # materialized events do not depend on the store
+            loaded = load_events(self.path, ["j"], materialize=True, mmap=False)
+            self.assertEqual(to_lists(loaded["j"]), to_lists(events["j"]))
+
+    def test_empty(self):
+        # stores of zero-event chunks keep their columns, stores without chunks have none
+        for codec in [None, "zlib"]:
+            dump_events(self.path, make_events(0, 1), codec=codec)
+            with EventStore(self.path) as store:
+                self.assertEqual(len(store), 0)
+                self.assertEqual(store.fields, ["x", "n", "j"])
+                self.assertEqual(len(store["j"]), 0)
+                self.assertEqual(store.read("x", 0, 10).tolist(), [])
+
+        with EventStoreWriter(self.path, zone_columns=["x"]):
+            pass
+        with EventStore(self.path) as store:
+            self.assertEqual(len(store), 0)
+            self.assertEqual(store.fields, [])
+            self.assertEqual(store.zone_ranges([]), [])
+
+    def test_new_column(self):
+        with self.assertRaises(Exception):
+            with EventStoreWriter(self.path) as writer:
+                writer.append(make_events(5, 1))
+                writer.append(make_events(5, 2).overlay(Events([("y", np.zeros(5))])))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_zones(self):
+        chunks = [make_events(5, 1), make_events(0, 2), make_events(6, 3)]
+        events = Events.concatenate(chunks)
+        with EventStoreWriter(self.path, zone_columns=["x", "n"], zone_size=4) as writer:
+            for chunk in chunks:
+                writer.append(chunk)
+
+        with EventStore(self.path) as store:
+            zones = store.zones
+        self.assertEqual(zones["size"], 4)
+        self.assertEqual(zones["n"], [4, 4, 3])
+        for name in ["x", "n"]:
+            values = events[name]
+            for i, (start, stop) in enumerate([(0, 4), (4, 8), (8, 11)]):
+                self.assertAlmostEqual(zones["columns"][name]["min"][i], values[start:stop].min())
+                self.assertAlmostEqual(zones["columns"][name]["max"][i], values[start:stop].max())
+                self.assertAlmostEqual(zones["columns"][name]["sum"][i], values[start:stop].sum(),
+                    places=4)
+
+        # consecutive zones are joined into ranges
+        with EventStore(self.path) as store:
+            self.assertEqual(store.zone_ranges([True, True, False]), [(0, 8)])
+            self.assertEqual(store.zone_ranges([True, False, True]), [(0, 4), (8, 11)])
+            self.assertEqual(store.zone_ranges([False, False, False]), [])
+
+        # jagged columns have no zone statistics
+        with self.assertRaises(Exception):
+            with EventStoreWriter(self.path, zone_columns=["j"]) as writer:
+                writer.append(make_events(5, 1))
+
+    def test_join(self):
+        events = make_events(10, 1)
+        sidecar = os.path.join(self.tmp, "sidecar.npz")
+        dump_events(self.path, events)
+        dump_events(sidecar, Events([("x", np.zeros(10, dtype=np.float32))]))
+
+        joined = load_events([self.path, sidecar], ["x", "j"], start=2, stop=6)
+        self.assertEqual(joined["x"].tolist(), [0.] * 4)
+        self.assertEqual(to_lists(joined["j"]), to_lists(events["j"][2:6]))
+        with self.assertRaises(KeyError):
+            load_events([self.path, sidecar], ["y"])
+
+
+class SkimTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_move(self):
+        # skims reference stores relative to their final location and can be moved along with them
+        events = generate_events(200, seed=4)
+        os.makedirs(os.path.join(self.tmp, "store", "data"))
+        os.makedirs(os.path.join(self.tmp, "store", "skims"))
+        os.makedirs(os.path.join(self.tmp, "scratch"))
+        data = os.path.join(self.tmp, "store", "data", "data.npz")
+        dump_events(data, events)
+
+        indexes = np.array([3, 10, 150])
+        skims = []
+        for i in range(2):
+            skim = os.path.join(self.tmp, "store", "skims", "skim_{}.npz".format(i))
+            tmp_skim = os.path.join(self.tmp, "scratch", "skim.npz")
+            dump_skim(tmp_skim, [([data], indexes)], location=skim)
+            shutil.move(tmp_skim, skim)
+            skims.append(skim)
+        merged = os.path.join(self.tmp, "store", "skims", "merged.npz")
+        self.assertEqual(merge_events(merged, skims), 6)
+
+        meta = read_meta(merged)
+        self.assertEqual(meta["skim"][0]["stores"], [os.path.join("..", "data", "data.npz")])
+
+        moved = os.path.join(self.tmp, "moved")
+        shutil.move(os.path.join(self.tmp, "store"), moved)
+        weights = load_events(os.path.join(moved, "skims", "merged.npz"))["EventWeight"]
+        self.assertEqual(weights.tolist(), events["EventWeight"][indexes].tolist() * 2)
+
+        # jagged columns and ranges across segments
+        px = load_events(os.path.join(moved, "skims", "merged.npz"), ["Jet_Px"], start=2,
+            stop=5)["Jet_Px"]
+        self.assertEqual(to_lists(px), to_lists(events["Jet_Px"][indexes[[2, 0, 1]]]))
+
+    def test_absolute(self):
+        # skims of earlier versions reference stores by absolute path
+        events = generate_events(50, seed=5)
+        data = os.path.join(self.tmp, "data.npz")
+        dump_events(data, events)
+        skim = os.path.join(self.tmp, "skim.npz")
+        dump_skim(skim, [([data], [1, 2])])
+
+        meta = read_meta(skim)
+        meta["skim"][0]["stores"] = [data]
+        with np.load(skim) as npz:
+            index = npz["__index__"]
+        np.savez(skim, __meta__=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+            __index__=index)
+
+        with EventStore(skim) as store:
+            self.assertEqual(store.segments[0][0], [data])
+            self.assertEqual(store["EventWeight"].tolist(), events["EventWeight"][[1, 2]].tolist())
@@ -0,0 +1,65 @@
+# coding: utf-8
+
+
+import unittest
+
+import numpy as np
+import order as od
+import scinum as sn
+
+from analysis.config.singletop import config_singletop_opendata_2011 as config_inst
+from analysis.framework.columnar import Events
+from analysis.framework.weights import luminosity, rate_factors, weight_variations
+
+
+class LuminosityTest(unittest.TestCase):
+
+    def test_single_source(self):
+        # the channel refers to the luminosity of the config, which also defines the lumi shifts
+        lumi = luminosity(config_inst)
+        self.assertIsInstance(lumi, sn.Number)
+        self.assertIs(luminosity(config_inst, "mu"), lumi)
+
+        factors = rate_factors(config_inst, config_inst.get_process("singleTop"),
+            shifts=["lumi_up", "lumi_down"])
+        self.assertAlmostEqual(factors["lumi_up"], lumi.get(sn.UP) / lumi.nominal)
+        self.assertAlmostEqual(factors["lumi_down"], lumi.get(sn.DOWN) / lumi.nominal)
+
+    def test_diverging_channel(self):
+        with od.uniqueness_context("lumi_test"):
+            config = od.Config(name="lumi_test", id=1, campaign=config_inst.campaign)
+            config.set_aux("luminosity", sn.Number(1., 0.1))
+            config.add_channel("e", 1, aux={"luminosity": 1.})
+        with self.assertRaises(Exception):
+            luminosity(config, "e")
+
+
+class WeightVariationsTest(unittest.TestCase):
+
+    def test_factors(self):
+        process_inst = config_inst.get_process("singleTop")
+        factors = rate_factors(config_inst, process_inst)
+        self.assertEqual(list(factors), [shift_inst.name for shift_inst in config_inst.shifts
+            if shift_inst.is_rate])
+        xsec = process_inst.get_xsec(config_inst.campaign.ecm)
+        self.assertAlmostEqual(factors["xsec_down"], xsec.get(sn.DOWN) / xsec.nominal)
+
+        with od.uniqueness_context("weights_test"):
+            config = od.Config(name="weights_test", id=1, campaign=config_inst.campaign)
+            config.add_shift("nominal", 1)
+            config.add_shift("pdf_up", 2, type="rate")
+        with self.assertRaises(Exception):
+            rate_factors(config, process_inst)
+
+    def test_variations(self):
+        process_inst = config_inst.get_process("singleTop")
+        events = Events([("EventWeight", np.array([1., 0.5, 2.], dtype=np.float32))])
+        weights = weight_variations(events, config_inst, process_inst, shifts=["lumi_up"])
+        self.assertEqual(list(weights), ["nominal", "lumi_up"])
+        self.assertEqual(weights["nominal"].dtype, np.float64)
+        np.testing.assert_allclose(weights["lumi_up"], weights["nominal"] * 1.022)
+
+        # zero events
+        weights = weight_variations(Events([("EventWeight", np.empty(0))]), config_inst,
+            process_inst)
+        self.assertTrue(all(len(w) == 0 for w in weights.values()))
@@ -0,0 +1,136 @@
+# coding: utf-8
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from analysis.framework.util import balanced_slices
+
+
+class BalancedSlicesTest(unittest.TestCase):
+
+    def test_limits(self):
+        self.assertEqual(balanced_slices(100), [(0, 100)])
+        self.assertEqual(balanced_slices(100, max_items=30),
+            [(0, 25), (25, 50), (50, 75), (75, 100)])
+        self.assertEqual(balanced_slices(100, max_items=30, item_size=1000, max_size=20000),
+            [(0, 20), (20, 40), (40, 60), (60, 80), (80, 100)])
+
+    def test_few_items(self):
+        # never more slices than items, and slices cover all items
+        slices = balanced_slices(3, max_items=1, item_size=1000, max_size=1)
+        self.assertEqual(slices, [(0, 1), (1, 2), (2, 3)])
+        slices = balanced_slices(1001, max_items=100)
+        self.assertEqual((slices[0][0], slices[-1][1]), (0, 1001))
+        self.assertTrue(all(stop - start <= 100 for start, stop in slices))
+
+    def test_no_items(self):
+        with self.assertRaises(ValueError):
+            balanced_slices(0, max_items=100)
+
+
+class EventBranchMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._store = os.environ.get("ANALYSIS_STORE")
+        os.environ["ANALYSIS_STORE"] = self.tmp
+        # tasks are cached per parameters, so use a unique version
+        self.version = os.path.basename(self.tmp)
+
+    def tearDown(self):
+        if self._store is None:
+            del os.environ["ANALYSIS_STORE"]
+        else:
+            os.environ["ANALYSIS_STORE"] = self._store
+        shutil.rmtree(self.tmp)
+
+    def write_source(self, size):
+        from analysis.tasks.simple import FetchData
+
+        target = FetchData(version=self.version).output()
+        target.parent.touch()
+        with open(target.path, "wb") as f:
+            f.write(b"x" * size)
+
+    def write_stats(self, n_events, event_size, file_size):
+        from analysis.tasks.simple import InspectData
+
+        InspectData(version=self.version).output().dump({"tree": "events", "n_events": n_events,
+            "event_size": event_size, "file_size": file_size}, formatter="json")
+
+    def test_placeholder(self):
+        # workflows have a single placeholder branch that is never complete until inspection
+        from analysis.tasks.simple import ConvertData, SelectAndReconstruct
+
+        for cls in [ConvertData, SelectAndReconstruct]:
+            task = cls(version=self.version)
+            self.assertEqual(task.get_branch_map(), {0: None})
+            self.assertFalse(task.cache_branch_map)
+            self.assertFalse(task.complete())
+
+    def test_branches(self):
+        from analysis.tasks.simple import ConvertData, VaryJER
+
+        self.write_source(100)
+        self.write_stats(12000, 1000., 100)
+
+        task = ConvertData(version=self.version)
+        self.assertEqual(task.get_branch_map(), {0: (0, 4000), 1: (4000, 8000), 2: (8000, 12000)})
+        self.assertTrue(task.cache_branch_map)
+        self.assertEqual(task.req(task, branch=2).output().basename, "data_8000_12000.npz")
+
+        # other limits are significant and repartition into new outputs
+        task2 = ConvertData(version=self.version, branch_events=6000)
+        self.assertNotEqual(task2.task_id, task.task_id)
+        self.assertEqual(task2.req(task2, branch=1).output().basename, "data_6000_12000.npz")
+
+        # the size limit applies as well
+        task = VaryJER(version=self.version, shift="jer_up", branch_size=2.)
+        self.assertEqual(len(task.get_branch_map()), 6)
+
+    def test_partition_fingerprint(self):
+        # the partition enters the fingerprint of branches, but not the one of the source file
+        from analysis.tasks.simple import ConvertData, FetchData
+
+        self.write_source(100)
+        self.write_stats(12000, 1000., 100)
+        fetch = FetchData(version=self.version)
+        fetch.input().dump({}, formatter="json")
+        fetch2 = FetchData(version=self.version, branch_events=6000)
+        self.assertNotEqual(fetch.task_id, fetch2.task_id)
+        self.assertEqual(fetch.get_fingerprint(), fetch2.get_fingerprint())
+
+        task = ConvertData(version=self.version, branch=0)
+        task2 = ConvertData(version=self.version, branch=0, branch_events=6000)
+        self.assertNotEqual(task.get_fingerprint(), task2.get_fingerprint())
+
+    def test_outdated_stats(self):
+        from analysis.tasks.simple import ConvertData, InspectData
+
+        self.write_source(100)
+        self.write_stats(12000, 1000., 100)
+        self.assertTrue(InspectData(version=self.version).complete())
+
+        # the source file grew since it was inspected
+        self.write_source(150)
+        with self.assertLogs("analysis.tasks.simple", "WARNING"):
+            self.assertFalse(InspectData(version=self.version).complete())
+        self.assertEqual(ConvertData(version=self.version).get_branch_map(), {0: None})
+
+    def test_shared_sources(self):
+        # datasets with identical source files share the fetched file, statistics and conversion,
+        # while subsequent tasks are still performed per dataset
+        from analysis.tasks.simple import FetchData, InspectData, ConvertData, VaryJER
+
+        for cls in [FetchData, InspectData, ConvertData]:
+            task = cls(version=self.version, dataset="WWJets")
+            self.assertEqual(task.dataset, "ZJets")
+            self.assertEqual(task.task_id, cls(version=self.version, dataset="ZZJets").task_id)
+        self.assertEqual(FetchData(version=self.version, dataset="singleTop").dataset, "singleTop")
+
+        task = VaryJER(version=self.version, dataset="WWJets", shift="jer_up")
+        self.assertEqual(task.dataset, "WWJets")
+        self.assertEqual(task.workflow_requires()["data"].dataset, "ZJets")